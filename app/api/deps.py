@@ -1,10 +1,12 @@
 """
 API依赖注入
 """
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, Header
 from ..data.dal import get_db
+from ..data.async_dal import get_async_db
 from ..config import config
 
 
@@ -17,6 +19,12 @@ def get_database() -> Generator[Session, None, None]:
         pass
 
 
+async def get_async_database() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话依赖（数据库IO不阻塞事件循环）"""
+    async for db in get_async_db():
+        yield db
+
+
 def get_idempotency_key(
     idempotency_key: str = Header(None, alias="Idempotency-Key")
 ) -> str:
@@ -1,6 +1,8 @@
 """
 健康检查API路由
 """
+import asyncio
+
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -9,6 +11,14 @@ from ..data.models import HealthResponse
 from ..core.lww import now_ms
 from .deps import get_database, get_config
 from ..config import Config
+from ..logic.embedding_cache import embedding_cache
+from ..data.style_cache import style_profile_cache
+from ..logic.wan_poller import get_wan_poller
+from ..core.scheduler import generation_scheduler
+from ..core.singleflight import generation_flights
+from ..logic.variant_replenisher import get_variant_replenisher
+from ..logic.gif_encoder import gif_profile_stats
+from ..logic.storage_backend import get_storage_backend, get_asset_uploader
 
 router = APIRouter(tags=["健康检查"])
 
@@ -35,12 +45,10 @@ async def health_check(
     except Exception as e:
         database_status = f"unhealthy: {str(e)}"
     
-    # 检查存储连接（GCS）
+    # 检查存储连接（本地目录或GCS存储桶）
     storage_status = "healthy"
     try:
-        # 这里可以添加GCS连接检查
-        # 暂时标记为健康
-        pass
+        await asyncio.to_thread(get_storage_backend().check)
     except Exception as e:
         storage_status = f"unhealthy: {str(e)}"
     
@@ -73,7 +81,7 @@ async def readiness_check(
         tables = [
             "soul", "soul_style_profile", "prompt_key", 
             "variant", "user_seen", "landmark_log", 
-            "work_lock", "idempotency"
+            "work_lock", "idempotency", "embedding_cache"
         ]
         
         for table in tables:
@@ -101,3 +109,25 @@ async def liveness_check():
         "status": "alive",
         "timestamp": now_ms()
     }
+
+
+@router.get("/stats")
+async def runtime_stats():
+    """
+    运行时缓存统计端点
+    
+    Returns:
+        各进程内缓存的命中统计
+    """
+    replenisher = get_variant_replenisher()
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "style_profile_cache": style_profile_cache.stats(),
+        "wan_poller": get_wan_poller().stats(),
+        "generation_scheduler": generation_scheduler.stats(),
+        "generation_flights": generation_flights.stats(),
+        "variant_replenisher": replenisher.stats() if replenisher else None,
+        "gif_profiles": gif_profile_stats(),
+        "asset_uploader": get_asset_uploader().stats(),
+        "timestamp": now_ms()
+    }
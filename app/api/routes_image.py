@@ -3,11 +3,11 @@
 """
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..data.models import ImageRequest, ImageResponse, SelfieRequest, SelfieResponse
-from ..data.dal import get_db
-from ..api.deps import verify_soul_id, verify_user_id, verify_cue, verify_city_key, verify_mood
+from ..data.async_dal import AsyncUserSeenDAL, AsyncVariantDAL
+from ..api.deps import get_async_database, verify_soul_id, verify_user_id, verify_cue, verify_city_key, verify_mood
 from ..logic.service_image import ImageGenerationService
 
 router = APIRouter(prefix="/image", tags=["图像生成"])
@@ -20,7 +20,7 @@ image_service = ImageGenerationService()
 async def mark_variant_seen(
     variant_id: str,
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     标记变体为已看
@@ -33,10 +33,8 @@ async def mark_variant_seen(
     Returns:
         成功消息
     """
-    from ..data.dal import UserSeenDAL
-    
     try:
-        UserSeenDAL.mark_seen(db, user_id, variant_id)
+        await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
         return {"message": "变体已标记为已看", "variant_id": variant_id}
     except Exception as e:
         raise HTTPException(
@@ -50,7 +48,7 @@ async def generate_image(
     soul_id: str = Depends(verify_soul_id),
     cue: str = Depends(verify_cue),
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     生成Soul风格图像
@@ -88,7 +86,7 @@ async def generate_image(
 @router.post("/selfie", response_model=SelfieResponse)
 async def create_selfie(
     selfie_request: SelfieRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     创建Soul自拍
@@ -133,7 +131,7 @@ async def create_selfie(
 @router.get("/variants/{pk_id}")
 async def get_variants_by_key(
     pk_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     获取指定提示词键的所有变体
@@ -146,9 +144,7 @@ async def get_variants_by_key(
         变体列表
     """
     try:
-        from ..data.dal import VariantDAL
-        
-        variants = VariantDAL.list_by_pk_id(db, pk_id)
+        variants = await AsyncVariantDAL.list_by_pk_id(db, pk_id)
         
         return {
             "pk_id": pk_id,
@@ -174,7 +170,7 @@ async def get_variants_by_key(
 @router.get("/user/{user_id}/seen")
 async def get_user_seen_variants(
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     获取用户已看过的变体
@@ -187,9 +183,7 @@ async def get_user_seen_variants(
         已看变体列表
     """
     try:
-        from ..data.dal import UserSeenDAL
-        
-        seen_variants = UserSeenDAL.get_seen_variants(db, user_id)
+        seen_variants = await AsyncUserSeenDAL.get_seen_variants(db, user_id)
         
         return {
             "user_id": user_id,
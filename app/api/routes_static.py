@@ -1,11 +1,23 @@
 """
 静态文件服务 - 提供生成的图像
 """
+import asyncio
 import os
+from collections import OrderedDict
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import FileResponse
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import config
+from ..core.ids import is_valid_ulid, ulid_timestamp_ms
+from ..data.async_dal import AsyncVariantDAL
+from ..logic.asset_store import asset_store, content_type_for, file_sha256
+from ..logic.storage_backend import get_asset_uploader, get_storage_backend
+from ..logic.variant_pool import IMAGE_VARIANT_TYPES
+from .deps import get_async_database
 
 router = APIRouter(prefix="/static", tags=["静态文件"])
 
@@ -14,14 +26,78 @@ GENERATED_IMAGES_DIR = "generated_images"
 # 生成视频目录
 GENERATED_VIDEOS_DIR = "generated_videos"
 
+# 按文件名ULID命名的文件内容不会改变，ETag使用内容SHA-256；
+# 计算结果按 (路径, 修改时间, 大小) 缓存，避免每次请求重新读取文件
+_ETAG_CACHE_SIZE = 4096
+_etag_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+
+async def _content_etag(file_path: Path) -> str:
+    """获取文件的强ETag（内容SHA-256）"""
+    stat_result = file_path.stat()
+    cache_key = (str(file_path), stat_result.st_mtime_ns, stat_result.st_size)
+    etag = _etag_cache.get(cache_key)
+    if etag is None:
+        etag = f'"{await asyncio.to_thread(file_sha256, file_path)}"'
+        _etag_cache[cache_key] = etag
+        if len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    else:
+        _etag_cache.move_to_end(cache_key)
+    return etag
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 比较（弱比较，忽略 W/ 前缀）"""
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _cached_file_response(
+    request: Request,
+    file_path: Path,
+    media_type: str,
+    etag: str,
+    filename: Optional[str] = None
+) -> Response:
+    """
+    返回带缓存头的文件响应
+    
+    If-None-Match 命中时返回304；否则由 FileResponse 处理 Range / If-Range，
+    支持视频拖动进度时的206部分响应。
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": config.STORAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return FileResponse(
+        path=str(file_path),
+        media_type=media_type,
+        filename=filename,
+        headers=headers
+    )
+
 
 @router.get("/image/{filename}")
-async def get_generated_image(filename: str):
+async def get_generated_image(filename: str, request: Request):
     """
     获取生成的图像文件
     
     Args:
         filename: 文件名
+        request: 请求（读取条件请求头）
         
     Returns:
         图像文件
@@ -42,20 +118,23 @@ async def get_generated_image(filename: str):
             detail="不支持的文件类型"
         )
     
-    return FileResponse(
-        path=str(file_path),
-        media_type="image/png" if filename.lower().endswith('.png') else "image/jpeg",
+    return _cached_file_response(
+        request,
+        file_path,
+        content_type_for(filename),
+        await _content_etag(file_path),
         filename=filename
     )
 
 
 @router.get("/videos/{filename}")
-async def get_generated_video(filename: str):
+async def get_generated_video(filename: str, request: Request):
     """
-    获取生成的视频文件（MP4或GIF）
+    获取生成的视频文件（MP4或GIF），支持Range请求
     
     Args:
         filename: 文件名
+        request: 请求（读取Range与条件请求头）
         
     Returns:
         视频文件
@@ -82,43 +161,123 @@ async def get_generated_video(filename: str):
     else:
         media_type = "image/gif"
     
-    return FileResponse(
-        path=str(file_path),
-        media_type=media_type,
+    return _cached_file_response(
+        request,
+        file_path,
+        media_type,
+        await _content_etag(file_path),
         filename=filename
     )
 
 
-@router.get("/images")
-async def list_generated_images():
+@router.get("/assets/{storage_key:path}")
+async def get_asset(storage_key: str, request: Request):
     """
-    列出所有生成的图像文件
+    按 storage_key 获取内容寻址存储中的文件，支持Range请求
     
+    Args:
+        storage_key: 资源键（<哈希前2位>/<哈希3-4位>/<哈希>.<扩展名>）
+        request: 请求（读取Range与条件请求头）
+        
     Returns:
-        图像文件列表
+        资源文件；使用对象存储且已上传完成（或本地副本已删除）时重定向到对象地址
+    """
+    if not asset_store.is_valid_key(storage_key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"资源文件不存在: {storage_key}"
+        )
+    
+    local_exists = asset_store.exists(storage_key)
+    backend = get_storage_backend()
+    if backend.remote and (not local_exists or get_asset_uploader().is_uploaded(storage_key)):
+        # 已上传到对象存储（或本地副本已删除）时由对象存储提供，不占用API进程带宽
+        return RedirectResponse(
+            backend.object_url(storage_key),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
+    
+    if not local_exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"资源文件不存在: {storage_key}"
+        )
+    
+    # 文件名即内容哈希，无需读取文件即可得到强ETag
+    return _cached_file_response(
+        request,
+        asset_store.path_for(storage_key),
+        content_type_for(storage_key),
+        f'"{asset_store.sha256_from_key(storage_key)}"'
+    )
+
+
+# 目录可列出的变体类型（默认只列出图像）
+CATALOG_VARIANT_TYPES = IMAGE_VARIANT_TYPES + ("wan_video", "wan_video_selfie")
+
+
+@router.get("/images")
+async def list_generated_images(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    soul_id: Optional[str] = None,
+    variant_type: Optional[str] = Query(None, alias="type"),
+    db: AsyncSession = Depends(get_async_database)
+):
     """
-    images_dir = Path(GENERATED_IMAGES_DIR)
+    按生成时间倒序分页列出生成的资源（基于variant表，不扫描目录）
     
-    if not images_dir.exists():
-        return {"images": [], "total_count": 0}
+    Args:
+        limit: 每页数量
+        cursor: 上一页返回的 next_cursor（variant_id）
+        soul_id: 按Soul过滤
+        variant_type: 按变体类型过滤（查询参数 type），默认列出全部图像类型
+        db: 数据库会话
+        
+    Returns:
+        资源列表与下一页游标（没有更多时为None）
+    """
+    if cursor is not None and not is_valid_ulid(cursor):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的cursor"
+        )
+    if variant_type is not None and variant_type not in CATALOG_VARIANT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"未知的类型: {variant_type}，可选: {', '.join(CATALOG_VARIANT_TYPES)}"
+        )
     
-    image_files = []
-    for file_path in images_dir.glob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif']:
-            stat = file_path.stat()
-            image_files.append({
-                "filename": file_path.name,
-                "size": stat.st_size,
-                "created_at": stat.st_ctime,
-                "modified_at": stat.st_mtime
-            })
+    # 多取一条判断是否还有下一页
+    variants = await AsyncVariantDAL.list_catalog(
+        db,
+        limit + 1,
+        before_variant_id=cursor,
+        soul_id=soul_id,
+        variant_types=[variant_type] if variant_type else list(IMAGE_VARIANT_TYPES)
+    )
+    has_more = len(variants) > limit
+    variants = variants[:limit]
     
-    # 按修改时间排序
-    image_files.sort(key=lambda x: x["modified_at"], reverse=True)
+    images = [
+        {
+            "variant_id": variant.variant_id,
+            "soul_id": variant.soul_id,
+            "pk_id": variant.pk_id,
+            "type": variant.meta_json.get("type"),
+            "url": variant.asset_url,
+            "storage_key": variant.storage_key,
+            "size": variant.meta_json.get("file_size"),
+            "created_at_ts": ulid_timestamp_ms(variant.variant_id),
+            "updated_at_ts": variant.updated_at_ts
+        }
+        for variant in variants
+    ]
     
     return {
-        "images": image_files,
-        "total_count": len(image_files)
+        "images": images,
+        "count": len(images),
+        "next_cursor": variants[-1].variant_id if has_more else None
     }
 
 
@@ -132,6 +291,7 @@ def setup_static_files(app):
     # 确保目录存在
     os.makedirs(GENERATED_IMAGES_DIR, exist_ok=True)
     os.makedirs(GENERATED_VIDEOS_DIR, exist_ok=True)
+    os.makedirs(asset_store.root, exist_ok=True)
     
     # 挂载前端静态文件目录
     # 注意：不要挂载 /static/videos，使用路由 /static/video/{filename} 来处理视频文件
@@ -3,12 +3,12 @@
 """
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..data.models import StyleRequest, SoulStyleProfileBase
-from ..data.dal import SoulStyleProfileDAL, SoulDAL
+from ..data.async_dal import AsyncSoulStyleProfileDAL, AsyncSoulDAL
 from ..core.lww import now_ms
-from .deps import get_database, verify_soul_id
+from .deps import get_async_database, verify_soul_id
 
 router = APIRouter(prefix="/style", tags=["风格配置"])
 
@@ -16,7 +16,7 @@ router = APIRouter(prefix="/style", tags=["风格配置"])
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_or_update_style(
     style_request: StyleRequest,
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     创建或更新Soul风格配置
@@ -29,7 +29,7 @@ async def create_or_update_style(
         成功消息
     """
     # 验证Soul是否存在
-    soul = SoulDAL.get_by_id(db, style_request.soul_id)
+    soul = await AsyncSoulDAL.get_by_id(db, style_request.soul_id)
     if not soul:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -49,7 +49,7 @@ async def create_or_update_style(
     )
     
     # 保存到数据库
-    SoulStyleProfileDAL.upsert(db, style_data)
+    await AsyncSoulStyleProfileDAL.upsert(db, style_data)
     
     return {
         "message": f"Soul '{style_request.soul_id}' 风格配置已更新",
@@ -62,7 +62,7 @@ async def create_or_update_style(
 @router.get("/{soul_id}")
 async def get_style(
     soul_id: str = Depends(verify_soul_id),
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     获取Soul风格配置
@@ -74,7 +74,8 @@ async def get_style(
     Returns:
         风格配置信息
     """
-    style = SoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+    # 配置管理接口直接读取数据库，保证返回最新配置
+    style = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id, use_cache=False)
     if not style:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -96,7 +97,7 @@ async def get_style(
 @router.delete("/{soul_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_style(
     soul_id: str = Depends(verify_soul_id),
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     删除Soul风格配置
@@ -105,24 +106,22 @@ async def delete_style(
         soul_id: Soul ID
         db: 数据库会话
     """
-    style = SoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+    style = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id, use_cache=False)
     if not style:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Soul '{soul_id}' 的风格配置不存在"
         )
     
-    # 删除风格配置
-    sql = "DELETE FROM soul_style_profile WHERE soul_id = :soul_id"
-    db.execute(sql, {"soul_id": soul_id})
-    db.commit()
+    # 删除风格配置（同时使进程内缓存失效）
+    await AsyncSoulStyleProfileDAL.delete(db, soul_id)
     
     return None
 
 
 @router.get("/", response_model=List[dict])
 async def list_styles(
-    db: Session = Depends(get_database)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     获取所有Soul的风格配置列表
@@ -134,12 +133,12 @@ async def list_styles(
         风格配置列表
     """
     # 获取所有Soul
-    souls = SoulDAL.list_all(db)
+    souls = await AsyncSoulDAL.list_all(db)
     
     # 获取每个Soul的风格配置
     styles = []
     for soul in souls:
-        style = SoulStyleProfileDAL.get_by_soul_id(db, soul.soul_id)
+        style = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul.soul_id)
         if style:
             styles.append({
                 "soul_id": style.soul_id,
@@ -3,10 +3,8 @@
 """
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from ..data.dal import get_db
 from ..api.deps import verify_soul_id, verify_user_id, verify_cue, verify_city_key, verify_mood
 from ..logic.service_image import ImageGenerationService
 
@@ -28,6 +26,8 @@ class TaskResponse(BaseModel):
     result: Optional[dict] = None
     error: Optional[str] = None
     params: Optional[dict] = None
+    priority: Optional[str] = None
+    deadline_ts: Optional[int] = None
 
 
 class TaskListResponse(BaseModel):
@@ -41,7 +41,7 @@ async def start_background_generation(
     soul_id: str = Depends(verify_soul_id),
     cue: str = Depends(verify_cue),
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    deadline_ts: Optional[int] = None
 ):
     """
     启动后台图像生成任务
@@ -50,14 +50,14 @@ async def start_background_generation(
         soul_id: Soul ID
         cue: 提示词
         user_id: 用户ID
-        db: 数据库会话
+        deadline_ts: 截止时间戳（毫秒，可选），超过后仍未开始的任务将被丢弃
         
     Returns:
         任务信息
     """
     try:
-        task_id = await image_service.start_background_generation(db, soul_id, cue, user_id)
-        task_status = image_service.get_task_status(task_id)
+        task_id = await image_service.start_background_generation(soul_id, cue, user_id, deadline_ts)
+        task_status = await image_service.get_task_status(task_id)
         
         if not task_status:
             raise HTTPException(
@@ -85,7 +85,7 @@ async def start_background_selfie(
     city_key: str = Depends(verify_city_key),
     mood: str = Depends(verify_mood),
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    deadline_ts: Optional[int] = None
 ):
     """
     启动后台自拍生成任务
@@ -95,14 +95,14 @@ async def start_background_selfie(
         city_key: 城市键
         mood: 情绪
         user_id: 用户ID
-        db: 数据库会话
+        deadline_ts: 截止时间戳（毫秒，可选），超过后仍未开始的任务将被丢弃
         
     Returns:
         任务信息
     """
     try:
-        task_id = await image_service.start_background_selfie(db, soul_id, city_key, mood, user_id)
-        task_status = image_service.get_task_status(task_id)
+        task_id = await image_service.start_background_selfie(soul_id, city_key, mood, user_id, deadline_ts)
+        task_status = await image_service.get_task_status(task_id)
         
         if not task_status:
             raise HTTPException(
@@ -135,7 +135,7 @@ async def get_task_status(task_id: str):
     Returns:
         任务状态信息
     """
-    task_status = image_service.get_task_status(task_id)
+    task_status = await image_service.get_task_status(task_id)
     
     if not task_status:
         raise HTTPException(
@@ -178,7 +178,7 @@ async def list_tasks(
     列出任务
     
     Args:
-        status: 状态过滤 (pending, running, completed, failed, cancelled)
+        status: 状态过滤 (pending, running, completed, failed, cancelled, expired)
         limit: 限制数量
         offset: 偏移量
         
@@ -186,7 +186,7 @@ async def list_tasks(
         任务列表
     """
     try:
-        tasks = image_service.list_tasks(status)
+        tasks = await image_service.list_tasks(status)
         
         # 应用分页
         total_count = len(tasks)
@@ -219,7 +219,7 @@ async def get_task_stats():
         
         stats = {}
         for status in TaskStatus:
-            tasks = image_service.list_tasks(status.value)
+            tasks = await image_service.list_tasks(status.value)
             stats[status.value] = len(tasks)
         
         # 添加运行中任务数量
@@ -3,14 +3,13 @@ Wan 文本到视频API路由
 """
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..data.models import (
     WanVideoRequest, WanVideoResponse, 
     WanSelfieRequest, WanSelfieResponse
 )
-from ..data.dal import get_db
-from ..api.deps import verify_soul_id, verify_user_id, verify_cue, verify_city_key, verify_mood
+from ..api.deps import get_async_database, verify_soul_id, verify_user_id, verify_cue, verify_city_key, verify_mood
 from ..logic.service_wan_video import get_wan_video_service
 
 router = APIRouter(prefix="/wan-video", tags=["Wan文本到视频"])
@@ -21,7 +20,8 @@ async def generate_wan_video(
     soul_id: str = Depends(verify_soul_id),
     cue: str = Depends(verify_cue),
     user_id: str = Depends(verify_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database),
+    gif_profile: Optional[str] = None
 ):
     """
     生成Soul风格视频（文本到视频，自动生成GIF）
@@ -31,13 +31,16 @@ async def generate_wan_video(
         cue: 提示词
         user_id: 用户ID
         db: 数据库会话
+        gif_profile: GIF编码配置（可选，默认使用Soul配置或全局默认）
         
     Returns:
         视频生成结果（包含MP4和GIF）
     """
     try:
         wan_service = get_wan_video_service()
-        result = await wan_service.get_or_create_variant(db, soul_id, cue, user_id)
+        result = await wan_service.get_or_create_variant(
+            db, soul_id, cue, user_id, gif_profile=gif_profile
+        )
         
         return WanVideoResponse(
             mp4_url=result["mp4_url"],
@@ -62,7 +65,7 @@ async def generate_wan_video(
 @router.post("/selfie", response_model=WanSelfieResponse)
 async def create_wan_selfie(
     selfie_request: WanSelfieRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_database)
 ):
     """
     创建Soul自拍视频
@@ -83,7 +86,8 @@ async def create_wan_selfie(
         
         wan_service = get_wan_video_service()
         result = await wan_service.create_selfie(
-            db, soul_id, city_key, mood, user_id
+            db, soul_id, city_key, mood, user_id,
+            gif_profile=selfie_request.gif_profile
         )
         
         return WanSelfieResponse(
@@ -111,7 +115,8 @@ async def generate_wan_video_direct(
     positive_prompt: str,
     negative_prompt: str = "",
     seed: Optional[int] = None,
-    generate_gif: bool = True
+    generate_gif: bool = True,
+    gif_profile: Optional[str] = None
 ):
     """
     直接生成视频（不经过Soul风格处理，用于测试）
@@ -121,6 +126,7 @@ async def generate_wan_video_direct(
         negative_prompt: 负面提示词
         seed: 随机种子
         generate_gif: 是否同时生成GIF
+        gif_profile: GIF编码配置
         
     Returns:
         视频生成结果
@@ -133,7 +139,8 @@ async def generate_wan_video_direct(
             positive_prompt=positive_prompt,
             negative_prompt=negative_prompt,
             seed=seed,
-            generate_gif=generate_gif
+            generate_gif=generate_gif,
+            gif_profile=gif_profile
         )
         
         # 转换为VideoResponse格式（兼容现有前端）
@@ -153,6 +160,11 @@ async def generate_wan_video_direct(
             total_seconds=result["total_seconds"]
         )
     
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,311 @@
+"""
+持久化任务管理器 - 基于task_queue表的多worker任务队列
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Any, AsyncContextManager, Callable, ContextManager, Dict, List, Optional
+
+from ..config import config
+from ..core.lww import now_ms
+from ..data.dal import TaskQueueDAL
+from .task_manager import (
+    BackgroundTask, TaskStatus, TaskType, TASK_TYPE_PRIORITY, TaskPriority, compute_sched_ts
+)
+
+
+def _ts_to_iso(ts: Optional[int]) -> Optional[str]:
+    """毫秒时间戳转ISO字符串（与BackgroundTask.to_dict格式一致）"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts / 1000).isoformat()
+
+
+class DurableTaskManager:
+    """
+    持久化任务管理器
+
+    与 TaskManager 接口一致，但任务保存在 task_queue 表中：
+    - 任意worker都可以认领（FOR UPDATE SKIP LOCKED），吞吐随worker数量水平扩展
+    - 运行中的任务定期心跳续约；worker崩溃后租约过期，任务被其他worker重新认领
+    - 任务状态从数据库读取，/tasks/{task_id} 在任何worker上都能查到
+
+    任务函数无法持久化，需要按 TaskType 通过 register_handler 注册。
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        session_factory: Optional[Callable[[], ContextManager[Any]]] = None,
+        job_session_factory: Optional[Callable[[], AsyncContextManager[Any]]] = None,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        heartbeat_seconds: Optional[float] = None,
+        poll_interval_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None
+    ):
+        if session_factory is None:
+            raise ValueError("DurableTaskManager 需要 session_factory")
+        # 队列自身的读写在线程中使用同步会话；任务函数使用异步会话（未指定时沿用同步会话）
+        self.session_factory = session_factory
+        self.job_session_factory = job_session_factory or session_factory
+        self.max_concurrent = max_concurrent
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ms = int((lease_seconds or config.TASK_LEASE_SECONDS) * 1000)
+        self.heartbeat_seconds = heartbeat_seconds or config.TASK_HEARTBEAT_SECONDS
+        self.poll_interval_seconds = poll_interval_seconds or config.TASK_POLL_INTERVAL_SECONDS
+        self.max_attempts = max_attempts or config.TASK_MAX_ATTEMPTS
+        self.handlers: Dict[TaskType, Callable] = {}
+        # 本worker正在执行的任务
+        self.tasks: Dict[str, BackgroundTask] = {}
+        self.running_tasks: Dict[str, asyncio.Task] = {}
+        self._consumer: Optional[asyncio.Task] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        # 已创建尚未入队的任务：task_id -> (任务类型, 截止时间)
+        self._deadlines: Dict[str, Any] = {}
+
+    def register_handler(self, task_type: TaskType, handler: Callable) -> None:
+        """注册任务类型的处理函数 `async def handler(task, job_session_factory)`"""
+        self.handlers[task_type] = handler
+
+    def _db(self, fn: Callable, *args, **kwargs):
+        """在短生命周期会话中执行DAL方法"""
+        with self.session_factory() as db:
+            return fn(db, *args, **kwargs)
+
+    async def _run_db(self, fn: Callable, *args, **kwargs):
+        """在线程中执行DAL方法，避免阻塞事件循环"""
+        return await asyncio.to_thread(self._db, fn, *args, **kwargs)
+
+    def start(self) -> None:
+        """启动消费循环（每个worker进程启动时调用）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._consumer is None or self._consumer.done():
+            self._consumer = loop.create_task(self._consumer_loop())
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = loop.create_task(self._cleanup_old_tasks())
+
+    async def stop(self) -> None:
+        """停止消费循环（运行中的任务租约过期后由其他worker接管）"""
+        self._stopping = True
+        for background in (self._consumer, self._cleanup_task):
+            if background is not None:
+                background.cancel()
+        for running_task in list(self.running_tasks.values()):
+            running_task.cancel()
+
+    async def _consumer_loop(self):
+        """消费循环：有空闲并发名额时从task_queue认领任务"""
+        task_types = [task_type.value for task_type in self.handlers]
+        while True:
+            try:
+                if len(self.running_tasks) >= self.max_concurrent or not task_types:
+                    await self._wait(self.poll_interval_seconds)
+                    continue
+
+                row = await self._run_db(
+                    TaskQueueDAL.claim, self.worker_id, self.lease_ms, self.max_attempts, task_types
+                )
+                if row is None:
+                    await self._wait(self.poll_interval_seconds)
+                    continue
+
+                self._spawn(row)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"任务队列消费出错: {e}")
+                await self._wait(self.poll_interval_seconds)
+
+    async def _wait(self, timeout: float) -> None:
+        """等待新任务入队、任务结束或超时"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _spawn(self, row: Dict[str, Any]) -> None:
+        """为认领到的任务创建可取消的asyncio.Task"""
+        task = BackgroundTask(
+            row["task_id"], TaskType(row["task_type"]), row["params_json"] or {}, row.get("deadline_ts")
+        )
+        task.status = TaskStatus.RUNNING
+        task.started_at = datetime.now()
+        task.progress = row.get("progress") or 0
+        self.tasks[task.task_id] = task
+        self.running_tasks[task.task_id] = asyncio.get_running_loop().create_task(self._execute(task))
+
+    async def _execute(self, task: BackgroundTask) -> None:
+        """执行任务并维持租约"""
+        handler = self.handlers[task.task_type]
+        job = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat_loop(task, job))
+        status, result, error = TaskStatus.FAILED.value, None, None
+        try:
+            result = await handler(task, self.job_session_factory)
+            status = TaskStatus.CANCELLED.value if task.cancelled else TaskStatus.COMPLETED.value
+            if task.cancelled:
+                error = "任务被取消"
+        except asyncio.CancelledError:
+            status, error = TaskStatus.CANCELLED.value, "任务被取消"
+        except Exception as e:
+            error = task.error or str(e)
+            print(f"任务 {task.task_id} 执行失败: {e}")
+        finally:
+            heartbeat.cancel()
+            self.running_tasks.pop(task.task_id, None)
+            self.tasks.pop(task.task_id, None)
+
+        if self._stopping and not task.cancelled:
+            # worker关闭导致的中断不写入结果，租约过期后由其他worker重新执行
+            return
+
+        try:
+            await self._run_db(
+                TaskQueueDAL.finish, task.task_id, self.worker_id, status,
+                result=result, error=error,
+                progress=100 if status == TaskStatus.COMPLETED.value else task.progress
+            )
+        except Exception as e:
+            print(f"写入任务 {task.task_id} 结果失败: {e}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _heartbeat_loop(self, task: BackgroundTask, job: asyncio.Task) -> None:
+        """定期续约；租约丢失或收到取消请求时中断任务"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                cancel_requested = await self._run_db(
+                    TaskQueueDAL.heartbeat, task.task_id, self.worker_id, self.lease_ms, task.progress
+                )
+            except Exception as e:
+                print(f"任务 {task.task_id} 心跳失败: {e}")
+                continue
+            if cancel_requested is None or cancel_requested:
+                reason = "租约已丢失" if cancel_requested is None else "收到取消请求"
+                print(f"中断任务 {task.task_id}: {reason}")
+                await task.cancel()
+                job.cancel()
+                return
+
+    async def _cleanup_old_tasks(self):
+        """定期删除过期的已结束任务"""
+        while True:
+            try:
+                await asyncio.sleep(300)
+                cutoff_ts = now_ms() - int(config.TASK_RETENTION_HOURS * 3600 * 1000)
+                removed = await self._run_db(TaskQueueDAL.purge_finished, cutoff_ts)
+                if removed:
+                    print(f"清理了 {removed} 个旧任务")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"清理任务时出错: {e}")
+
+    async def create_task(
+        self,
+        task_type: TaskType,
+        params: Dict[str, Any],
+        deadline_ts: Optional[int] = None
+    ) -> str:
+        """创建新任务（deadline_ts 为截止时间戳，超过后尚未开始的任务会被丢弃）"""
+        if task_type not in self.handlers:
+            raise ValueError(f"任务类型 {task_type.value} 未注册处理函数")
+        if deadline_ts is not None and deadline_ts <= now_ms():
+            raise ValueError("deadline_ts 已经过去")
+        self.start()
+        task_id = str(uuid.uuid4())
+        await self._run_db(TaskQueueDAL.create, task_id, task_type.value, params, deadline_ts)
+        self._deadlines[task_id] = (task_type, deadline_ts)
+        return task_id
+
+    async def start_task(self, task_id: str, coro_func: Optional[Callable] = None, *args, **kwargs):
+        """
+        启动任务（放入持久化队列）
+
+        coro_func 仅为兼容 TaskManager 接口，实际执行的是按任务类型注册的处理函数。
+        """
+        self.start()
+        task_type, deadline_ts = self._deadlines.pop(task_id, (None, None))
+        if task_type is None:
+            row = await self._run_db(TaskQueueDAL.get, task_id)
+            if row is None:
+                raise ValueError(f"任务 {task_id} 不存在")
+            task_type, deadline_ts = TaskType(row["task_type"]), row["deadline_ts"]
+        sched_ts = compute_sched_ts(task_type, now_ms(), deadline_ts)
+        if not await self._run_db(TaskQueueDAL.enqueue, task_id, sched_ts):
+            raise ValueError(f"任务 {task_id} 不存在或状态不是 PENDING")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        print(f"任务 {task_id} 已加入持久化队列")
+
+    async def cancel_task(self, task_id: str) -> bool:
+        """取消任务（运行在其他worker上的任务在其下一次心跳时中断）"""
+        new_status = await self._run_db(TaskQueueDAL.request_cancel, task_id)
+        if new_status is None:
+            return False
+
+        running_task = self.running_tasks.get(task_id)
+        if running_task is not None:
+            print(f"取消正在运行的异步任务: {task_id}")
+            await self.tasks[task_id].cancel()
+            running_task.cancel()
+            try:
+                await running_task
+            except asyncio.CancelledError:
+                pass
+        return True
+
+    def _row_to_status(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """数据库行转换为任务状态字典"""
+        local = self.tasks.get(row["task_id"])
+        return {
+            "task_id": row["task_id"],
+            "task_type": row["task_type"],
+            "status": row["status"],
+            # 本worker运行中的任务使用内存中的实时进度
+            "progress": local.progress if local else row["progress"],
+            "created_at": _ts_to_iso(row["created_at_ts"]),
+            "started_at": _ts_to_iso(row["started_at_ts"]),
+            "completed_at": _ts_to_iso(row["completed_at_ts"]),
+            "result": row["result_json"],
+            "error": row["error"],
+            "params": row["params_json"],
+            "priority": TASK_TYPE_PRIORITY.get(
+                TaskType(row["task_type"]), TaskPriority.NORMAL
+            ).value,
+            "deadline_ts": row["deadline_ts"]
+        }
+
+    def get_task(self, task_id: str) -> Optional[BackgroundTask]:
+        """获取本worker正在执行的任务"""
+        return self.tasks.get(task_id)
+
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态（从数据库读取，任意worker均可查询）"""
+        row = await self._run_db(TaskQueueDAL.get, task_id)
+        if row:
+            return self._row_to_status(row)
+        return None
+
+    async def list_tasks(self, status_filter: Optional[TaskStatus] = None) -> List[Dict[str, Any]]:
+        """列出任务（按创建时间倒序）"""
+        rows = await self._run_db(
+            TaskQueueDAL.list_tasks, status_filter.value if status_filter else None
+        )
+        return [self._row_to_status(row) for row in rows]
+
+    def get_running_tasks_count(self) -> int:
+        """获取本worker正在运行的任务数量"""
+        return len(self.running_tasks)
@@ -48,6 +48,22 @@ def _encode_random(random_bits: int) -> str:
     return result
 
 
+_ULID_CHARS = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def is_valid_ulid(value: str) -> bool:
+    """检查是否为26字符的ULID"""
+    return len(value) == 26 and all(c in _ULID_CHARS for c in value)
+
+
+def ulid_timestamp_ms(ulid: str) -> int:
+    """从ULID的前10个字符解码毫秒时间戳"""
+    timestamp = 0
+    for c in ulid[:10]:
+        timestamp = timestamp * 32 + _ULID_CHARS.index(c)
+    return timestamp
+
+
 def generate_idempotency_key() -> str:
     """生成幂等性键"""
     return f"idem_{generate_ulid()}"
@@ -0,0 +1,150 @@
+"""
+生成任务调度器 - 按后端划分并发槽位，按用户/Soul公平排队
+"""
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from ..config import config
+
+
+class _BackendSlots:
+    """单个生成后端的槽位与公平等待队列"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        # fair_key -> 等待者队列；按轮转顺序依次放行各key的队首
+        self.queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.granted = 0
+        self.queued = 0
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def dispatch(self) -> None:
+        """有空闲槽位时按轮转顺序唤醒等待者"""
+        while self.active < self.limit and self.queues:
+            fair_key, queue = next(iter(self.queues.items()))
+            future = queue.popleft()
+            if queue:
+                # 该key仍有等待者，移到队尾，让其他key先获得槽位
+                self.queues.move_to_end(fair_key)
+            else:
+                del self.queues[fair_key]
+            if future.done():
+                continue
+            self.active += 1
+            self.granted += 1
+            future.set_result(True)
+
+
+class GenerationScheduler:
+    """
+    生成调度器
+
+    每个后端（Wan图像 / Wan视频）拥有独立的并发槽位，慢速的视频任务不会占满
+    图像生成的容量；同一后端内按 fair_key（用户或Soul）轮转放行，单个用户的
+    大量请求不会饿死其他用户。缓存命中的请求不经过调度器。
+    """
+
+    BACKEND_WAN_IMAGE = "wan_image"
+    BACKEND_WAN_VIDEO = "wan_video"
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        if limits is None:
+            limits = {
+                self.BACKEND_WAN_IMAGE: config.SCHEDULER_WAN_IMAGE_SLOTS,
+                self.BACKEND_WAN_VIDEO: config.SCHEDULER_WAN_VIDEO_SLOTS
+            }
+        self._backends: Dict[str, _BackendSlots] = {
+            backend: _BackendSlots(limit) for backend, limit in limits.items()
+        }
+
+    def _get_backend(self, backend: str) -> _BackendSlots:
+        slots = self._backends.get(backend)
+        if slots is None:
+            raise ValueError(f"未知的生成后端: {backend}")
+        return slots
+
+    async def acquire(self, backend: str, fair_key: str = "default") -> None:
+        """
+        获取后端槽位（无空闲槽位时按fair_key排队）
+
+        Args:
+            backend: 生成后端
+            fair_key: 公平排队键（用户ID或Soul ID）
+        """
+        slots = self._get_backend(backend)
+        if slots.active < slots.limit and not slots.queues:
+            slots.active += 1
+            slots.granted += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        slots.queues.setdefault(fair_key, deque()).append(future)
+        slots.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分配到槽位但调用方被取消，归还槽位
+                self.release(backend)
+            else:
+                queue = slots.queues.get(fair_key)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del slots.queues[fair_key]
+            raise
+
+    def release(self, backend: str) -> None:
+        """释放后端槽位并唤醒下一个等待者"""
+        slots = self._get_backend(backend)
+        slots.active = max(0, slots.active - 1)
+        slots.dispatch()
+
+    @asynccontextmanager
+    async def slot(self, backend: str, fair_key: Optional[str] = None):
+        """
+        槽位上下文管理器
+
+        Usage:
+            async with generation_scheduler.slot("wan_image", user_id):
+                # 调用生成后端
+                pass
+        """
+        await self.acquire(backend, fair_key or "default")
+        try:
+            yield
+        finally:
+            self.release(backend)
+
+    def is_idle(self, backend: str) -> bool:
+        """后端是否有空闲槽位且无人排队"""
+        slots = self._get_backend(backend)
+        return slots.active < slots.limit and not slots.queues
+
+    def utilization(self, backend: str) -> float:
+        """后端槽位占用比例（0-1）"""
+        slots = self._get_backend(backend)
+        return slots.active / slots.limit if slots.limit else 1.0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各后端槽位使用统计"""
+        return {
+            backend: {
+                "limit": slots.limit,
+                "active": slots.active,
+                "waiting": slots.waiting(),
+                "waiting_keys": len(slots.queues),
+                "granted": slots.granted,
+                "queued": slots.queued
+            }
+            for backend, slots in self._backends.items()
+        }
+
+
+# 全局调度器实例
+generation_scheduler = GenerationScheduler()
@@ -0,0 +1,93 @@
+"""
+请求合并（single-flight）- 相同键的并发生成只执行一次
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    进程内请求合并器
+
+    同一键同时只有一个调用者（leader）真正执行生成，其余调用者（follower）
+    挂在leader的future上等待同一结果，避免流量高峰时重复调用上游API。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行或加入同键的进行中调用
+
+        Args:
+            key: 合并键
+            fn: 无参协程函数，仅由leader执行
+
+        Returns:
+            (结果, 是否为leader)。leader失败时异常同样抛给所有follower；
+            leader被取消时follower重新竞争执行，不会跟着被取消
+        """
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future), False
+            except asyncio.CancelledError:
+                # leader被取消（而非本调用者被取消）时重新竞争
+                if future.cancelled() and not self._current_task_cancelling():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有follower时避免"异常未被读取"警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    @staticmethod
+    def _current_task_cancelling() -> bool:
+        """当前任务自身是否正在被取消（Python 3.11+ 才能区分）"""
+        task = asyncio.current_task()
+        cancelling = getattr(task, "cancelling", None)
+        return bool(cancelling()) if cancelling else False
+
+    def in_flight(self) -> int:
+        """进行中的合并键数量"""
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """运行统计（供 /stats 接口使用）"""
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
+
+
+# 全局实例：键为 "<媒体类型>|<pk_id>"，图像与视频分开合并
+generation_flights = SingleFlight()
+
+
+def flight_key(media_type: str, pk_id: str) -> str:
+    """生成合并键"""
+    return f"{media_type}|{pk_id}"
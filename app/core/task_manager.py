@@ -2,12 +2,15 @@
 后台任务管理系统
 """
 import asyncio
+import itertools
 import uuid
-from typing import Dict, Any, Optional, List
+from typing import AsyncContextManager, Callable, Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from enum import Enum
 import json
 
+from .lww import now_ms
+
 
 class TaskStatus(Enum):
     """任务状态枚举"""
@@ -16,6 +19,7 @@ class TaskStatus(Enum):
     COMPLETED = "completed"  # 已完成
     FAILED = "failed"        # 失败
     CANCELLED = "cancelled"   # 已取消
+    EXPIRED = "expired"      # 超过截止时间，未执行
 
 
 class TaskType(Enum):
@@ -24,13 +28,70 @@ class TaskType(Enum):
     SELFIE_GENERATION = "selfie_generation"
 
 
+class TaskPriority(Enum):
+    """任务优先级"""
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+# 任务类型对应的优先级：风格生成多数命中缓存，耗时短，优先执行；自拍总是调用生成后端
+TASK_TYPE_PRIORITY: Dict[TaskType, TaskPriority] = {
+    TaskType.STYLE_GENERATION: TaskPriority.HIGH,
+    TaskType.SELFIE_GENERATION: TaskPriority.NORMAL,
+}
+
+# 各优先级的排队偏移（秒）。排队顺序按 入队时间 + 偏移，
+# 低优先级任务等待超过偏移差后会排到新来的高优先级任务之前，不会被饿死
+PRIORITY_OFFSET_SECONDS: Dict[TaskPriority, float] = {
+    TaskPriority.HIGH: 0,
+    TaskPriority.NORMAL: 30,
+    TaskPriority.LOW: 300,
+}
+
+# 各任务类型的预计执行时长（秒），有截止时间的任务需要提前这么久开始
+TASK_TYPE_EXPECTED_SECONDS: Dict[TaskType, float] = {
+    TaskType.STYLE_GENERATION: 30,
+    TaskType.SELFIE_GENERATION: 30,
+}
+
+
+def compute_sched_ts(task_type: TaskType, enqueued_at_ts: int, deadline_ts: Optional[int] = None) -> int:
+    """
+    计算任务的排队时间戳（越小越先执行）
+    
+    Args:
+        task_type: 任务类型
+        enqueued_at_ts: 入队时间戳（毫秒）
+        deadline_ts: 客户端截止时间戳（毫秒）
+        
+    Returns:
+        排队时间戳（毫秒）
+    """
+    priority = TASK_TYPE_PRIORITY.get(task_type, TaskPriority.NORMAL)
+    sched_ts = enqueued_at_ts + int(PRIORITY_OFFSET_SECONDS[priority] * 1000)
+    if deadline_ts is not None:
+        # 紧急任务：截止时间减去预计执行时长早于常规排队位置时提前
+        latest_start_ts = deadline_ts - int(TASK_TYPE_EXPECTED_SECONDS.get(task_type, 30) * 1000)
+        sched_ts = min(sched_ts, latest_start_ts)
+    return sched_ts
+
+
 class BackgroundTask:
     """后台任务类"""
     
-    def __init__(self, task_id: str, task_type: TaskType, params: Dict[str, Any]):
+    def __init__(
+        self,
+        task_id: str,
+        task_type: TaskType,
+        params: Dict[str, Any],
+        deadline_ts: Optional[int] = None
+    ):
         self.task_id = task_id
         self.task_type = task_type
         self.params = params
+        self.priority = TASK_TYPE_PRIORITY.get(task_type, TaskPriority.NORMAL)
+        self.deadline_ts = deadline_ts
         self.status = TaskStatus.PENDING
         self.created_at = datetime.now()
         self.started_at: Optional[datetime] = None
@@ -53,9 +114,15 @@ class BackgroundTask:
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
             "result": self.result,
             "error": self.error,
-            "params": self.params
+            "params": self.params,
+            "priority": self.priority.value,
+            "deadline_ts": self.deadline_ts
         }
     
+    def is_expired(self) -> bool:
+        """是否已超过截止时间"""
+        return self.deadline_ts is not None and now_ms() > self.deadline_ts
+    
     async def cancel(self):
         """取消任务"""
         self.cancelled = True
@@ -65,18 +132,47 @@ class BackgroundTask:
 
 
 class TaskManager:
-    """任务管理器"""
+    """
+    任务管理器
+    
+    任务函数签名为 `async def job(task, session_factory, *args, **kwargs)`。
+    任务不持有请求的数据库会话，而是在每个工作单元中通过
+    `async with session_factory() as db` 打开短生命周期的异步会话
+    （连接来自有界连接池），等待生成结果期间不占用连接，数据库IO也不阻塞事件循环。
+    """
     
-    def __init__(self, max_concurrent: int = 2):
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        session_factory: Optional[Callable[[], AsyncContextManager[Any]]] = None
+    ):
+        self.session_factory = session_factory
+        self.handlers: Dict[TaskType, Any] = {}
         self.tasks: Dict[str, BackgroundTask] = {}
         self.running_tasks: Dict[str, asyncio.Task] = {}
-        self.task_queue: asyncio.Queue = asyncio.Queue()
+        # 优先级队列：(排队时间戳, 序号, task_id, coro_func, args, kwargs)
+        self.task_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
         self.max_concurrent = max_concurrent
         self.semaphore = asyncio.Semaphore(max_concurrent)
         self._cleanup_task: Optional[asyncio.Task] = None
         self._queue_processor: Optional[asyncio.Task] = None
         self._loop: Optional[asyncio.AbstractEventLoop] = None
     
+    def register_handler(self, task_type: TaskType, handler) -> None:
+        """注册任务类型的处理函数（内存队列直接使用 start_task 传入的函数，此处仅记录）"""
+        self.handlers[task_type] = handler
+    
+    def start(self) -> None:
+        """启动后台循环（应用启动时调用）"""
+        self._ensure_background_tasks()
+    
+    async def stop(self) -> None:
+        """停止后台循环"""
+        for background in (self._cleanup_task, self._queue_processor):
+            if background is not None:
+                background.cancel()
+    
     def _ensure_background_tasks(self):
         """确保后台任务已经在事件循环中运行"""
         try:
@@ -93,21 +189,50 @@ class TaskManager:
             self._queue_processor = loop.create_task(self._queue_processor_loop())
     
     async def _queue_processor_loop(self):
-        """队列处理器循环 - 按顺序处理任务"""
+        """队列分发循环 - 有空闲名额时取出排队时间戳最小的任务，启动独立的asyncio.Task"""
         while True:
             try:
-                # 从队列获取任务
-                task_id, coro_func, args, kwargs = await self.task_queue.get()
+                # 先等待空闲名额，再取任务，保证取出的是此刻最优先的任务
+                await self.semaphore.acquire()
+                try:
+                    _, _, task_id, coro_func, args, kwargs = await self.task_queue.get()
+                except BaseException:
+                    self.semaphore.release()
+                    raise
+                
+                task = self.tasks.get(task_id)
+                if task is None or task.cancelled:
+                    # 排队期间已被取消或清理
+                    self.semaphore.release()
+                    self.task_queue.task_done()
+                    continue
                 
-                # 使用信号量限制并发
-                async with self.semaphore:
-                    await self._run_task(self.tasks[task_id], coro_func, *args, **kwargs)
+                if task.is_expired():
+                    # 已超过截止时间，不再消耗上游配额
+                    task.status = TaskStatus.EXPIRED
+                    task.completed_at = datetime.now()
+                    task.error = "任务已超过截止时间，未执行"
+                    print(f"任务 {task_id} 已过期，丢弃")
+                    self.semaphore.release()
+                    self.task_queue.task_done()
+                    continue
                 
-                # 标记任务完成
-                self.task_queue.task_done()
+                running_task = asyncio.create_task(self._run_task(task, coro_func, *args, **kwargs))
+                self.running_tasks[task_id] = running_task
+                running_task.add_done_callback(
+                    lambda _, task_id=task_id: self._on_task_done(task_id)
+                )
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 print(f"队列处理器出错: {e}")
     
+    def _on_task_done(self, task_id: str) -> None:
+        """任务结束后释放并发名额"""
+        self.running_tasks.pop(task_id, None)
+        self.semaphore.release()
+        self.task_queue.task_done()
+    
     async def _cleanup_old_tasks(self):
         """清理旧任务"""
         while True:
@@ -117,7 +242,7 @@ class TaskManager:
                 
                 tasks_to_remove = []
                 for task_id, task in self.tasks.items():
-                    if (task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED] 
+                    if (task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.EXPIRED] 
                         and task.created_at < cutoff_time):
                         tasks_to_remove.append(task_id)
                 
@@ -134,11 +259,25 @@ class TaskManager:
             except Exception as e:
                 print(f"清理任务时出错: {e}")
     
-    def create_task(self, task_type: TaskType, params: Dict[str, Any]) -> str:
-        """创建新任务"""
+    async def create_task(
+        self,
+        task_type: TaskType,
+        params: Dict[str, Any],
+        deadline_ts: Optional[int] = None
+    ) -> str:
+        """
+        创建新任务
+        
+        Args:
+            task_type: 任务类型（决定优先级）
+            params: 任务参数
+            deadline_ts: 截止时间戳（毫秒），超过后尚未开始的任务会被丢弃
+        """
+        if deadline_ts is not None and deadline_ts <= now_ms():
+            raise ValueError("deadline_ts 已经过去")
         self._ensure_background_tasks()
         task_id = str(uuid.uuid4())
-        task = BackgroundTask(task_id, task_type, params)
+        task = BackgroundTask(task_id, task_type, params, deadline_ts)
         self.tasks[task_id] = task
         return task_id
     
@@ -155,8 +294,9 @@ class TaskManager:
         # 更新任务状态为等待中
         task.status = TaskStatus.PENDING  # 保持PENDING状态直到从队列取出
         
-        # 将任务加入队列
-        await self.task_queue.put((task_id, coro_func, args, kwargs))
+        # 将任务加入优先级队列（按优先级偏移和截止时间排序）
+        sched_ts = compute_sched_ts(task.task_type, now_ms(), task.deadline_ts)
+        await self.task_queue.put((sched_ts, next(self._seq), task_id, coro_func, args, kwargs))
         
         # 队列处理器会自动处理这个任务
         print(f"任务 {task_id} 已加入队列（队列长度: {self.task_queue.qsize()}）")
@@ -173,11 +313,9 @@ class TaskManager:
             # 更新任务状态为运行中
             task.status = TaskStatus.RUNNING
             task.started_at = datetime.now()
-            if task.task_id not in self.running_tasks:
-                self.running_tasks[task.task_id] = None  # 标记为运行中
             
             # 执行任务
-            result = await coro_func(task, *args, **kwargs)
+            result = await coro_func(task, self.session_factory, *args, **kwargs)
             
             # 检查是否被取消
             if task.cancelled:
@@ -200,10 +338,6 @@ class TaskManager:
             task.completed_at = datetime.now()
             task.error = str(e)
             print(f"任务 {task.task_id} 执行失败: {e}")
-        finally:
-            # 清理运行中的任务记录
-            if task.task_id in self.running_tasks:
-                del self.running_tasks[task.task_id]
     
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
@@ -212,7 +346,7 @@ class TaskManager:
         
         task = self.tasks[task_id]
         
-        if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+        if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.EXPIRED]:
             return False
         
         print(f"正在取消任务: {task_id}")
@@ -238,14 +372,14 @@ class TaskManager:
         """获取任务"""
         return self.tasks.get(task_id)
     
-    def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务状态"""
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态（与 DurableTaskManager 接口一致，均为协程）"""
         task = self.tasks.get(task_id)
         if task:
             return task.to_dict()
         return None
     
-    def list_tasks(self, status_filter: Optional[TaskStatus] = None) -> List[Dict[str, Any]]:
+    async def list_tasks(self, status_filter: Optional[TaskStatus] = None) -> List[Dict[str, Any]]:
         """列出任务"""
         tasks = []
         for task in self.tasks.values():
@@ -0,0 +1,128 @@
+"""
+异步数据访问层 - 基于asyncpg的异步引擎和会话
+
+DAL的SQL只在 dal.py 中维护一份：异步DAL通过 AsyncSession.run_sync 在
+asyncpg连接上执行同步DAL方法，数据库IO期间不会阻塞事件循环。
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Callable
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from ..config import config
+from .dal import (
+    DATABASE_URL, SoulDAL, SoulStyleProfileDAL, PromptKeyDAL, EmbeddingCacheDAL,
+    VariantDAL, UserSeenDAL, LandmarkLogDAL, WorkLockDAL, IdempotencyDAL
+)
+
+
+def _async_database_url(url: str) -> str:
+    """将 postgresql:// / postgresql+psycopg2:// 地址转换为asyncpg驱动地址"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """获取异步数据库引擎（首次调用时创建，需要asyncpg驱动）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        connect_args = {}
+        if config.DB_STATEMENT_TIMEOUT_MS > 0:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(config.DB_STATEMENT_TIMEOUT_MS)
+            }
+        _async_engine = create_async_engine(
+            _async_database_url(DATABASE_URL),
+            echo=config.DB_ECHO,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+            pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            pool_pre_ping=True,
+            connect_args=connect_args
+        )
+        _async_session_factory = async_sessionmaker(
+            _async_engine, expire_on_commit=False, autoflush=False
+        )
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """创建异步数据库会话"""
+    get_async_engine()
+    return _async_session_factory()
+
+
+async def dispose_async_engine() -> None:
+    """关闭异步连接池（应用关闭时调用）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话（FastAPI依赖）"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """
+    异步会话上下文（用于后台任务）
+
+    Usage:
+        async with async_session_scope() as db:
+            soul = await AsyncSoulDAL.get_by_id(db, "nova")
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+
+class _AsyncDAL:
+    """
+    同步DAL的异步包装
+
+    每个静态方法都变为 `await AsyncXxxDAL.method(async_db, *args)`，
+    在 run_sync 中以同步Session调用原方法。
+    """
+
+    def __init__(self, dal_cls: type):
+        self._dal_cls = dal_cls
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(self._dal_cls, name)
+
+        async def call(db: AsyncSession, *args, **kwargs):
+            return await db.run_sync(lambda session: method(session, *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def __repr__(self) -> str:
+        return f"<Async{self._dal_cls.__name__}>"
+
+
+AsyncSoulDAL = _AsyncDAL(SoulDAL)
+AsyncSoulStyleProfileDAL = _AsyncDAL(SoulStyleProfileDAL)
+AsyncPromptKeyDAL = _AsyncDAL(PromptKeyDAL)
+AsyncEmbeddingCacheDAL = _AsyncDAL(EmbeddingCacheDAL)
+AsyncVariantDAL = _AsyncDAL(VariantDAL)
+AsyncUserSeenDAL = _AsyncDAL(UserSeenDAL)
+AsyncLandmarkLogDAL = _AsyncDAL(LandmarkLogDAL)
+AsyncWorkLockDAL = _AsyncDAL(WorkLockDAL)
+AsyncIdempotencyDAL = _AsyncDAL(IdempotencyDAL)
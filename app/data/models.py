@@ -190,6 +190,7 @@ class WanSelfieRequest(BaseModel):
     city_key: str = Field(..., description="城市键")
     mood: str = Field(..., description="情绪")
     user_id: str = Field(..., description="用户ID")
+    gif_profile: Optional[str] = Field(None, description="GIF编码配置（full/default/compact/preview）")
 
 
 class WanSelfieResponse(BaseModel):
@@ -0,0 +1,85 @@
+"""
+Soul风格配置进程内缓存 - 按soul_id缓存，结合updated_at_ts实现LWW感知
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import config
+from ..core.lww import now_ms
+from .models import SoulStyleProfileBase
+
+
+class StyleProfileCache:
+    """风格配置缓存"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = config.STYLE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        # soul_id -> (风格配置或None, updated_at_ts, 过期时间)
+        self._entries: Dict[str, Tuple[Optional[SoulStyleProfileBase], int, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, soul_id: str) -> Tuple[bool, Optional[SoulStyleProfileBase]]:
+        """
+        读取缓存
+
+        Args:
+            soul_id: Soul ID
+
+        Returns:
+            (是否命中, 风格配置)，命中但配置不存在时返回 (True, None)
+        """
+        with self._lock:
+            entry = self._entries.get(soul_id)
+            if entry is not None:
+                profile, _, expires_at = entry
+                if self.ttl_seconds <= 0 or time.monotonic() < expires_at:
+                    self.hits += 1
+                    return True, profile
+                del self._entries[soul_id]
+            self.misses += 1
+            return False, None
+
+    def put(self, soul_id: str, profile: Optional[SoulStyleProfileBase]) -> None:
+        """
+        写入缓存（LWW：不会用更旧的updated_at_ts覆盖已缓存的配置）
+
+        Args:
+            soul_id: Soul ID
+            profile: 风格配置，None表示不存在
+        """
+        updated_at_ts = profile.updated_at_ts if profile else 0
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            entry = self._entries.get(soul_id)
+            if entry is not None and entry[1] > updated_at_ts:
+                return
+            self._entries[soul_id] = (profile, updated_at_ts, expires_at)
+
+    def invalidate(self, soul_id: Optional[str] = None) -> None:
+        """
+        使缓存失效（删除配置时调用，soul_id为None时清空全部）
+
+        单个soul_id失效时写入带当前时间戳的"不存在"记录（墓碑），
+        删除前已读到旧配置的并发读者随后写回缓存时会被拒绝
+        """
+        with self._lock:
+            if soul_id is None:
+                self._entries.clear()
+            else:
+                self._entries[soul_id] = (None, now_ms(), time.monotonic() + self.ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# 全局风格配置缓存实例
+style_profile_cache = StyleProfileCache()
@@ -0,0 +1,132 @@
+"""
+生成结果文件下载 - 分块写入临时文件、断点续传、流式计算内容哈希、原子替换
+"""
+import asyncio
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+
+from ..config import config
+
+
+class IncompleteDownloadError(RuntimeError):
+    """连接中断导致下载内容不完整"""
+
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+def _expected_total(response: httpx.Response, offset: int) -> Optional[int]:
+    """根据响应头计算文件总大小（未知时返回None）"""
+    if response.status_code == 206:
+        match = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+        if match and match.group(3) != "*":
+            return int(match.group(3))
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None:
+        return offset + int(content_length)
+    return None
+
+
+def _is_retryable_status(status_code: int) -> bool:
+    """服务端错误与限流可重试，其余4xx直接失败"""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+async def download_asset(
+    client: httpx.AsyncClient,
+    url: str,
+    dest_path: Path,
+    chunk_size: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    retry_backoff_seconds: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    下载文件到 dest_path
+
+    数据先写入同目录的 .part 临时文件，同时计算SHA-256；连接中断时使用
+    Range 请求从已写入的位置续传（服务端不支持Range时从头重新下载）；
+    全部写入并校验长度后才原子替换到目标路径，不会留下被当作成品的截断文件。
+
+    Args:
+        client: 共享的HTTP连接池
+        url: 文件URL
+        dest_path: 目标路径
+        chunk_size: 读取块大小
+        max_retries: 最大重试次数
+        retry_backoff_seconds: 重试退避基数（秒，按2的幂递增）
+
+    Returns:
+        {"path", "bytes", "sha256", "attempts"}
+    """
+    chunk_size = chunk_size or config.DOWNLOAD_CHUNK_BYTES
+    max_retries = config.DOWNLOAD_MAX_RETRIES if max_retries is None else max_retries
+    backoff = (
+        config.DOWNLOAD_RETRY_BACKOFF_SECONDS if retry_backoff_seconds is None else retry_backoff_seconds
+    )
+
+    dest_path = Path(dest_path)
+    tmp_path = dest_path.with_name(dest_path.name + ".part")
+    hasher = hashlib.sha256()
+    written = 0
+    attempts = 0
+
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                attempts += 1
+                # 使用identity编码，保证Range偏移与写入字节数一致
+                headers = {"Accept-Encoding": "identity"}
+                if written:
+                    headers["Range"] = f"bytes={written}-"
+                try:
+                    async with client.stream("GET", url, headers=headers) as response:
+                        if written and response.status_code == 200:
+                            # 服务端忽略了Range，从头开始
+                            f.seek(0)
+                            f.truncate()
+                            hasher = hashlib.sha256()
+                            written = 0
+                        response.raise_for_status()
+
+                        total = _expected_total(response, written)
+                        async for chunk in response.aiter_raw(chunk_size):
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            written += len(chunk)
+
+                        if total is not None and written < total:
+                            raise IncompleteDownloadError(
+                                f"下载不完整: {written}/{total} 字节"
+                            )
+                    break
+                except (httpx.TransportError, IncompleteDownloadError, httpx.HTTPStatusError) as e:
+                    if isinstance(e, httpx.HTTPStatusError) and not _is_retryable_status(
+                        e.response.status_code
+                    ):
+                        raise
+                    if attempts > max_retries:
+                        raise
+                    delay = backoff * (2 ** (attempts - 1))
+                    print(f"下载中断，{delay:.1f}秒后从 {written} 字节处续传: {e}")
+                    f.flush()
+                    await asyncio.sleep(delay)
+
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+    return {
+        "path": dest_path,
+        "bytes": written,
+        "sha256": hasher.hexdigest(),
+        "attempts": attempts
+    }
@@ -0,0 +1,166 @@
+"""
+内容寻址资源存储 - 按SHA-256存储生成文件，相同内容只保存一份
+"""
+import hashlib
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import config
+from ..data.dal import AssetBlobDAL
+
+
+# 扩展名 -> 媒体类型
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "gif": "image/gif",
+    "mp4": "video/mp4",
+}
+
+# storage_key 格式：<哈希前2位>/<哈希3-4位>/<完整哈希>.<扩展名>
+_STORAGE_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$")
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path: Path) -> str:
+    """流式计算文件SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def content_type_for(storage_key: str) -> str:
+    """根据扩展名获取媒体类型"""
+    ext = storage_key.rsplit(".", 1)[-1].lower()
+    return CONTENT_TYPES.get(ext, "application/octet-stream")
+
+
+class AssetStore:
+    """
+    内容寻址本地存储
+
+    文件以内容哈希命名，按哈希前缀分两级子目录（256*256个目录），
+    百万级文件时单个目录也只有几十个条目。重复下载或相同种子生成的
+    相同内容只保存一份，引用次数记录在 asset_blob 表中（审计计数）。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        root_path = Path(root or config.ASSET_STORE_DIR)
+        if not root_path.is_absolute():
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            root_path = Path(project_root) / root_path
+        self.root = root_path
+
+    @staticmethod
+    def storage_key_for(sha256: str, ext: str) -> str:
+        """根据内容哈希与扩展名生成 storage_key"""
+        sha256 = sha256.lower()
+        ext = ext.lstrip(".").lower() or "bin"
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+    @staticmethod
+    def is_valid_key(storage_key: str) -> bool:
+        """校验 storage_key 格式（防止路径穿越）"""
+        return bool(_STORAGE_KEY_RE.match(storage_key))
+
+    @staticmethod
+    def sha256_from_key(storage_key: str) -> str:
+        """从 storage_key 中取出内容哈希"""
+        return storage_key.rsplit("/", 1)[-1].split(".", 1)[0]
+
+    def path_for(self, storage_key: str) -> Path:
+        """
+        获取 storage_key 对应的文件路径
+
+        Raises:
+            ValueError: storage_key 格式无效
+        """
+        if not self.is_valid_key(storage_key):
+            raise ValueError(f"无效的storage_key: {storage_key}")
+        return self.root / storage_key
+
+    def exists(self, storage_key: str) -> bool:
+        """文件是否已在存储中"""
+        return self.is_valid_key(storage_key) and self.path_for(storage_key).is_file()
+
+    def ingest(self, src_path: Path, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        将文件移入存储（同步函数，调用方通过 asyncio.to_thread 执行）
+
+        内容已存在时直接删除源文件；否则原子移动到分片目录。
+
+        Args:
+            src_path: 源文件路径
+            sha256: 已知的内容哈希（下载时已计算），为空时读取文件计算
+
+        Returns:
+            {"storage_key", "sha256", "size_bytes", "content_type", "path", "deduplicated"}
+        """
+        src_path = Path(src_path)
+        sha256 = (sha256 or file_sha256(src_path)).lower()
+        storage_key = self.storage_key_for(sha256, src_path.suffix)
+        dest_path = self.path_for(storage_key)
+        size_bytes = src_path.stat().st_size
+
+        deduplicated = dest_path.is_file()
+        if deduplicated:
+            src_path.unlink()
+        else:
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(src_path, dest_path)
+            except OSError:
+                # 跨文件系统时先复制到临时文件再原子替换
+                tmp_path = dest_path.with_name(dest_path.name + ".part")
+                shutil.copyfile(src_path, tmp_path)
+                os.replace(tmp_path, dest_path)
+                src_path.unlink()
+
+        return {
+            "storage_key": storage_key,
+            "sha256": sha256,
+            "size_bytes": size_bytes,
+            "content_type": content_type_for(storage_key),
+            "path": dest_path,
+            "deduplicated": deduplicated
+        }
+
+    def delete(self, storage_key: str) -> bool:
+        """删除本地副本（已上传到对象存储后调用）"""
+        path = self.path_for(storage_key)
+        if path.is_file():
+            path.unlink()
+            return True
+        return False
+
+    @staticmethod
+    def relative_url(storage_key: str) -> str:
+        """文件的相对访问路径"""
+        return f"/static/assets/{storage_key}"
+
+
+def add_blob_ref(db: Session, blob: Optional[Dict[str, Any]]) -> None:
+    """登记资源并为引用它的变体计数一次（blob 为 ingest 的返回值）"""
+    if not blob:
+        return
+    AssetBlobDAL.add_ref(
+        db,
+        blob["storage_key"],
+        blob["sha256"],
+        blob["content_type"],
+        blob["size_bytes"]
+    )
+
+
+# 全局实例
+asset_store = AssetStore()
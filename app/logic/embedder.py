@@ -0,0 +1,38 @@
+"""
+进程级共享文本嵌入模型 - 懒加载的SentenceTransformer单例
+"""
+import threading
+
+from ..config import config
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    获取共享的SentenceTransformer实例（首次调用时加载）
+    
+    Returns:
+        SentenceTransformer实例
+    """
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                # 延迟导入，避免在模块导入阶段加载torch
+                from sentence_transformers import SentenceTransformer
+                print(f"正在加载嵌入模型: {config.EMBEDDER_MODEL_NAME}")
+                _embedder = SentenceTransformer(config.EMBEDDER_MODEL_NAME)
+    return _embedder
+
+
+def is_embedder_loaded() -> bool:
+    """嵌入模型是否已加载"""
+    return _embedder is not None
+
+
+def warmup_embedder() -> None:
+    """预热嵌入模型（加载并执行一次编码）"""
+    get_embedder().encode("warmup")
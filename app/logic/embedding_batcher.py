@@ -0,0 +1,92 @@
+"""
+批量嵌入编码服务 - 在短时间窗口内合并并发编码请求
+"""
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+from ..config import config
+from .embedder import get_embedder
+
+
+class EmbeddingBatcher:
+    """微批处理嵌入编码器"""
+
+    def __init__(self, window_ms: Optional[float] = None, max_batch_size: Optional[int] = None):
+        self.window_seconds = (
+            config.EMBED_BATCH_WINDOW_MS if window_ms is None else window_ms
+        ) / 1000.0
+        self.max_batch_size = max_batch_size or config.EMBED_BATCH_MAX_SIZE
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 进行中的批次（事件循环只持有任务的弱引用，需在此保留强引用）
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        编码单条文本（与同一窗口内的其他请求合并为一次批量编码）
+
+        Args:
+            text: 待编码文本
+
+        Returns:
+            嵌入向量（float32）
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环变化（如测试中多次asyncio.run），丢弃旧状态
+            self._loop = loop
+            self._pending = []
+            self._flush_handle = None
+            self._tasks = set()
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """取出当前窗口内的请求并提交批量编码"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = self._pending
+        self._pending = []
+        if batch:
+            task = self._loop.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """在工作线程中执行批量编码，并回填每个调用方的future"""
+        # 相同文本只编码一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = await asyncio.to_thread(self._encode_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text: Dict[str, np.ndarray] = dict(zip(texts, embeddings))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    @staticmethod
+    def _encode_batch(texts: List[str]) -> np.ndarray:
+        """同步批量编码（在线程池中执行）"""
+        embeddings = get_embedder().encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+# 全局批量编码器实例
+embedding_batcher = EmbeddingBatcher()
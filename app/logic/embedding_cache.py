@@ -0,0 +1,107 @@
+"""
+嵌入向量缓存 - 进程内LRU + 数据库持久化，按 (key_hash, model_name) 索引
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import config
+from ..data.async_dal import AsyncEmbeddingCacheDAL
+from .embedding_batcher import embedding_batcher
+
+
+class EmbeddingCache:
+    """两级嵌入向量缓存"""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        model_name: Optional[str] = None,
+        persist: Optional[bool] = None
+    ):
+        self.max_entries = max_entries or config.EMBED_CACHE_MAX_ENTRIES
+        self.model_name = model_name or config.EMBEDDER_MODEL_NAME
+        self.persist = config.EMBED_CACHE_PERSIST if persist is None else persist
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _get_memory(self, key_hash: str) -> Optional[np.ndarray]:
+        """从内存LRU读取"""
+        with self._lock:
+            embedding = self._entries.get(key_hash)
+            if embedding is not None:
+                self._entries.move_to_end(key_hash)
+            return embedding
+
+    def _put_memory(self, key_hash: str, embedding: np.ndarray) -> None:
+        """写入内存LRU，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._entries[key_hash] = embedding
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_encode(self, db: AsyncSession, key_norm: str, key_hash: str) -> np.ndarray:
+        """
+        获取标准化提示词的嵌入向量，依次查内存、数据库，最后才调用模型编码
+
+        Args:
+            db: 异步数据库会话
+            key_norm: 标准化提示词
+            key_hash: 标准化提示词哈希
+
+        Returns:
+            嵌入向量（float32）
+        """
+        embedding = self._get_memory(key_hash)
+        if embedding is not None:
+            self.memory_hits += 1
+            return embedding
+
+        if self.persist:
+            try:
+                stored = await AsyncEmbeddingCacheDAL.get(db, key_hash, self.model_name)
+            except Exception as e:
+                print(f"Warning: Failed to read embedding cache for {key_hash}: {e}")
+                await db.rollback()
+                stored = None
+            if stored is not None:
+                embedding = np.frombuffer(stored, dtype=np.float32)
+                self.db_hits += 1
+                self._put_memory(key_hash, embedding)
+                return embedding
+
+        self.misses += 1
+        embedding = np.asarray(await embedding_batcher.encode(key_norm), dtype=np.float32)
+        self._put_memory(key_hash, embedding)
+
+        if self.persist:
+            try:
+                await AsyncEmbeddingCacheDAL.put(db, key_hash, self.model_name, embedding.tobytes())
+            except Exception as e:
+                print(f"Warning: Failed to persist embedding cache for {key_hash}: {e}")
+                await db.rollback()
+
+        return embedding
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "model_name": self.model_name,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+# 全局嵌入缓存实例
+embedding_cache = EmbeddingCache()
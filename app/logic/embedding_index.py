@@ -0,0 +1,204 @@
+"""
+提示词嵌入向量索引 - 按Soul维护的内存向量矩阵
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import config
+from ..data.async_dal import AsyncPromptKeyDAL
+
+
+class SoulEmbeddingIndex:
+    """单个Soul的嵌入向量索引（连续float32矩阵 + 平行pk_id数组）"""
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 64):
+        self.dim = dim
+        self.size = 0
+        self.matrix: Optional[np.ndarray] = None
+        self.pk_ids: List[Optional[str]] = []
+        self.row_by_pk: Dict[str, int] = {}
+        self.max_updated_at_ts = 0
+        self.loaded_at = 0.0
+        self._initial_capacity = initial_capacity
+
+    def _ensure_capacity(self, needed: int) -> None:
+        """确保矩阵容量足够（按倍数扩容，摊销O(1)追加）"""
+        if self.matrix is None:
+            capacity = max(self._initial_capacity, needed)
+            self.matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            return
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        new_matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        new_matrix[:self.size] = self.matrix[:self.size]
+        self.matrix = new_matrix
+
+    def upsert(self, pk_id: str, embedding: np.ndarray, updated_at_ts: int = 0) -> bool:
+        """
+        插入或更新一条向量（写入前归一化）
+
+        Args:
+            pk_id: 提示词键ID
+            embedding: 原始嵌入向量
+            updated_at_ts: 记录更新时间戳
+
+        Returns:
+            是否写入成功（维度不匹配或零向量时返回False）
+        """
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if self.dim is None:
+            self.dim = vector.shape[0]
+        if vector.shape[0] != self.dim:
+            return False
+
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return False
+
+        row = self.row_by_pk.get(pk_id)
+        if row is None:
+            self._ensure_capacity(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.pk_ids.append(pk_id)
+            self.row_by_pk[pk_id] = row
+
+        self.matrix[row] = vector / norm
+        self.max_updated_at_ts = max(self.max_updated_at_ts, updated_at_ts)
+        return True
+
+    def search(self, query: np.ndarray, threshold: float) -> Optional[Tuple[str, float]]:
+        """
+        查找最相似的提示词键（一次矩阵-向量乘法 + argmax）
+
+        Args:
+            query: 查询向量（无需预先归一化）
+            threshold: 相似度阈值
+
+        Returns:
+            (pk_id, similarity)，未达到阈值时返回None
+        """
+        if self.size == 0 or self.matrix is None:
+            return None
+
+        vector = np.asarray(query, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            return None
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+
+        scores = self.matrix[:self.size] @ (vector / norm)
+        best_row = int(np.argmax(scores))
+        best_score = float(scores[best_row])
+        if best_score < threshold:
+            return None
+        return self.pk_ids[best_row], best_score
+
+
+class PromptEmbeddingIndex:
+    """进程内提示词嵌入索引（按Soul懒加载，增量更新）"""
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self._indexes: Dict[str, SoulEmbeddingIndex] = {}
+        self._lock = threading.RLock()
+        self.refresh_seconds = (
+            config.PROMPT_INDEX_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        )
+
+    def _load_rows(self, index: SoulEmbeddingIndex, rows: List[Dict]) -> None:
+        """将数据库行写入索引"""
+        for row in rows:
+            key_embed = row.get("key_embed")
+            if key_embed is None:
+                continue
+            try:
+                embedding = np.frombuffer(key_embed, dtype=np.float32)
+            except ValueError as e:
+                print(f"Warning: Invalid embedding for pk {row.get('pk_id')}: {e}")
+                continue
+            index.upsert(row["pk_id"], embedding, row.get("updated_at_ts", 0))
+
+    async def get_index(self, db: AsyncSession, soul_id: str) -> SoulEmbeddingIndex:
+        """
+        获取Soul的索引，首次访问时从prompt_key表全量加载，
+        之后按refresh_seconds增量拉取其他worker写入的键
+
+        数据库查询在锁外进行，等待期间不阻塞其他请求的检索。
+
+        Args:
+            db: 异步数据库会话
+            soul_id: Soul ID
+
+        Returns:
+            Soul嵌入索引
+        """
+        with self._lock:
+            index = self._indexes.get(soul_id)
+            if index is not None and (
+                self.refresh_seconds <= 0
+                or time.monotonic() - index.loaded_at < self.refresh_seconds
+            ):
+                return index
+            since_ts = index.max_updated_at_ts if index is not None else 0
+
+        rows = await AsyncPromptKeyDAL.list_embeddings_by_soul(db, soul_id, since_ts=since_ts)
+
+        with self._lock:
+            current = self._indexes.get(soul_id)
+            if index is None:
+                # 全量加载；并发加载同一Soul时重复写入同一pk_id是幂等的
+                if current is None:
+                    current = SoulEmbeddingIndex()
+                    self._indexes[soul_id] = current
+            elif current is not index:
+                # 增量拉取期间索引被清除或替换，本次仍使用旧索引
+                return index
+            self._load_rows(current, rows)
+            current.loaded_at = time.monotonic()
+            return current
+
+    async def search(
+        self,
+        db: AsyncSession,
+        soul_id: str,
+        query: np.ndarray,
+        threshold: float
+    ) -> Optional[Tuple[str, float]]:
+        """在Soul索引中查找最相似的提示词键"""
+        index = await self.get_index(db, soul_id)
+        with self._lock:
+            return index.search(query, threshold)
+
+    def add(self, soul_id: str, pk_id: str, embedding: np.ndarray, updated_at_ts: int = 0) -> None:
+        """
+        增量写入新的提示词键（仅在索引已加载时写入，否则等待首次加载）
+
+        Args:
+            soul_id: Soul ID
+            pk_id: 提示词键ID
+            embedding: 嵌入向量
+            updated_at_ts: 更新时间戳
+        """
+        with self._lock:
+            index = self._indexes.get(soul_id)
+            if index is not None:
+                index.upsert(pk_id, embedding, updated_at_ts)
+
+    def invalidate(self, soul_id: Optional[str] = None) -> None:
+        """清除索引（soul_id为None时清除全部）"""
+        with self._lock:
+            if soul_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(soul_id, None)
+
+
+# 全局索引实例（所有PromptCache共享）
+prompt_embedding_index = PromptEmbeddingIndex()
@@ -0,0 +1,270 @@
+"""
+流式 MP4 转 GIF 编码 - 逐帧读取、逐帧写出，在进程池中执行
+"""
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO, Dict, Optional
+
+import imageio
+from PIL import Image, GifImagePlugin
+
+from ..config import config
+
+
+# GIF编码配置：
+#   width        最大宽度（0表示保持原尺寸）
+#   max_fps      最大帧率（按源帧率计算跳帧步长）
+#   frame_stride 固定跳帧步长（设置后忽略max_fps）
+#   palette      "per_frame" 每帧自适应调色板（画质好）或 "shared" 全部帧共用第一帧调色板（更小更快）
+#   colors       调色板颜色数
+#   dither       是否使用Floyd-Steinberg抖动
+#   loop         循环次数（0为无限循环，None为只播放一次）
+GIF_PROFILES: Dict[str, Dict[str, Any]] = {
+    "full": {
+        "width": 0, "max_fps": 15, "frame_stride": None,
+        "palette": "per_frame", "colors": 256, "dither": True, "loop": 0
+    },
+    "default": {
+        "width": config.GIF_MAX_WIDTH, "max_fps": config.GIF_MAX_FPS, "frame_stride": None,
+        "palette": "per_frame", "colors": 256, "dither": True, "loop": 0
+    },
+    "compact": {
+        "width": 320, "max_fps": 8, "frame_stride": None,
+        "palette": "shared", "colors": 128, "dither": True, "loop": 0
+    },
+    "preview": {
+        "width": 240, "max_fps": None, "frame_stride": 4,
+        "palette": "shared", "colors": 64, "dither": False, "loop": 0
+    },
+}
+
+
+def resolve_gif_profile(name: Optional[str]) -> str:
+    """
+    校验GIF编码配置名称
+
+    Args:
+        name: 配置名称，为空时使用 GIF_DEFAULT_PROFILE
+
+    Returns:
+        配置名称
+
+    Raises:
+        ValueError: 配置不存在
+    """
+    name = name or config.GIF_DEFAULT_PROFILE
+    if name not in GIF_PROFILES:
+        raise ValueError(f"未知的GIF编码配置: {name}，可选: {', '.join(GIF_PROFILES)}")
+    return name
+
+
+class StreamingGifWriter:
+    """
+    增量GIF写入器
+
+    每追加一帧立即量化并写入文件，内存中只保留当前帧（共享调色板时另保留第一帧的
+    调色板图像）。每帧调色板模式下写入局部颜色表，画面颜色随时间变化时不会失真。
+    （imageio 旧版 GIF-PIL 写入器不支持 Pillow>=10.1，新版 pillow 插件与
+    Image.save(save_all=True) 都会在关闭前缓存全部帧，因此直接使用 Pillow 的
+    GIF 块编码函数逐帧输出。）
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        duration_ms: int,
+        loop: Optional[int] = 0,
+        colors: int = 256,
+        shared_palette: bool = False,
+        dither: bool = True
+    ):
+        self.fp = fp
+        self.duration_ms = max(20, int(duration_ms))  # 多数浏览器会把小于20ms的帧间隔拉长
+        self.loop = loop
+        self.colors = colors
+        self.shared_palette = shared_palette
+        self.dither = dither
+        self.frame_count = 0
+        self._palette_image: Optional[Image.Image] = None
+
+    def _quantize(self, frame: Image.Image) -> Image.Image:
+        """量化为调色板图像"""
+        if self._palette_image is not None:
+            palette_image = self._palette_image
+        else:
+            palette_image = frame.quantize(colors=self.colors, method=Image.Quantize.MEDIANCUT)
+            if self.shared_palette:
+                self._palette_image = palette_image
+            if not self.dither:
+                return palette_image
+        dither = Image.Dither.FLOYDSTEINBERG if self.dither else Image.Dither.NONE
+        return frame.quantize(palette=palette_image, dither=dither)
+
+    def append(self, frame: Image.Image) -> None:
+        """追加一帧"""
+        paletted = self._quantize(frame.convert("RGB"))
+        if self.frame_count == 0:
+            info = {"duration": self.duration_ms}
+            if self.loop is not None:
+                info["loop"] = self.loop
+            header, _ = GifImagePlugin.getheader(paletted, info=info)
+            for block in header:
+                self.fp.write(block)
+        for block in GifImagePlugin.getdata(
+            paletted, duration=self.duration_ms, include_color_table=not self.shared_palette
+        ):
+            self.fp.write(block)
+        self.frame_count += 1
+
+    def close(self) -> None:
+        """写入GIF结束符"""
+        self.fp.write(b";")
+
+
+def encode_gif(mp4_path: str, gif_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将视频流式转换为GIF（同步函数，在进程池中执行）
+
+    按帧率步长跳帧、等比缩放到不超过配置宽度，先写入临时文件，
+    完成后原子替换到 gif_path，峰值内存与视频时长无关。
+
+    Args:
+        mp4_path: 视频文件路径
+        gif_path: 输出GIF路径
+        options: 编码配置（见 GIF_PROFILES）
+
+    Returns:
+        编码统计信息
+    """
+    start_time = time.time()
+    tmp_path = f"{gif_path}.part"
+    max_width = options.get("width") or 0
+    reader = imageio.get_reader(mp4_path)
+    try:
+        source_fps = float(reader.get_meta_data().get("fps") or 8)
+        stride = options.get("frame_stride")
+        if not stride:
+            max_fps = options.get("max_fps")
+            stride = math.ceil(source_fps / max_fps) if max_fps else 1
+        stride = max(1, int(stride))
+        duration_ms = int(round(1000 * stride / source_fps))
+
+        with open(tmp_path, "wb") as fp:
+            writer = StreamingGifWriter(
+                fp,
+                duration_ms,
+                loop=options.get("loop", 0),
+                colors=options.get("colors", 256),
+                shared_palette=options.get("palette") == "shared",
+                dither=options.get("dither", True)
+            )
+            target_size = None
+            for index, frame in enumerate(reader):
+                if index % stride:
+                    continue
+                image = Image.fromarray(frame)
+                if target_size is None:
+                    width, height = image.size
+                    if max_width and width > max_width:
+                        target_size = (max_width, max(1, round(height * max_width / width)))
+                    else:
+                        target_size = (width, height)
+                if image.size != target_size:
+                    image = image.resize(target_size, Image.Resampling.LANCZOS)
+                writer.append(image)
+            if writer.frame_count == 0:
+                raise RuntimeError("视频中没有可用的帧")
+            writer.close()
+        os.replace(tmp_path, gif_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        reader.close()
+
+    return {
+        "frames": writer.frame_count,
+        "width": target_size[0],
+        "height": target_size[1],
+        "fps": round(1000 / writer.duration_ms, 2),
+        "bytes": os.path.getsize(gif_path),
+        "encode_seconds": round(time.time() - start_time, 2)
+    }
+
+
+# 进程池（首次使用时创建）：GIF编码是CPU密集型任务，放在独立进程中不阻塞事件循环
+_gif_executor: Optional[ProcessPoolExecutor] = None
+
+# 各编码配置的累计统计（主进程内）
+_profile_stats: Dict[str, Dict[str, float]] = {}
+
+
+def get_gif_executor() -> ProcessPoolExecutor:
+    """获取GIF编码进程池"""
+    global _gif_executor
+    if _gif_executor is None:
+        _gif_executor = ProcessPoolExecutor(max_workers=config.GIF_ENCODER_WORKERS)
+    return _gif_executor
+
+
+def shutdown_gif_executor() -> None:
+    """关闭GIF编码进程池"""
+    global _gif_executor
+    if _gif_executor is not None:
+        _gif_executor.shutdown(wait=False, cancel_futures=True)
+        _gif_executor = None
+
+
+def _record_stats(profile: str, stats: Dict[str, Any]) -> None:
+    """累计编码耗时与文件大小"""
+    totals = _profile_stats.setdefault(
+        profile, {"count": 0, "encode_seconds": 0.0, "bytes": 0, "frames": 0}
+    )
+    totals["count"] += 1
+    totals["encode_seconds"] += stats["encode_seconds"]
+    totals["bytes"] += stats["bytes"]
+    totals["frames"] += stats["frames"]
+
+
+def gif_profile_stats() -> Dict[str, Dict[str, Any]]:
+    """各编码配置的平均耗时与大小（供 /stats 接口使用）"""
+    result = {}
+    for profile, totals in _profile_stats.items():
+        count = totals["count"]
+        result[profile] = {
+            "count": count,
+            "avg_encode_seconds": round(totals["encode_seconds"] / count, 2),
+            "avg_bytes": int(totals["bytes"] / count),
+            "avg_frames": round(totals["frames"] / count, 1)
+        }
+    return result
+
+
+async def convert_mp4_to_gif(
+    mp4_path: str,
+    gif_path: str,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    在进程池中将视频转换为GIF
+
+    Args:
+        mp4_path: 视频文件路径
+        gif_path: 输出GIF路径
+        profile: 编码配置名称，默认 GIF_DEFAULT_PROFILE
+
+    Returns:
+        编码统计信息（包含所用配置名称）
+    """
+    profile = resolve_gif_profile(profile)
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(
+        get_gif_executor(), encode_gif, mp4_path, gif_path, GIF_PROFILES[profile]
+    )
+    _record_stats(profile, stats)
+    stats["profile"] = profile
+    return stats
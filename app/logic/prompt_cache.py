@@ -5,23 +5,23 @@ import hashlib
 import re
 import json
 from typing import List, Optional, Dict, Any
-import numpy as np
-from sentence_transformers import SentenceTransformer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..data.dal import PromptKeyDAL, SoulStyleProfileDAL
+from ..data.dal import SoulStyleProfileDAL
+from ..data.async_dal import AsyncPromptKeyDAL
 from ..data.models import PromptKeyBase
 from ..core.lww import now_ms
 from ..core.ids import generate_pk_id
+from .embedding_index import prompt_embedding_index
+from .embedder import get_embedder
+from .embedding_cache import embedding_cache
 
 
 class PromptCache:
     """提示词缓存管理器"""
 
     def __init__(self):
-        # 初始化文本嵌入模型
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-
         # 停用词列表
         self.stopwords = {
             "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for",
@@ -29,6 +29,11 @@ class PromptCache:
             "have", "has", "had", "do", "does", "did", "will", "would", "could", "should"
         }
     
+    @property
+    def embedder(self):
+        """文本嵌入模型（所有PromptCache共享同一进程级实例）"""
+        return get_embedder()
+    
     def normalize_cue(self, cue: str, soul_id: str, db: Session) -> str:
         """
         标准化提示词
@@ -121,9 +126,9 @@ class PromptCache:
         
         return key_norm, key_hash, pk_id
     
-    def find_similar_prompt_key(
+    async def find_similar_prompt_key(
         self,
-        db: Session,
+        db: AsyncSession,
         soul_id: str,
         cue: str,
         threshold: float = 0.85
@@ -132,7 +137,7 @@ class PromptCache:
         查找相似的提示词键
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             cue: 提示词
             threshold: 相似度阈值
@@ -142,57 +147,40 @@ class PromptCache:
         """
         try:
             # 1. 先尝试精确匹配
-            key_norm, key_hash, pk_id = self.generate_cache_key(cue, soul_id, db)
-            exact_match = PromptKeyDAL.find_similar(db, soul_id, key_hash)
+            key_norm, key_hash, pk_id = await db.run_sync(
+                lambda session: self.generate_cache_key(cue, soul_id, session)
+            )
+            exact_match = await AsyncPromptKeyDAL.find_similar(db, soul_id, key_hash)
             if exact_match:
                 return exact_match
 
             # 2. 使用嵌入向量进行相似性匹配
             try:
-                cue_embedding = self.embedder.encode(key_norm)
+                cue_embedding = await embedding_cache.get_or_encode(db, key_norm, key_hash)
             except Exception as e:
                 print(f"Warning: Failed to encode cue embedding: {e}")
                 return None
 
-            # 获取该Soul的所有提示词键
+            # 在Soul的内存向量索引中查找（一次矩阵-向量乘法）
             try:
-                all_pks = PromptKeyDAL.list_by_soul(db, soul_id)
+                match = await prompt_embedding_index.search(db, soul_id, cue_embedding, threshold)
             except Exception as e:
-                print(f"Warning: Failed to list prompt keys for soul {soul_id}: {e}")
+                print(f"Warning: Failed to search embedding index for soul {soul_id}: {e}")
                 return None
 
-            best_match = None
-            best_similarity = 0.0
-
-            for pk in all_pks:
-                if pk.key_embed is not None:
-                    try:
-                        # 将bytes转换回numpy数组
-                        stored_embedding = np.frombuffer(pk.key_embed, dtype=np.float32)
-
-                        # 计算余弦相似度
-                        similarity = self._cosine_similarity(cue_embedding, stored_embedding)
-
-                        if similarity >= threshold and similarity > best_similarity:
-                            best_similarity = similarity
-                            best_match = pk
-                    except Exception as e:
-                        print(f"Warning: Failed to compare embeddings for pk {pk.pk_id}: {e}")
-                        continue
+            if not match:
+                return None
 
-            return best_match
+            best_pk_id, _ = match
+            return await AsyncPromptKeyDAL.get_by_id(db, best_pk_id)
 
         except Exception as e:
             print(f"Warning: Error in find_similar_prompt_key: {e}")
             return None
     
-    def _cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
-        """计算余弦相似度"""
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-    
-    def create_prompt_key(
+    async def create_prompt_key(
         self,
-        db: Session,
+        db: AsyncSession,
         soul_id: str,
         cue: str,
         meta_json: Optional[Dict[str, Any]] = None
@@ -201,7 +189,7 @@ class PromptCache:
         创建新的提示词键
 
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             cue: 提示词
             meta_json: 元数据
@@ -209,10 +197,12 @@ class PromptCache:
         Returns:
             创建的PromptKey
         """
-        key_norm, key_hash, pk_id = self.generate_cache_key(cue, soul_id, db)
+        key_norm, key_hash, pk_id = await db.run_sync(
+            lambda session: self.generate_cache_key(cue, soul_id, session)
+        )
 
-        # 生成嵌入向量
-        embedding = self.embedder.encode(key_norm)
+        # 生成嵌入向量（优先命中嵌入缓存）
+        embedding = await embedding_cache.get_or_encode(db, key_norm, key_hash)
 
         # 创建PromptKey
         pk_data = PromptKeyBase(
@@ -225,7 +215,8 @@ class PromptCache:
             updated_at_ts=now_ms()
         )
 
-        PromptKeyDAL.create(db, pk_data)
+        await AsyncPromptKeyDAL.create(db, pk_data)
+        prompt_embedding_index.add(soul_id, pk_id, embedding, pk_data.updated_at_ts)
         return pk_data
 
 
@@ -4,41 +4,56 @@
 import asyncio
 import random
 import os
-from typing import Optional, Dict, Any, List
+from typing import AsyncContextManager, Callable, Optional, Dict, Any, List
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..data.dal import (
-    SoulStyleProfileDAL, VariantDAL, UserSeenDAL, 
-    PromptKeyDAL, WorkLockDAL
+from ..data.dal import VariantDAL, session_scope
+from ..data.async_dal import (
+    AsyncPromptKeyDAL, AsyncSoulStyleProfileDAL, AsyncVariantDAL, AsyncUserSeenDAL,
+    async_session_scope
 )
+from ..config import config
 from ..data.models import VariantBase
 from ..core.lww import now_ms
 from ..core.ids import generate_ulid, generate_lock_key
-from ..core.locks import with_lock
-
-# 全局锁键 - 防止同时生成图片和视频
-GLOBAL_GENERATION_LOCK_KEY = "global:generation"
+from ..core.singleflight import generation_flights, flight_key
 from ..core.task_manager import TaskManager, TaskType, BackgroundTask
+from ..core.durable_task_manager import DurableTaskManager
 from .prompt_cache import PromptCache, PromptBuilder
 from .place_chooser import PlaceChooser
+from .variant_pool import claim_unseen_variant, IMAGE_VARIANT_TYPES
 # 注释掉本地模型服务，改用Wan API
 # from .ai_model_service import generate_soul_image, generate_soul_gif
 from .service_wan_image import get_wan_image_service
+from .storage_backend import register_asset
 
 
 class ImageGenerationService:
     """图像生成服务"""
     
     def __init__(self):
-        from ..config import config
         self.prompt_cache = PromptCache()
         self.prompt_builder = PromptBuilder()
         self.place_chooser = PlaceChooser()
-        self.task_manager = TaskManager(max_concurrent=config.MAX_CONCURRENT_TASKS)
+        if config.TASK_QUEUE_BACKEND == "db":
+            # 持久化队列：任务保存在task_queue表，所有worker共同消费
+            self.task_manager = DurableTaskManager(
+                max_concurrent=config.MAX_CONCURRENT_TASKS,
+                session_factory=session_scope,
+                job_session_factory=async_session_scope
+            )
+        else:
+            self.task_manager = TaskManager(
+                max_concurrent=config.MAX_CONCURRENT_TASKS,
+                session_factory=async_session_scope
+            )
+        self.task_manager.register_handler(TaskType.STYLE_GENERATION, self._background_generate_variant)
+        self.task_manager.register_handler(TaskType.SELFIE_GENERATION, self._background_generate_selfie)
     
     async def get_or_create_variant(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         soul_id: str, 
         cue: str, 
         user_id: str
@@ -47,7 +62,7 @@ class ImageGenerationService:
         获取或创建变体（灵魂风格任务）
         
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             cue: 提示词
             user_id: 用户ID
@@ -60,64 +75,60 @@ class ImageGenerationService:
     
     async def _process_variant_request(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         soul_id: str, 
         cue: str, 
         user_id: str
     ) -> Dict[str, Any]:
         """处理变体请求"""
-        # 生成锁键（基于 soul_id + cue 确保同一提示词串行）
-        lock_key = f"{soul_id}|{cue}"
-        
-        # 首先获取全局锁，防止与视频生成同时进行
-        async with with_lock(GLOBAL_GENERATION_LOCK_KEY):
-            # 然后获取提示词锁，确保相同的提示词串行执行
-            async with with_lock(lock_key):
-                # 1. 查找相似的提示词键
-                similar_pk = self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
-                
-                if similar_pk:
-                    # 2. 获取现有变体
-                    existing_variants = VariantDAL.list_by_pk_id(db, similar_pk.pk_id)
-
-                    # 过滤图像变体（通过 meta_json 中的 type 字段，排除视频）
-                    image_variants = [
-                        v for v in existing_variants
-                        if v.meta_json and v.meta_json.get('type') in ['wan_image', 'wan_image_selfie']
-                    ]
-
-                    if image_variants:
-                        # 3. 获取用户已看过的变体
-                        user_seen_variants = UserSeenDAL.get_seen_variants(db, user_id)
-
-                        # 4. 过滤未看过的变体
-                        unseen_variants = [
-                            v for v in image_variants
-                            if v.variant_id not in user_seen_variants
-                        ]
-                    
-                    if unseen_variants:
-                        # 5. 选择最佳变体（最新的）
-                        best_variant = max(unseen_variants, key=lambda v: v.updated_at_ts)
-                        
-                        # 立即标记为已看，防止后续请求返回同一变体
-                        UserSeenDAL.mark_seen(db, user_id, best_variant.variant_id)
-                        
-                        return {
-                            "url": best_variant.asset_url,
-                            "variant_id": best_variant.variant_id,
-                            "pk_id": best_variant.pk_id,
-                            "cache_hit": True
-                        }
-                
-                # 7. 需要生成新变体
-                result = await self._generate_new_variant(db, soul_id, cue, user_id, similar_pk)
-                # 返回结果时仍在锁内，确保后续任务看不到
+        # 1. 快速路径：查找已有变体，通过user_seen原子认领
+        similar_pk = await self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
+        if similar_pk:
+            cached = await self._claim_from_pk(db, similar_pk.pk_id, user_id)
+            if cached:
+                return cached
+        
+        # 2. 没有可认领的变体：同一提示词键的并发请求合并为一次生成
+        key = flight_key("image", await self._flight_pk_id(db, soul_id, cue, similar_pk))
+        while True:
+            result, leader = await generation_flights.do(
+                key, lambda: self._generate_new_variant(db, soul_id, cue, user_id, similar_pk)
+            )
+            if leader:
                 return result
+            
+            # 跟随者：从刚生成的批次中认领；该用户已看过则参与下一批生成
+            cached = await self._claim_from_pk(db, result["pk_id"], user_id)
+            if cached:
+                return cached
+            similar_pk = await AsyncPromptKeyDAL.get_by_id(db, result["pk_id"])
+    
+    async def _flight_pk_id(
+        self, db: AsyncSession, soul_id: str, cue: str, similar_pk: Optional[Any]
+    ) -> str:
+        """请求合并键使用的pk_id：已有相似键时用其pk_id，否则用即将创建的pk_id"""
+        if similar_pk:
+            return similar_pk.pk_id
+        _, _, pk_id = await db.run_sync(
+            lambda session: self.prompt_cache.generate_cache_key(cue, soul_id, session)
+        )
+        return pk_id
+    
+    async def _claim_from_pk(self, db: AsyncSession, pk_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """认领指定提示词键下用户未看过的最新图像变体"""
+        variant = await claim_unseen_variant(db, pk_id, user_id, IMAGE_VARIANT_TYPES)
+        if not variant:
+            return None
+        return {
+            "url": variant.asset_url,
+            "variant_id": variant.variant_id,
+            "pk_id": variant.pk_id,
+            "cache_hit": True
+        }
     
     async def _generate_new_variant(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         soul_id: str, 
         cue: str, 
         user_id: str,
@@ -125,12 +136,12 @@ class ImageGenerationService:
     ) -> Dict[str, Any]:
         """生成新变体"""
         # 1. 获取Soul风格配置
-        style_profile = SoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+        style_profile = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id)
         if not style_profile:
             raise ValueError(f"Soul '{soul_id}' style profile not found")
         
         # 2. 构建提示词
-        positive_prompt, negative_prompt = self.prompt_builder.build_prompt(soul_id, cue, db)
+        positive_prompt, negative_prompt = await self._build_prompt(db, soul_id, cue)
         
         # 3. 生成变体ID和随机种子
         variant_id = generate_ulid()
@@ -138,57 +149,35 @@ class ImageGenerationService:
         
         # 4. 使用Wan API生成图像（替代本地模型）
         # 【已废弃】原代码使用本地模型 generate_soul_image
+        # 一次任务生成多张图像，填充该提示词键的变体池
         wan_service = get_wan_image_service()
         ai_result = await wan_service.generate_image_from_text(
             positive_prompt=positive_prompt,
             negative_prompt=negative_prompt,
             output_filename=f"{soul_id}_{variant_id}",
             seed=seed,
-            n=1
+            n=config.WAN_IMAGE_POOL_SIZE,
+            fair_key=user_id
         )
         
-        # 5. 生成本地文件路径（后续可改为GCS）
-        local_filepath = ai_result["image_paths"][0]  # 使用第一张图像
-        filename = os.path.basename(local_filepath)
-        storage_key = f"soul/{soul_id}/key/{similar_pk.pk_id if similar_pk else 'new'}/variant/{variant_id}.png"
-        asset_url = ai_result["image_url"]  # 使用Wan API返回的URL
-        
-        # 6. 创建或更新提示词键
+        # 5. 创建或更新提示词键
         if not similar_pk:
-            pk_data = self.prompt_cache.create_prompt_key(
+            pk_data = await self.prompt_cache.create_prompt_key(
                 db, soul_id, cue, {"canonical_prompt": positive_prompt}
             )
             pk_id = pk_data.pk_id
         else:
             pk_id = similar_pk.pk_id
         
-        # 7. 创建变体记录
-        # 获取图像文件大小
-        from pathlib import Path
-        image_size = Path(local_filepath).stat().st_size if os.path.exists(local_filepath) else 0
-        
-        variant_data = VariantBase(
-            variant_id=variant_id,
-            pk_id=pk_id,
-            soul_id=soul_id,
-            asset_url=asset_url,
-            storage_key=storage_key,
-            seed=seed,
-            phash=None,  # Wan API不返回phash，设为None
-            meta_json={
-                "type": "wan_image",
-                "file_size": image_size,
-                "generation_time_seconds": ai_result.get("image_generation_seconds", 0),
-                "positive_prompt": positive_prompt,
-                "negative_prompt": negative_prompt,
-                "local_filepath": local_filepath
-            },
-            updated_at_ts=now_ms()
+        # 6. 每张图像创建一条变体记录
+        variants = self._build_image_variants(
+            soul_id, pk_id, variant_id, seed, ai_result, positive_prompt, negative_prompt
         )
-        VariantDAL.create(db, variant_data)
+        await self._save_image_variants(db, variants, ai_result)
         
-        # 立即标记为已看，防止后续任务返回这一新生成的变体
-        UserSeenDAL.mark_seen(db, user_id, variant_id)
+        # 立即标记为已看，防止后续任务返回这一新生成的变体（其余变体留给其他用户）
+        await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
+        asset_url = variants[0].asset_url
         
         return {
             "url": asset_url,
@@ -197,9 +186,136 @@ class ImageGenerationService:
             "cache_hit": False
         }
     
+    def _build_image_variants(
+        self,
+        soul_id: str,
+        pk_id: str,
+        variant_id: str,
+        seed: int,
+        ai_result: Dict[str, Any],
+        positive_prompt: str,
+        negative_prompt: str
+    ) -> List[VariantBase]:
+        """
+        将一次生成的全部图像构建为同一提示词键下的变体
+        
+        第一张图像使用传入的variant_id（返回给调用者），其余图像各自分配新ID。
+        Wan多图生成时第i张图像的种子为 seed + i。
+        """
+        variants = []
+        for index, (local_filepath, asset_url, content_sha256, storage_key) in enumerate(zip(
+            ai_result["image_paths"], ai_result["image_urls"],
+            ai_result["image_sha256s"], ai_result["image_storage_keys"]
+        )):
+            image_variant_id = variant_id if index == 0 else generate_ulid()
+            image_size = os.path.getsize(local_filepath) if os.path.exists(local_filepath) else 0
+            variants.append(VariantBase(
+                variant_id=image_variant_id,
+                pk_id=pk_id,
+                soul_id=soul_id,
+                asset_url=asset_url,
+                storage_key=storage_key,
+                seed=seed + index,
+                phash=None,  # Wan API不返回phash，设为None
+                meta_json={
+                    "type": "wan_image",
+                    "file_size": image_size,
+                    "generation_time_seconds": ai_result.get("image_generation_seconds", 0),
+                    "positive_prompt": positive_prompt,
+                    "negative_prompt": negative_prompt,
+                    "local_filepath": local_filepath,
+                    "content_sha256": content_sha256,
+                    "task_id": ai_result.get("task_id", ""),
+                    "batch_index": index,
+                    "batch_size": len(ai_result["image_paths"])
+                },
+                updated_at_ts=now_ms()
+            ))
+        return variants
+    
+    async def _build_prompt(self, db: AsyncSession, soul_id: str, cue: str) -> tuple[str, str]:
+        """构建提示词（风格配置查询在 run_sync 中执行，不阻塞事件循环）"""
+        return await db.run_sync(
+            lambda session: self.prompt_builder.build_prompt(soul_id, cue, session)
+        )
+    
+    async def _choose_selfie_prompt(
+        self, db: AsyncSession, soul_id: str, city_key: str, mood: str, user_id: str
+    ) -> tuple[str, str, str]:
+        """选择地标并构建自拍提示词，返回 (landmark_key, positive_prompt, negative_prompt)"""
+        def choose(session: Session) -> tuple[str, str, str]:
+            landmark_key = self.place_chooser.choose_landmark(session, soul_id, city_key, user_id)
+            positive_prompt, negative_prompt = self.prompt_builder.build_selfie_prompt(
+                soul_id, city_key, landmark_key, mood, session
+            )
+            return landmark_key, positive_prompt, negative_prompt
+        
+        return await db.run_sync(choose)
+    
+    @staticmethod
+    async def _save_image_variants(
+        db: AsyncSession, variants: List[VariantBase], ai_result: Dict[str, Any]
+    ) -> None:
+        """写入变体记录，登记每个变体引用的图像并调度后台上传"""
+        def save(session: Session) -> None:
+            for variant_data, blob in zip(variants, ai_result["image_blobs"]):
+                VariantDAL.create(session, variant_data)
+                register_asset(session, blob)
+        
+        await db.run_sync(save)
+    
+    async def replenish_variant_pool(self, pk_id: str) -> Optional[Dict[str, Any]]:
+        """
+        为提示词键预生成一批变体（不标记任何用户已看）
+        
+        与用户请求共用请求合并键：若该键正在生成，直接复用那次生成。
+        
+        Args:
+            pk_id: 提示词键ID
+            
+        Returns:
+            生成结果（包含pk_id与新变体ID列表），提示词键不存在时返回None
+        """
+        async with async_session_scope() as db:
+            prompt_key = await AsyncPromptKeyDAL.get_by_id(db, pk_id)
+            if not prompt_key:
+                return None
+            soul_id = prompt_key.soul_id
+            style_profile = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+            if not style_profile:
+                return None
+        
+        # 提示词键保存了首次生成时的完整正面提示词
+        positive_prompt = (prompt_key.meta_json or {}).get("canonical_prompt") or prompt_key.key_norm
+        negative_prompt = ", ".join(style_profile.negatives_json)
+        
+        async def generate() -> Dict[str, Any]:
+            variant_id = generate_ulid()
+            seed = random.randint(1000, 999999)
+            ai_result = await get_wan_image_service().generate_image_from_text(
+                positive_prompt=positive_prompt,
+                negative_prompt=negative_prompt,
+                output_filename=f"{soul_id}_{variant_id}",
+                seed=seed,
+                n=config.WAN_IMAGE_POOL_SIZE,
+                fair_key="replenisher"
+            )
+            variants = self._build_image_variants(
+                soul_id, pk_id, variant_id, seed, ai_result, positive_prompt, negative_prompt
+            )
+            async with async_session_scope() as db:
+                await self._save_image_variants(db, variants, ai_result)
+            return {
+                "pk_id": pk_id,
+                "variant_ids": [variant.variant_id for variant in variants]
+            }
+        
+        result, _ = await generation_flights.do(flight_key("image", pk_id), generate)
+        return result
+    
     async def create_selfie(
         self, 
-        db: Session, 
+        db: AsyncSession, 
         soul_id: str, 
         city_key: str, 
         mood: str, 
@@ -209,7 +325,7 @@ class ImageGenerationService:
         创建自拍（灵魂自拍任务）
         
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             city_key: 城市键
             mood: 情绪
@@ -218,12 +334,9 @@ class ImageGenerationService:
         Returns:
             自拍信息
         """
-        # 1. 选择地标
-        landmark_key = self.place_chooser.choose_landmark(db, soul_id, city_key, user_id)
-        
-        # 2. 构建自拍提示词
-        positive_prompt, negative_prompt = self.prompt_builder.build_selfie_prompt(
-            soul_id, city_key, landmark_key, mood, db
+        # 1-2. 选择地标并构建自拍提示词
+        landmark_key, positive_prompt, negative_prompt = await self._choose_selfie_prompt(
+            db, soul_id, city_key, mood, user_id
         )
         
         # 3. 生成自拍变体ID和随机种子
@@ -238,12 +351,13 @@ class ImageGenerationService:
             negative_prompt=negative_prompt,
             output_filename=f"{soul_id}_selfie_{variant_id}",
             seed=seed,
-            n=1
+            n=1,
+            fair_key=user_id
         )
         
         # 5. 生成缓存键
         selfie_cue = f"selfie_{city_key}_{landmark_key}_{mood}"
-        pk_data = self.prompt_cache.create_prompt_key(
+        pk_data = await self.prompt_cache.create_prompt_key(
             db, soul_id, selfie_cue, {
                 "selfie_type": True,
                 "city": city_key,
@@ -256,7 +370,7 @@ class ImageGenerationService:
         # 6. 生成本地文件路径（后续可改为GCS）
         local_filepath = ai_result["image_paths"][0]  # 使用第一张图像
         filename = os.path.basename(local_filepath)
-        storage_key = f"soul/{soul_id}/selfie/{city_key}/{landmark_key}/{variant_id}.png"
+        storage_key = ai_result["image_storage_keys"][0]  # 内容寻址存储中的图像
         asset_url = ai_result["image_url"]  # 使用Wan API返回的URL
         
         # 7. 创建变体记录
@@ -283,11 +397,12 @@ class ImageGenerationService:
                 "mood": mood,
                 "positive_prompt": positive_prompt,
                 "negative_prompt": negative_prompt,
-                "local_filepath": local_filepath
+                "local_filepath": local_filepath,
+                "content_sha256": ai_result["image_sha256s"][0]
             },
             updated_at_ts=now_ms()
         )
-        VariantDAL.create(db, variant_data)
+        await self._save_image_variants(db, [variant_data], ai_result)
         
         # 9. 不在这里标记为已看，等用户实际看到时再标记
         
@@ -300,79 +415,79 @@ class ImageGenerationService:
     
     async def start_background_generation(
         self, 
-        db: Session, 
         soul_id: str, 
         cue: str, 
-        user_id: str
+        user_id: str,
+        deadline_ts: Optional[int] = None
     ) -> str:
         """
         启动后台图像生成任务
         
         Args:
-            db: 数据库会话
             soul_id: Soul ID
             cue: 提示词
             user_id: 用户ID
+            deadline_ts: 截止时间戳（毫秒，可选）
             
         Returns:
             任务ID
         """
         # 创建任务
-        task_id = self.task_manager.create_task(
+        task_id = await self.task_manager.create_task(
             TaskType.STYLE_GENERATION,
             {
                 "soul_id": soul_id,
                 "cue": cue,
                 "user_id": user_id
-            }
+            },
+            deadline_ts=deadline_ts
         )
         
-        # 启动后台任务
+        # 启动后台任务（任务自行打开数据库会话，不复用请求会话）
         await self.task_manager.start_task(
             task_id,
-            self._background_generate_variant,
-            db
+            self._background_generate_variant
         )
         
         return task_id
     
     async def start_background_selfie(
         self, 
-        db: Session, 
         soul_id: str, 
         city_key: str, 
         mood: str, 
-        user_id: str
+        user_id: str,
+        deadline_ts: Optional[int] = None
     ) -> str:
         """
         启动后台自拍生成任务
         
         Args:
-            db: 数据库会话
             soul_id: Soul ID
             city_key: 城市键
             mood: 情绪
             user_id: 用户ID
+            deadline_ts: 截止时间戳（毫秒，可选）
             
         Returns:
             任务ID
         """
         # 创建任务
-        task_id = self.task_manager.create_task(
+        task_id = await self.task_manager.create_task(
             TaskType.SELFIE_GENERATION,
             {
                 "soul_id": soul_id,
                 "city_key": city_key,
                 "mood": mood,
                 "user_id": user_id
-            }
+            },
+            deadline_ts=deadline_ts
         )
         
-        # 启动后台任务
+        # 启动后台任务（任务自行打开数据库会话，不复用请求会话）
         await self.task_manager.start_task(
             task_id,
-            self._background_generate_selfie,
-            db
+            self._background_generate_selfie
         )
         
         return task_id
@@ -380,14 +495,14 @@ class ImageGenerationService:
     async def _background_generate_variant(
         self, 
         task: BackgroundTask, 
-        db: Session
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]]
     ) -> Dict[str, Any]:
         """
         后台生成变体任务
         
         Args:
             task: 后台任务对象
-            db: 数据库会话
+            session_factory: 数据库会话工厂（每个工作单元打开短生命周期会话）
             
         Returns:
             生成结果
@@ -397,82 +512,67 @@ class ImageGenerationService:
         cue = params["cue"]
         user_id = params["user_id"]
         
-        # 生成锁键（基于 soul_id + cue 确保同一提示词串行）
-        lock_key = f"{soul_id}|{cue}"
-        
-        # 使用进程内锁确保相同的提示词串行执行
-        async with with_lock(lock_key):
-            try:
-                # 更新进度
-                task.progress = 10
-                await asyncio.sleep(0.1)  # 让出控制权
-                
-                # 检查取消
-                if task.cancelled:
-                    raise asyncio.CancelledError()
-                
-                # 1. 尝试从缓存中查找相似的PromptKey
-                task.progress = 20
-                similar_pk = self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
-                
-                await asyncio.sleep(0.1)
-                if task.cancelled:
-                    raise asyncio.CancelledError()
-                
-                if similar_pk:
-                    # 2. 查找该PromptKey下用户未看过的变体
-                    task.progress = 30
-                    unseen_variants = VariantDAL.list_unseen_by_pk_id(db, similar_pk.pk_id, user_id)
-                    
-                    await asyncio.sleep(0.1)
-                    if task.cancelled:
-                        raise asyncio.CancelledError()
-                    
-                    if unseen_variants:
-                        # 5. 选择最佳变体（最新的）
-                        best_variant = max(unseen_variants, key=lambda v: v.updated_at_ts)
-                        
-                        # 立即标记为已看，防止后续任务返回同一变体
-                        UserSeenDAL.mark_seen(db, user_id, best_variant.variant_id)
-                        
-                        task.progress = 100
-                        return {
-                            "url": best_variant.asset_url,
-                            "variant_id": best_variant.variant_id,
-                            "pk_id": best_variant.pk_id,
-                            "cache_hit": True
-                        }
-                
-                # 7. 需要生成新变体
-                task.progress = 40
-                await asyncio.sleep(0.1)
-                if task.cancelled:
-                    raise asyncio.CancelledError()
-                
-                result = await self._background_generate_new_variant(
-                    task, db, soul_id, cue, user_id, similar_pk
-                )
-                
+        try:
+            # 更新进度
+            task.progress = 10
+            
+            # 1. 快速路径：查找相似的PromptKey并认领用户未看过的变体
+            async with session_factory() as db:
+                similar_pk = await self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
+                cached = await self._claim_from_pk(db, similar_pk.pk_id, user_id) if similar_pk else None
+                if not cached:
+                    key = flight_key("image", await self._flight_pk_id(db, soul_id, cue, similar_pk))
+            
+            task.progress = 30
+            if cached:
                 task.progress = 100
-                return result
+                return cached
+            
+            await asyncio.sleep(0.1)
+            if task.cancelled:
+                raise asyncio.CancelledError()
+            
+            # 2. 需要生成新变体：同一提示词键的并发请求合并为一次生成
+            task.progress = 40
+            while True:
+                result, leader = await generation_flights.do(
+                    key,
+                    lambda: self._background_generate_new_variant(
+                        task, session_factory, soul_id, cue, user_id, similar_pk
+                    )
+                )
+                if leader:
+                    break
                 
-            except asyncio.CancelledError:
-                raise
-            except Exception as e:
-                task.error = str(e)
-                raise
+                # 跟随者：从刚生成的批次中认领；该用户已看过则参与下一批生成
+                async with session_factory() as db:
+                    cached = await self._claim_from_pk(db, result["pk_id"], user_id)
+                    if not cached:
+                        similar_pk = await AsyncPromptKeyDAL.get_by_id(db, result["pk_id"])
+                if cached:
+                    result = cached
+                    break
+            
+            task.progress = 100
+            return result
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            task.error = str(e)
+            raise
     
     async def _background_generate_selfie(
         self, 
         task: BackgroundTask, 
-        db: Session
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]]
     ) -> Dict[str, Any]:
         """
         后台生成自拍任务
         
         Args:
             task: 后台任务对象
-            db: 数据库会话
+            session_factory: 数据库会话工厂（每个工作单元打开短生命周期会话）
             
         Returns:
             生成结果
@@ -491,19 +591,13 @@ class ImageGenerationService:
             if task.cancelled:
                 raise asyncio.CancelledError()
             
-            # 1. 选择地标
+            # 1. 选择地标并构建自拍提示词
             task.progress = 20
-            landmark_key = self.place_chooser.choose_landmark(db, soul_id, city_key, user_id)
-            
-            await asyncio.sleep(0.1)
-            if task.cancelled:
-                raise asyncio.CancelledError()
-            
-            # 2. 构建自拍提示词
+            async with session_factory() as db:
+                landmark_key, positive_prompt, negative_prompt = await self._choose_selfie_prompt(
+                    db, soul_id, city_key, mood, user_id
+                )
             task.progress = 30
-            positive_prompt, negative_prompt = self.prompt_builder.build_selfie_prompt(
-                soul_id, city_key, landmark_key, mood, db
-            )
             
             await asyncio.sleep(0.1)
             if task.cancelled:
@@ -518,7 +612,7 @@ class ImageGenerationService:
             if task.cancelled:
                 raise asyncio.CancelledError()
             
-            # 4. 使用Wan API生成自拍图像（替代本地模型）
+            # 4. 使用Wan API生成自拍图像（等待期间不持有数据库连接）
             task.progress = 50
             wan_service = get_wan_image_service()
             ai_result = await wan_service.generate_image_from_text(
@@ -526,70 +620,69 @@ class ImageGenerationService:
                 negative_prompt=negative_prompt,
                 output_filename=f"{soul_id}_selfie_{variant_id}",
                 seed=seed,
-                n=1
+                n=1,
+                fair_key=user_id
             )
             
             await asyncio.sleep(0.1)
             if task.cancelled:
                 raise asyncio.CancelledError()
             
-            # 5. 生成缓存键
+            # 5. 生成本地文件路径（后续可改为GCS）
             task.progress = 70
-            selfie_cue = f"selfie_{city_key}_{landmark_key}_{mood}"
-            pk_data = self.prompt_cache.create_prompt_key(
-                db, soul_id, selfie_cue, {
-                    "selfie_type": True,
-                    "city": city_key,
-                    "landmark": landmark_key,
-                    "mood": mood,
-                    "canonical_prompt": positive_prompt
-                }
-            )
-            
-            await asyncio.sleep(0.1)
-            if task.cancelled:
-                raise asyncio.CancelledError()
-            
-            # 6. 生成本地文件路径（后续可改为GCS）
-            task.progress = 80
             local_filepath = ai_result["image_paths"][0]  # 使用第一张图像
             filename = os.path.basename(local_filepath)
-            storage_key = f"soul/{soul_id}/selfie/{city_key}/{landmark_key}/{variant_id}.png"
+            storage_key = ai_result["image_storage_keys"][0]  # 内容寻址存储中的图像
             asset_url = ai_result["image_url"]  # 使用Wan API返回的URL
             
-            # 7. 创建变体记录
-            task.progress = 90
             # 获取图像文件大小
             from pathlib import Path
             image_size = Path(local_filepath).stat().st_size if os.path.exists(local_filepath) else 0
             
-            variant_data = VariantBase(
-                variant_id=variant_id,
-                pk_id=pk_data.pk_id,
-                soul_id=soul_id,
-                asset_url=asset_url,
-                storage_key=storage_key,
-                seed=seed,
-                phash=None,  # Wan API不返回phash，设为None
-                meta_json={
-                    "type": "wan_image_selfie",
-                    "file_size": image_size,
-                    "generation_time_seconds": ai_result.get("image_generation_seconds", 0),
-                    "selfie_type": True,
-                    "city": city_key,
-                    "landmark": landmark_key,
-                    "mood": mood,
-                    "positive_prompt": positive_prompt,
-                    "negative_prompt": negative_prompt,
-                    "local_filepath": local_filepath,
-                    "task_id": ai_result.get("task_id", "")
-                },
-                updated_at_ts=now_ms()
-            )
-            VariantDAL.create(db, variant_data)
-            
-            # 立即标记为已看，防止后续任务返回这一新生成的变体
-            UserSeenDAL.mark_seen(db, user_id, variant_id)
+            async with session_factory() as db:
+                # 6. 生成缓存键
+                task.progress = 80
+                selfie_cue = f"selfie_{city_key}_{landmark_key}_{mood}"
+                pk_data = await self.prompt_cache.create_prompt_key(
+                    db, soul_id, selfie_cue, {
+                        "selfie_type": True,
+                        "city": city_key,
+                        "landmark": landmark_key,
+                        "mood": mood,
+                        "canonical_prompt": positive_prompt
+                    }
+                )
+                
+                # 7. 创建变体记录
+                task.progress = 90
+                variant_data = VariantBase(
+                    variant_id=variant_id,
+                    pk_id=pk_data.pk_id,
+                    soul_id=soul_id,
+                    asset_url=asset_url,
+                    storage_key=storage_key,
+                    seed=seed,
+                    phash=None,  # Wan API不返回phash，设为None
+                    meta_json={
+                        "type": "wan_image_selfie",
+                        "file_size": image_size,
+                        "generation_time_seconds": ai_result.get("image_generation_seconds", 0),
+                        "selfie_type": True,
+                        "city": city_key,
+                        "landmark": landmark_key,
+                        "mood": mood,
+                        "positive_prompt": positive_prompt,
+                        "negative_prompt": negative_prompt,
+                        "local_filepath": local_filepath,
+                        "content_sha256": ai_result["image_sha256s"][0],
+                        "task_id": ai_result.get("task_id", "")
+                    },
+                    updated_at_ts=now_ms()
+                )
+                await self._save_image_variants(db, [variant_data], ai_result)
+                
+                # 立即标记为已看，防止后续任务返回这一新生成的变体
+                await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
             
             task.progress = 100
             return {
@@ -608,7 +701,7 @@ class ImageGenerationService:
     async def _background_generate_new_variant(
         self, 
         task: BackgroundTask,
-        db: Session, 
+        session_factory: Callable[[], AsyncContextManager[AsyncSession]],
         soul_id: str, 
         cue: str, 
         user_id: str,
@@ -618,17 +711,14 @@ class ImageGenerationService:
         try:
             # 1. 获取Soul风格配置
             task.progress = 50
-            style_profile = SoulStyleProfileDAL.get_by_soul_id(db, soul_id)
-            if not style_profile:
-                raise ValueError(f"Soul '{soul_id}' style profile not found")
-            
-            await asyncio.sleep(0.1)
-            if task.cancelled:
-                raise asyncio.CancelledError()
-            
-            # 2. 构建提示词
-            task.progress = 60
-            positive_prompt, negative_prompt = self.prompt_builder.build_prompt(soul_id, cue, db)
+            async with session_factory() as db:
+                style_profile = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+                if not style_profile:
+                    raise ValueError(f"Soul '{soul_id}' style profile not found")
+                
+                # 2. 构建提示词
+                task.progress = 60
+                positive_prompt, negative_prompt = await self._build_prompt(db, soul_id, cue)
             
             await asyncio.sleep(0.1)
             if task.cancelled:
@@ -651,14 +741,15 @@ class ImageGenerationService:
                 raise asyncio.CancelledError()
             
             try:
-                # 使用Wan API生成图像
+                # 使用Wan API生成图像（等待期间不持有数据库连接），一次填充变体池
                 wan_service = get_wan_image_service()
                 ai_result = await wan_service.generate_image_from_text(
                     positive_prompt=positive_prompt,
                     negative_prompt=negative_prompt,
                     output_filename=f"{soul_id}_{variant_id}",
                     seed=seed,
-                    n=1
+                    n=config.WAN_IMAGE_POOL_SIZE,
+                    fair_key=user_id
                 )
             except asyncio.CancelledError:
                 # 图像生成被取消
@@ -669,52 +760,27 @@ class ImageGenerationService:
             if task.cancelled:
                 raise asyncio.CancelledError()
             
-            # 5. 生成本地文件路径（后续可改为GCS）
-            task.progress = 85
-            local_filepath = ai_result["image_paths"][0]  # 使用第一张图像
-            filename = os.path.basename(local_filepath)
-            storage_key = f"soul/{soul_id}/key/{similar_pk.pk_id if similar_pk else 'new'}/variant/{variant_id}.png"
-            asset_url = ai_result["image_url"]  # 使用Wan API返回的URL
-            
-            # 6. 创建或更新提示词键
-            task.progress = 90
-            if not similar_pk:
-                pk_data = self.prompt_cache.create_prompt_key(
-                    db, soul_id, cue, {"canonical_prompt": positive_prompt}
+            async with session_factory() as db:
+                # 5. 创建或更新提示词键
+                task.progress = 90
+                if not similar_pk:
+                    pk_data = await self.prompt_cache.create_prompt_key(
+                        db, soul_id, cue, {"canonical_prompt": positive_prompt}
+                    )
+                    pk_id = pk_data.pk_id
+                else:
+                    pk_id = similar_pk.pk_id
+                
+                # 6. 每张图像创建一条变体记录
+                task.progress = 95
+                variants = self._build_image_variants(
+                    soul_id, pk_id, variant_id, seed, ai_result, positive_prompt, negative_prompt
                 )
-                pk_id = pk_data.pk_id
-            else:
-                pk_id = similar_pk.pk_id
-            
-            # 7. 创建变体记录
-            task.progress = 95
-            # 获取图像文件大小
-            from pathlib import Path
-            image_size = Path(local_filepath).stat().st_size if os.path.exists(local_filepath) else 0
-            
-            variant_data = VariantBase(
-                variant_id=variant_id,
-                pk_id=pk_id,
-                soul_id=soul_id,
-                asset_url=asset_url,
-                storage_key=storage_key,
-                seed=seed,
-                phash=None,  # Wan API不返回phash，设为None
-                meta_json={
-                    "type": "wan_image",
-                    "file_size": image_size,
-                    "generation_time_seconds": ai_result.get("image_generation_seconds", 0),
-                    "positive_prompt": positive_prompt,
-                    "negative_prompt": negative_prompt,
-                    "local_filepath": local_filepath,
-                    "task_id": ai_result.get("task_id", "")
-                },
-                updated_at_ts=now_ms()
-            )
-            VariantDAL.create(db, variant_data)
-            
-            # 立即标记为已看，防止后续任务返回这一新生成的变体
-            UserSeenDAL.mark_seen(db, user_id, variant_id)
+                await self._save_image_variants(db, variants, ai_result)
+                
+                # 立即标记为已看，防止后续任务返回这一新生成的变体（其余变体留给其他用户）
+                await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
+            asset_url = variants[0].asset_url
             
             return {
                 "url": asset_url,
@@ -729,15 +795,15 @@ class ImageGenerationService:
             task.error = str(e)
             raise
     
-    def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务状态"""
-        return self.task_manager.get_task_status(task_id)
+        return await self.task_manager.get_task_status(task_id)
     
     async def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
         return await self.task_manager.cancel_task(task_id)
     
-    def list_tasks(self, status_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def list_tasks(self, status_filter: Optional[str] = None) -> List[Dict[str, Any]]:
         """列出任务"""
         from ..core.task_manager import TaskStatus
         filter_status = None
@@ -747,4 +813,4 @@ class ImageGenerationService:
             except ValueError:
                 pass
         
-        return self.task_manager.list_tasks(filter_status)
+        return await self.task_manager.list_tasks(filter_status)
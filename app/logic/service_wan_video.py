@@ -1,35 +1,31 @@
 """
 Wan 文本到视频生成服务 - 使用阿里云 DashScope API
 """
-import os
 import asyncio
+import os
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from pathlib import Path
-from http import HTTPStatus
-from dashscope import VideoSynthesis
-import dashscope
-import requests
-from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout, RequestException
-import imageio
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import config
 from ..core.ids import generate_ulid
 from ..core.lww import now_ms
-from ..data.dal import (
-    SoulStyleProfileDAL, VariantDAL, UserSeenDAL,
-    PromptKeyDAL, WorkLockDAL, LandmarkLogDAL
+from ..core.scheduler import generation_scheduler, GenerationScheduler
+from ..core.singleflight import generation_flights, flight_key
+from ..data.dal import VariantDAL
+from ..data.async_dal import (
+    AsyncPromptKeyDAL, AsyncSoulStyleProfileDAL, AsyncUserSeenDAL, AsyncLandmarkLogDAL
 )
 from ..data.models import VariantBase, LandmarkLogBase
 from .prompt_cache import PromptCache, PromptBuilder
 from .place_chooser import PlaceChooser
-
-
-# 配置 DashScope API
-dashscope.base_http_api_url = config.WAN_API_BASE_URL
-
-# 公网地址配置（用于生成的媒体文件访问）
-PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://34.148.94.241:8000")
+from .variant_pool import claim_unseen_variant, VIDEO_VARIANT_TYPES
+from .asset_store import asset_store
+from .storage_backend import build_asset_url, register_asset
+from .gif_encoder import convert_mp4_to_gif, resolve_gif_profile
+from .wan_client import get_wan_client
+from .wan_poller import get_wan_poller, WanTaskPoller
 
 
 class WanVideoGenerationService:
@@ -66,7 +62,9 @@ class WanVideoGenerationService:
         negative_prompt: str = "",
         output_filename: Optional[str] = None,
         seed: Optional[int] = None,
-        generate_gif: bool = True
+        generate_gif: bool = True,
+        fair_key: Optional[str] = None,
+        gif_profile: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         从文本生成视频
@@ -77,159 +75,59 @@ class WanVideoGenerationService:
             output_filename: 输出文件名（不含扩展名），如果为None则自动生成
             seed: 随机种子
             generate_gif: 是否同时生成GIF，默认True
+            fair_key: 调度器公平排队键（用户ID或Soul ID）
+            gif_profile: GIF编码配置名称，默认 GIF_DEFAULT_PROFILE
             
         Returns:
             生成结果信息
         """
         start_time = time.time()
+        gif_profile = resolve_gif_profile(gif_profile)
         
         # 生成输出文件名
         if output_filename is None:
             output_filename = f"wan_video_{generate_ulid()}"
         
-        # 调用异步API
-        print(f"正在调用 Wan API 生成视频...")
-        print(f"提示词: {positive_prompt}")
-        
-        rsp = VideoSynthesis.async_call(
-            api_key=self.api_key,
-            model=self.model,
-            prompt=positive_prompt,
-            size=self.size,
-            duration=self.duration,
-            negative_prompt=negative_prompt if negative_prompt else "",
-            prompt_extend=self.prompt_extend,
-            watermark=self.watermark,
-            seed=seed
-        )
-        
-        if rsp.status_code != HTTPStatus.OK:
-            raise RuntimeError(
-                f'Wan API调用失败: status_code={rsp.status_code}, '
-                f'code={rsp.code}, message={rsp.message}'
+        # 占用Wan视频后端槽位（提交、等待、下载期间；GIF转换在本地进行，不占用槽位）
+        async with generation_scheduler.slot(GenerationScheduler.BACKEND_WAN_VIDEO, fair_key):
+            # 调用异步API
+            print(f"正在调用 Wan API 生成视频...")
+            print(f"提示词: {positive_prompt}")
+        
+            client = get_wan_client()
+            task_id = await client.submit_video_task(
+                prompt=positive_prompt,
+                negative_prompt=negative_prompt if negative_prompt else "",
+                model=self.model,
+                size=self.size,
+                duration=self.duration,
+                seed=seed,
+                prompt_extend=self.prompt_extend,
+                watermark=self.watermark
             )
+            print(f"任务ID: {task_id}")
         
-        task_id = rsp.output.task_id
-        print(f"任务ID: {task_id}")
-        
-        # 等待任务完成（使用手动轮询，添加重试机制和错误处理）
-        print("等待视频生成完成...")
-        max_retries = 5  # 增加重试次数
-        retry_count = 0
-        max_wait_time = 1200  # 最大等待时间（秒）- 改为 20 分钟，因为 Wan API 视频生成需要 10-15 分钟
-        start_wait_time = time.time()
-        last_status = None
-        
-        while True:
-            try:
-                # 检查是否超时
-                elapsed_time = time.time() - start_wait_time
-                if elapsed_time > max_wait_time:
-                    raise RuntimeError(f"视频生成超时（超过 {max_wait_time} 秒），任务ID: {task_id}")
-                
-                # 使用 fetch 查询任务状态（传入 api_key）
-                try:
-                    status_rsp = VideoSynthesis.fetch(rsp, api_key=self.api_key)
-                except Exception as fetch_error:
-                    # fetch 调用本身失败，可能是网络问题
-                    if retry_count < max_retries:
-                        retry_count += 1
-                        wait_time = min(10 * retry_count, 30)
-                        print(f"查询任务状态时发生错误: {type(fetch_error).__name__}: {str(fetch_error)}")
-                        print(f"{wait_time}秒后重试 {retry_count}/{max_retries}...")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        raise RuntimeError(f"查询任务状态失败，已重试 {max_retries} 次: {type(fetch_error).__name__}: {str(fetch_error)}")
-                
-                if status_rsp.status_code != HTTPStatus.OK:
-                    if retry_count < max_retries:
-                        retry_count += 1
-                        print(f"查询任务状态失败，重试 {retry_count}/{max_retries}...")
-                        await asyncio.sleep(5)  # 等待5秒后重试
-                        continue
-                    else:
-                        raise RuntimeError(
-                            f'查询任务状态失败: status_code={status_rsp.status_code}, '
-                            f'code={status_rsp.code}, message={status_rsp.message}'
-                        )
-                
-                task_status = status_rsp.output.task_status
-                last_status = task_status
-                print(f"任务状态: {task_status} (已等待 {elapsed_time:.1f} 秒)")
-                
-                if task_status == "SUCCEEDED":
-                    rsp = status_rsp
-                    print(f"视频生成成功！总耗时: {elapsed_time:.1f} 秒")
-                    break
-                elif task_status == "FAILED":
-                    error_msg = "未知错误"
-                    if hasattr(status_rsp.output, 'message') and status_rsp.output.message:
-                        error_msg = status_rsp.output.message
-                    elif hasattr(status_rsp, 'message') and status_rsp.message:
-                        error_msg = status_rsp.message
-                    raise RuntimeError(f"视频生成失败: {error_msg}")
-                elif task_status in ["PENDING", "RUNNING"]:
-                    # 任务还在进行中，等待后继续查询
-                    retry_count = 0  # 重置重试计数（任务正常进行中）
-                    await asyncio.sleep(10)  # 等待10秒后再次查询
-                else:
-                    # 未知状态，等待后重试
-                    print(f"警告: 未知任务状态 '{task_status}'")
-                    await asyncio.sleep(5)
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        raise RuntimeError(f"任务状态异常: {task_status}，已重试 {max_retries} 次")
-                    
-            except (ConnectionResetError, ConnectionError, RequestsConnectionError, Timeout, RequestException) as e:
-                elapsed_time = time.time() - start_wait_time
-                if retry_count < max_retries:
-                    retry_count += 1
-                    wait_time = min(10 * retry_count, 30)  # 递增等待时间，最多30秒
-                    print(f"网络连接错误 ({elapsed_time:.1f}秒)，{wait_time}秒后重试 {retry_count}/{max_retries}...")
-                    print(f"错误详情: {type(e).__name__}: {str(e)}")
-                    await asyncio.sleep(wait_time)
-                    # 继续使用现有的 rsp 对象，确保 task_id 存在
-                    if not hasattr(rsp, 'output') or not hasattr(rsp.output, 'task_id'):
-                        # 如果 rsp 对象损坏，需要重新构建
-                        class TaskOutput:
-                            def __init__(self, task_id):
-                                self.task_id = task_id
-                        class TaskResponse:
-                            def __init__(self, task_id):
-                                self.output = TaskOutput(task_id)
-                        rsp = TaskResponse(task_id)
-                else:
-                    raise RuntimeError(f"网络连接失败，已重试 {max_retries} 次 (总耗时 {elapsed_time:.1f}秒): {type(e).__name__}: {str(e)}")
-            except Exception as e:
-                # 其他未知错误
-                elapsed_time = time.time() - start_wait_time
-                print(f"未知错误 ({elapsed_time:.1f}秒): {type(e).__name__}: {str(e)}")
-                if retry_count < max_retries:
-                    retry_count += 1
-                    wait_time = min(10 * retry_count, 30)
-                    print(f"{wait_time}秒后重试 {retry_count}/{max_retries}...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise RuntimeError(f"视频生成过程中发生错误 (总耗时 {elapsed_time:.1f}秒): {type(e).__name__}: {str(e)}")
-        
-        if rsp.status_code != HTTPStatus.OK:
-            raise RuntimeError(
-                f'视频生成失败: status_code={rsp.status_code}, '
-                f'code={rsp.code}, message={rsp.message}'
-            )
+            # 等待任务完成（由集中轮询器统一查询，结果通过future返回）
+            print("等待视频生成完成...")
+            max_wait_time = 1200  # 最大等待时间（秒）- 20 分钟，因为 Wan API 视频生成需要 10-15 分钟
+            output = await get_wan_poller().wait(task_id, WanTaskPoller.KIND_VIDEO, max_wait_time)
         
-        video_url = rsp.output.video_url
-        print(f"视频URL: {video_url}")
+            video_url = output.get("video_url")
+            if not video_url:
+                raise RuntimeError(f"视频生成失败: 任务 {task_id} 未返回视频URL")
+            print(f"视频URL: {video_url}")
         
-        # 下载视频
-        mp4_path = await self._download_video(video_url, output_filename)
+            # 下载视频
+            mp4_path, mp4_sha256 = await self._download_video(video_url, output_filename)
         
         video_generation_time = time.time() - start_time
 
+        # 移入内容寻址存储（相同内容只保存一份）
+        mp4_blob = await asyncio.to_thread(asset_store.ingest, mp4_path, mp4_sha256)
+        mp4_path = mp4_blob["path"]
+
         # 返回完整的公网 URL
-        mp4_relative_url = f"/static/videos/{mp4_path.name}"
-        mp4_public_url = f"{PUBLIC_API_URL}{mp4_relative_url}"
+        mp4_public_url = build_asset_url(mp4_blob["storage_key"])
 
         result = {
             "mp4_path": str(mp4_path),
@@ -237,6 +135,9 @@ class WanVideoGenerationService:
             "video_filename": mp4_path.name,
             "video_size_mb": round(mp4_path.stat().st_size / 1024 / 1024, 2),
             "video_generation_seconds": round(video_generation_time, 2),
+            "mp4_sha256": mp4_sha256,
+            "mp4_storage_key": mp4_blob["storage_key"],
+            "mp4_blob": mp4_blob,
             "task_id": task_id
         }
 
@@ -247,20 +148,31 @@ class WanVideoGenerationService:
             print("正在将MP4转换为GIF...")
             gif_start_time = time.time()
             
-            gif_path = await self._convert_mp4_to_gif(str(mp4_path))
+            # GIF先写到输出目录，编码完成后再移入存储
+            gif_path, gif_stats = await self._convert_mp4_to_gif(
+                str(mp4_path),
+                gif_path=str(self.output_dir / f"{output_filename}.gif"),
+                profile=gif_profile
+            )
+            gif_blob = await asyncio.to_thread(asset_store.ingest, gif_path)
+            gif_path = gif_blob["path"]
             
             gif_conversion_time = time.time() - gif_start_time
 
             # 返回完整的公网 URL
-            gif_relative_url = f"/static/videos/{gif_path.name}"
-            gif_public_url = f"{PUBLIC_API_URL}{gif_relative_url}"
+            gif_public_url = build_asset_url(gif_blob["storage_key"])
 
             result.update({
                 "gif_path": str(gif_path),
                 "gif_url": gif_public_url,  # 返回完整的公网 URL
                 "gif_filename": gif_path.name,
                 "gif_size_mb": round(gif_path.stat().st_size / 1024 / 1024, 2),
-                "gif_conversion_seconds": round(gif_conversion_time, 2)
+                "gif_conversion_seconds": round(gif_conversion_time, 2),
+                "gif_profile": gif_stats["profile"],
+                "gif_encode_seconds": gif_stats["encode_seconds"],
+                "gif_bytes": gif_stats["bytes"],
+                "gif_storage_key": gif_blob["storage_key"],
+                "gif_blob": gif_blob
             })
 
             print(f"GIF已生成: {gif_path}")
@@ -271,7 +183,7 @@ class WanVideoGenerationService:
         
         return result
     
-    async def _download_video(self, video_url: str, output_filename: str) -> Path:
+    async def _download_video(self, video_url: str, output_filename: str) -> Tuple[Path, str]:
         """
         下载视频文件
         
@@ -280,148 +192,155 @@ class WanVideoGenerationService:
             output_filename: 输出文件名（不含扩展名）
             
         Returns:
-            视频文件路径
+            (视频文件路径, 内容SHA-256)
         """
         mp4_path = self.output_dir / f"{output_filename}.mp4"
         
-        # 下载视频
-        response = requests.get(video_url, stream=True)
-        response.raise_for_status()
-        
-        with open(mp4_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # 下载视频（复用客户端连接池，断点续传，完成后原子替换）
+        download = await get_wan_client().download(video_url, mp4_path)
         
-        print(f"视频已下载: {mp4_path}")
-        return mp4_path
+        print(f"视频已下载: {mp4_path} ({download['bytes']} 字节, sha256={download['sha256']})")
+        return mp4_path, download["sha256"]
     
-    async def _convert_mp4_to_gif(self, mp4_path: str, gif_path: Optional[str] = None) -> Path:
+    @staticmethod
+    async def _save_video_variant(
+        db: AsyncSession, variant_data: VariantBase, video_result: Dict[str, Any]
+    ) -> None:
+        """写入变体记录，登记新变体引用的MP4与GIF并调度后台上传"""
+        def save(session) -> None:
+            VariantDAL.create(session, variant_data)
+            register_asset(session, video_result.get("mp4_blob"))
+            register_asset(session, video_result.get("gif_blob"))
+        
+        await db.run_sync(save)
+    
+    async def _convert_mp4_to_gif(
+        self,
+        mp4_path: str,
+        gif_path: Optional[str] = None,
+        profile: Optional[str] = None
+    ) -> Tuple[Path, Dict[str, Any]]:
         """
-        将MP4转换为GIF
+        将MP4转换为GIF（流式编码，在进程池中执行）
         
         Args:
             mp4_path: MP4文件路径
             gif_path: 输出GIF路径，如果为None则自动生成
+            profile: GIF编码配置名称
             
         Returns:
-            GIF文件路径
+            (GIF文件路径, 编码统计)
         """
         if gif_path is None:
             gif_path = str(Path(mp4_path).with_suffix('.gif'))
         
-        gif_path_obj = Path(gif_path)
-        
         try:
-            # 读取MP4视频
-            reader = imageio.get_reader(mp4_path)
-            
-            # 获取视频信息
-            fps_actual = reader.get_meta_data().get('fps', 8)
-            
-            # 读取所有帧
-            frames_list = []
-            for frame in reader:
-                frames_list.append(frame)
-            reader.close()
-            
-            # 保存为GIF
-            imageio.mimsave(
-                str(gif_path_obj),
-                frames_list,
-                fps=min(fps_actual, 10),  # GIF帧率限制在10fps以内
-                loop=0  # 0表示无限循环
-            )
-            
-            return gif_path_obj
+            stats = await convert_mp4_to_gif(mp4_path, gif_path, profile)
+            print(f"GIF编码完成: {stats}")
+            return Path(gif_path), stats
             
         except Exception as e:
             raise RuntimeError(f"GIF转换失败: {e}")
     
     async def get_or_create_variant(
         self,
-        db,
+        db: AsyncSession,
         soul_id: str,
         cue: str,
-        user_id: str
+        user_id: str,
+        gif_profile: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取或创建视频变体（唯一变体逻辑）
         
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             cue: 提示词
             user_id: 用户ID
+            gif_profile: GIF编码配置名称（仅对新生成的变体生效）
             
         Returns:
             变体信息
         """
-        import random
-        from ..core.locks import with_lock
-        
-        # 生成锁键（基于 soul_id + cue 确保同一提示词串行）
-        lock_key = f"wan:{soul_id}|{cue}"
-        
-        async with with_lock(lock_key):
-            # 1. 查找相似的提示词键
-            similar_pk = self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
-            
-            if similar_pk:
-                # 2. 获取现有变体（视频变体）
-                existing_variants = VariantDAL.list_by_pk_id(db, similar_pk.pk_id)
-                
-                # 过滤视频变体（通过 meta_json 中的 type 字段）
-                video_variants = [
-                    v for v in existing_variants
-                    if v.meta_json and v.meta_json.get('type') == 'wan_video'
-                ]
-                
-                if video_variants:
-                    # 3. 获取用户已看过的变体
-                    user_seen_variants = UserSeenDAL.get_seen_variants(db, user_id)
-                    
-                    # 4. 过滤未看过的变体
-                    unseen_variants = [
-                        v for v in video_variants
-                        if v.variant_id not in user_seen_variants
-                    ]
-                    
-                    if unseen_variants:
-                        # 5. 选择最佳变体（最新的）
-                        best_variant = max(unseen_variants, key=lambda v: v.updated_at_ts)
-                        
-                        # 立即标记为已看
-                        UserSeenDAL.mark_seen(db, user_id, best_variant.variant_id)
-                        
-                        return {
-                            "mp4_url": best_variant.asset_url,
-                            "gif_url": best_variant.meta_json.get('gif_url', ''),
-                            "variant_id": best_variant.variant_id,
-                            "pk_id": best_variant.pk_id,
-                            "cache_hit": True
-                        }
+        if gif_profile is not None:
+            resolve_gif_profile(gif_profile)
+        
+        # 1. 快速路径：查找已有视频变体，通过user_seen原子认领
+        similar_pk = await self.prompt_cache.find_similar_prompt_key(db, soul_id, cue)
+        if similar_pk:
+            cached = await self._claim_from_pk(db, similar_pk.pk_id, user_id)
+            if cached:
+                return cached
+        
+        # 2. 同一提示词键的并发请求合并为一次视频生成
+        if similar_pk:
+            pk_id = similar_pk.pk_id
+        else:
+            _, _, pk_id = await db.run_sync(
+                lambda session: self.prompt_cache.generate_cache_key(cue, soul_id, session)
+            )
+        key = flight_key("video", pk_id)
+        while True:
+            result, leader = await generation_flights.do(
+                key,
+                lambda: self._generate_new_variant(db, soul_id, cue, user_id, similar_pk, gif_profile)
+            )
+            if leader:
+                return result
             
-            # 6. 需要生成新变体
-            return await self._generate_new_variant(db, soul_id, cue, user_id, similar_pk)
+            # 跟随者：认领刚生成的视频；该用户已看过则参与下一批生成
+            cached = await self._claim_from_pk(db, result["pk_id"], user_id)
+            if cached:
+                return cached
+            similar_pk = await AsyncPromptKeyDAL.get_by_id(db, result["pk_id"])
+    
+    def _select_gif_profile(self, style_profile: Optional[Any], requested: Optional[str]) -> str:
+        """选择GIF编码配置：请求参数 > Soul的extra_json.gif_profile > 全局默认"""
+        if requested:
+            return resolve_gif_profile(requested)
+        soul_profile = ((style_profile.extra_json or {}) if style_profile else {}).get("gif_profile")
+        if soul_profile:
+            try:
+                return resolve_gif_profile(soul_profile)
+            except ValueError as e:
+                print(f"Warning: {e}，使用默认配置")
+        return resolve_gif_profile(None)
+    
+    async def _claim_from_pk(self, db: AsyncSession, pk_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """认领指定提示词键下用户未看过的最新视频变体"""
+        variant = await claim_unseen_variant(db, pk_id, user_id, VIDEO_VARIANT_TYPES)
+        if not variant:
+            return None
+        return {
+            "mp4_url": variant.asset_url,
+            "gif_url": variant.meta_json.get('gif_url', ''),
+            "variant_id": variant.variant_id,
+            "pk_id": variant.pk_id,
+            "cache_hit": True
+        }
     
     async def _generate_new_variant(
         self,
-        db,
+        db: AsyncSession,
         soul_id: str,
         cue: str,
         user_id: str,
-        similar_pk: Optional[Any] = None
+        similar_pk: Optional[Any] = None,
+        gif_profile: Optional[str] = None
     ) -> Dict[str, Any]:
         """生成新视频变体"""
         import random
         
         # 1. 获取Soul风格配置
-        style_profile = SoulStyleProfileDAL.get_by_soul_id(db, soul_id)
+        style_profile = await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id)
         if not style_profile:
             raise ValueError(f"Soul '{soul_id}' style profile not found")
         
-        # 2. 构建提示词
-        positive_prompt, negative_prompt = self.prompt_builder.build_prompt(soul_id, cue, db)
+        # 2. 构建提示词（风格配置查询在 run_sync 中执行，不阻塞事件循环）
+        positive_prompt, negative_prompt = await db.run_sync(
+            lambda session: self.prompt_builder.build_prompt(soul_id, cue, session)
+        )
         
         # 3. 生成变体ID和随机种子
         variant_id = generate_ulid()
@@ -433,21 +352,20 @@ class WanVideoGenerationService:
             negative_prompt=negative_prompt,
             output_filename=f"wan_{variant_id}",
             seed=seed,
-            generate_gif=True
+            generate_gif=True,
+            fair_key=user_id,
+            gif_profile=self._select_gif_profile(style_profile, gif_profile)
         )
         
-        # 5. 构建存储路径和URL
-        mp4_filename = video_result["video_filename"]
-        gif_filename = video_result.get("gif_filename", "")
-        
-        storage_key = f"soul/{soul_id}/wan/key/{similar_pk.pk_id if similar_pk else 'new'}/variant/{variant_id}.mp4"
+        # 5. 构建存储路径和URL（storage_key 为内容寻址存储中的MP4）
+        storage_key = video_result["mp4_storage_key"]
         # 返回完整的公网 URL（已经在 generate_video_from_text 中生成）
         mp4_url = video_result["mp4_url"]  # 这已经是完整的公网 URL
         gif_url = video_result.get("gif_url", "")  # 这已经是完整的公网 URL
         
         # 6. 创建或更新提示词键
         if not similar_pk:
-            pk_data = self.prompt_cache.create_prompt_key(
+            pk_data = await self.prompt_cache.create_prompt_key(
                 db, soul_id, cue, {"canonical_prompt": positive_prompt}
             )
             pk_id = pk_data.pk_id
@@ -465,19 +383,24 @@ class WanVideoGenerationService:
             meta_json={
                 "type": "wan_video",
                 "local_filepath": video_result["mp4_path"],
+                "content_sha256": video_result.get("mp4_sha256"),
                 "gif_url": gif_url,
                 "gif_path": video_result.get("gif_path", ""),
+                "gif_storage_key": video_result.get("gif_storage_key"),
                 "video_size_mb": video_result["video_size_mb"],
                 "gif_size_mb": video_result.get("gif_size_mb", 0),
+                "gif_profile": video_result.get("gif_profile"),
+                "gif_encode_seconds": video_result.get("gif_encode_seconds"),
+                "gif_bytes": video_result.get("gif_bytes"),
                 "generation_time": video_result["total_seconds"]
             },
             updated_at_ts=now_ms()
         )
         
-        VariantDAL.create(db, variant_data)
+        await self._save_video_variant(db, variant_data, video_result)
         
         # 8. 标记为已看
-        UserSeenDAL.mark_seen(db, user_id, variant_id)
+        await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
         
         return {
             "mp4_url": mp4_url,
@@ -489,37 +412,37 @@ class WanVideoGenerationService:
     
     async def create_selfie(
         self,
-        db,
+        db: AsyncSession,
         soul_id: str,
         city_key: str,
         mood: str,
-        user_id: str
+        user_id: str,
+        gif_profile: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         创建Soul自拍视频
         
         Args:
-            db: 数据库会话
+            db: 异步数据库会话
             soul_id: Soul ID
             city_key: 城市键
             mood: 情绪
             user_id: 用户ID
+            gif_profile: GIF编码配置名称
             
         Returns:
             自拍视频信息
         """
         import random
-        from ..core.locks import with_lock
-        from ..data.dal import LandmarkLogDAL
-        from ..core.lww import now_ms
         
-        # 1. 选择地标
-        landmark_key = self.place_chooser.choose_landmark(db, soul_id, city_key)
+        # 1-2. 选择地标并构建自拍提示词（在 run_sync 中执行，不阻塞事件循环）
+        def choose(session):
+            landmark_key = self.place_chooser.choose_landmark(session, soul_id, city_key)
+            return (landmark_key,) + self.prompt_builder.build_selfie_prompt(
+                soul_id, city_key, landmark_key, mood, session
+            )
         
-        # 2. 构建自拍提示词
-        positive_prompt, negative_prompt = self.prompt_builder.build_selfie_prompt(
-            soul_id, city_key, landmark_key, mood, db
-        )
+        landmark_key, positive_prompt, negative_prompt = await db.run_sync(choose)
         
         # 3. 生成变体ID和随机种子
         variant_id = generate_ulid()
@@ -531,20 +454,22 @@ class WanVideoGenerationService:
             negative_prompt=negative_prompt,
             output_filename=f"wan_selfie_{variant_id}",
             seed=seed,
-            generate_gif=True
+            generate_gif=True,
+            fair_key=user_id,
+            gif_profile=self._select_gif_profile(
+                await AsyncSoulStyleProfileDAL.get_by_soul_id(db, soul_id), gif_profile
+            )
         )
         
-        # 5. 构建存储路径和URL
-        mp4_filename = video_result["video_filename"]
-        gif_filename = video_result.get("gif_filename", "")
-        
-        storage_key = f"soul/{soul_id}/wan/selfie/{city_key}/{landmark_key}/{variant_id}.mp4"
-        mp4_url = f"/static/videos/{mp4_filename}"
-        gif_url = f"/static/videos/{gif_filename}" if gif_filename else ""
+        # 5. 构建存储路径和URL（storage_key 为内容寻址存储中的MP4）
+        storage_key = video_result["mp4_storage_key"]
+        gif_storage_key = video_result.get("gif_storage_key")
+        mp4_url = asset_store.relative_url(storage_key)
+        gif_url = asset_store.relative_url(gif_storage_key) if gif_storage_key else ""
         
         # 6. 创建提示词键（自拍使用特殊的cue）
         selfie_cue = f"{soul_id} selfie at {landmark_key} in {city_key}, {mood} mood"
-        pk_data = self.prompt_cache.create_prompt_key(
+        pk_data = await self.prompt_cache.create_prompt_key(
             db, soul_id, selfie_cue, {"canonical_prompt": positive_prompt, "type": "selfie"}
         )
         pk_id = pk_data.pk_id
@@ -563,16 +488,21 @@ class WanVideoGenerationService:
                 "landmark_key": landmark_key,
                 "mood": mood,
                 "local_filepath": video_result["mp4_path"],
+                "content_sha256": video_result.get("mp4_sha256"),
                 "gif_url": gif_url,
                 "gif_path": video_result.get("gif_path", ""),
+                "gif_storage_key": video_result.get("gif_storage_key"),
                 "video_size_mb": video_result["video_size_mb"],
                 "gif_size_mb": video_result.get("gif_size_mb", 0),
+                "gif_profile": video_result.get("gif_profile"),
+                "gif_encode_seconds": video_result.get("gif_encode_seconds"),
+                "gif_bytes": video_result.get("gif_bytes"),
                 "generation_time": video_result["total_seconds"]
             },
             updated_at_ts=now_ms()
         )
         
-        VariantDAL.create(db, variant_data)
+        await self._save_video_variant(db, variant_data, video_result)
         
         # 8. 记录地标使用日志
         log_data = LandmarkLogBase(
@@ -582,10 +512,10 @@ class WanVideoGenerationService:
             user_id=user_id or "",
             used_at_ts=now_ms()
         )
-        LandmarkLogDAL.log_usage(db, log_data)
+        await AsyncLandmarkLogDAL.log_usage(db, log_data)
         
         # 9. 标记为已看
-        UserSeenDAL.mark_seen(db, user_id, variant_id)
+        await AsyncUserSeenDAL.mark_seen(db, user_id, variant_id)
         
         return {
             "mp4_url": mp4_url,
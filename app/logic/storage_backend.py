@@ -0,0 +1,289 @@
+"""
+存储后端 - 本地文件系统或对象存储（GCS），生成文件在响应后后台上传
+"""
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from ..config import config
+from .asset_store import asset_store, add_blob_ref
+
+
+def build_public_url(path: str) -> str:
+    """
+    生成API服务的公网地址（PUBLIC_API_URL + 相对路径）
+
+    Args:
+        path: 以 / 开头的相对路径
+    """
+    return f"{config.PUBLIC_API_URL.rstrip('/')}{path}"
+
+
+def build_asset_url(storage_key: str) -> str:
+    """
+    内容寻址资源的公网地址
+
+    使用对象存储且该资源已上传完成时直接返回对象地址（遵循 STORAGE_PUBLIC_BASE_URL），
+    资源流量不经过API进程；上传尚未完成时返回API地址。
+    """
+    uploader = get_asset_uploader()
+    if uploader.is_uploaded(storage_key):
+        return uploader.backend.object_url(storage_key)
+    return build_public_url(asset_store.relative_url(storage_key))
+
+
+class StorageBackend(ABC):
+    """存储后端基类：文件已在本地内容寻址存储中，后端负责把它同步到最终存储位置"""
+
+    name = "base"
+    # 是否需要上传（本地后端不需要）
+    remote = False
+
+    @abstractmethod
+    def upload(self, storage_key: str, local_path: Path, content_type: str) -> bool:
+        """
+        上传文件（同步函数，在线程中执行）
+
+        Returns:
+            是否实际发生上传（对象已存在时返回False）
+        """
+
+    @abstractmethod
+    def object_url(self, storage_key: str) -> str:
+        """对象的直接访问地址（本地副本不存在时重定向到此地址）"""
+
+    def check(self) -> None:
+        """连接检查，失败时抛出异常"""
+
+
+class LocalStorageBackend(StorageBackend):
+    """本地文件系统后端：资源由API进程直接提供"""
+
+    name = "local"
+    remote = False
+
+    def upload(self, storage_key: str, local_path: Path, content_type: str) -> bool:
+        return False
+
+    def object_url(self, storage_key: str) -> str:
+        return build_asset_url(storage_key)
+
+    def check(self) -> None:
+        if not os.access(asset_store.root, os.W_OK):
+            raise RuntimeError(f"存储目录不可写: {asset_store.root}")
+
+
+class GCSStorageBackend(StorageBackend):
+    """
+    Google Cloud Storage 后端
+
+    设置 STORAGE_EMULATOR_HOST 时连接本地模拟器（如 fake-gcs-server），使用匿名凭据。
+    超过 STORAGE_MULTIPART_THRESHOLD_BYTES 的文件使用 XML 分片上传并行发送各分片。
+    对象名即 storage_key（内容哈希），同名对象内容必然相同，因此已存在时直接跳过。
+    """
+
+    name = "gcs"
+    remote = True
+
+    def __init__(self):
+        from google.cloud import storage
+
+        gcs_config = config.get_gcs_config()
+        if config.STORAGE_EMULATOR_HOST:
+            from google.auth.credentials import AnonymousCredentials
+            client = storage.Client(
+                project=gcs_config["project_id"], credentials=AnonymousCredentials()
+            )
+        elif gcs_config["credentials_path"]:
+            client = storage.Client.from_service_account_json(
+                gcs_config["credentials_path"], project=gcs_config["project_id"]
+            )
+        else:
+            client = storage.Client(project=gcs_config["project_id"])
+        self.client = client
+        self.bucket = client.bucket(gcs_config["bucket_name"])
+
+    def upload(self, storage_key: str, local_path: Path, content_type: str) -> bool:
+        from google.api_core.exceptions import PreconditionFailed
+        from google.cloud.storage import transfer_manager
+
+        blob = self.bucket.blob(storage_key)
+        if blob.exists():
+            return False
+
+        blob.content_type = content_type
+        # 内容寻址：同一对象名的内容永不改变，可长期缓存
+        blob.cache_control = config.STORAGE_CACHE_CONTROL
+        if os.path.getsize(local_path) >= config.STORAGE_MULTIPART_THRESHOLD_BYTES:
+            transfer_manager.upload_chunks_concurrently(
+                str(local_path),
+                blob,
+                content_type=content_type,
+                chunk_size=config.STORAGE_MULTIPART_CHUNK_BYTES,
+                max_workers=config.STORAGE_UPLOAD_WORKERS,
+                worker_type=transfer_manager.THREAD
+            )
+            return True
+
+        try:
+            # if_generation_match=0：其他worker已上传同一对象时不覆盖
+            blob.upload_from_filename(str(local_path), content_type=content_type, if_generation_match=0)
+        except PreconditionFailed:
+            return False
+        return True
+
+    def object_url(self, storage_key: str) -> str:
+        if config.STORAGE_PUBLIC_BASE_URL:
+            base = config.STORAGE_PUBLIC_BASE_URL
+        elif config.STORAGE_EMULATOR_HOST:
+            base = f"{config.STORAGE_EMULATOR_HOST}/{self.bucket.name}"
+        else:
+            base = f"https://storage.googleapis.com/{self.bucket.name}"
+        return f"{base.rstrip('/')}/{storage_key}"
+
+    def check(self) -> None:
+        self.bucket.reload()
+
+
+def create_storage_backend(name: Optional[str] = None) -> StorageBackend:
+    """
+    按名称创建存储后端
+
+    Raises:
+        ValueError: 未知的后端名称
+    """
+    name = name or config.STORAGE_BACKEND
+    if name == "local":
+        return LocalStorageBackend()
+    if name == "gcs":
+        return GCSStorageBackend()
+    raise ValueError(f"未知的存储后端: {name}，可选: local, gcs")
+
+
+# 记录已上传完成的 storage_key 数量上限（超出后淘汰最早的记录，之后按本地副本提供）
+_UPLOADED_KEYS_MAX = 100000
+
+
+class AssetUploader:
+    """
+    后台上传器
+
+    变体记录写入后调度上传，不阻塞请求响应；同一 storage_key 同时只上传一次。
+    上传完成后 build_asset_url 返回对象地址，/static/assets 也重定向到对象存储，
+    资源流量不再经过API进程。STORAGE_DELETE_LOCAL_AFTER_UPLOAD 开启时
+    上传成功后还会删除本地副本。
+    """
+
+    def __init__(self, backend: StorageBackend, delete_local: Optional[bool] = None):
+        self.backend = backend
+        self.delete_local = (
+            config.STORAGE_DELETE_LOCAL_AFTER_UPLOAD if delete_local is None else delete_local
+        )
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._uploaded_keys: "OrderedDict[str, None]" = OrderedDict()
+        self.uploaded = 0
+        self.skipped = 0
+        self.failures = 0
+
+    def schedule(self, blob: Optional[Dict[str, Any]]) -> Optional[asyncio.Task]:
+        """
+        调度后台上传（需在事件循环中调用）
+
+        Args:
+            blob: asset_store.ingest 的返回值
+        """
+        if not blob or not self.backend.remote:
+            return None
+        storage_key = blob["storage_key"]
+        if self.is_uploaded(storage_key):
+            return None
+        task = self._pending.get(storage_key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(
+                self._upload(storage_key, blob["content_type"])
+            )
+            self._pending[storage_key] = task
+            task.add_done_callback(lambda _: self._pending.pop(storage_key, None))
+        return task
+
+    def is_uploaded(self, storage_key: str) -> bool:
+        """资源是否已在对象存储中（本进程内上传完成或确认已存在）"""
+        return (
+            self.backend.remote
+            and storage_key in self._uploaded_keys
+            and storage_key not in self._pending
+        )
+
+    def _mark_uploaded(self, storage_key: str) -> None:
+        """记录上传完成的资源"""
+        self._uploaded_keys[storage_key] = None
+        self._uploaded_keys.move_to_end(storage_key)
+        while len(self._uploaded_keys) > _UPLOADED_KEYS_MAX:
+            self._uploaded_keys.popitem(last=False)
+
+    async def _upload(self, storage_key: str, content_type: str) -> None:
+        """上传单个文件"""
+        path = asset_store.path_for(storage_key)
+        try:
+            uploaded = await asyncio.to_thread(self.backend.upload, storage_key, path, content_type)
+        except Exception as e:
+            self.failures += 1
+            print(f"资源上传失败: {storage_key}, {e}")
+            return
+        if uploaded:
+            self.uploaded += 1
+        else:
+            self.skipped += 1
+        self._mark_uploaded(storage_key)
+        if self.delete_local:
+            await asyncio.to_thread(asset_store.delete, storage_key)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """等待进行中的上传完成（应用关闭时调用）"""
+        pending: Set[asyncio.Task] = set(self._pending.values())
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """运行统计（供 /stats 接口使用）"""
+        return {
+            "backend": self.backend.name,
+            "pending": len(self._pending),
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "failures": self.failures
+        }
+
+
+# 全局实例（首次使用时创建，避免未使用GCS时导入客户端库）
+_storage_backend: Optional[StorageBackend] = None
+_asset_uploader: Optional[AssetUploader] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """获取全局存储后端"""
+    global _storage_backend
+    if _storage_backend is None:
+        _storage_backend = create_storage_backend()
+    return _storage_backend
+
+
+def get_asset_uploader() -> AssetUploader:
+    """获取全局后台上传器"""
+    global _asset_uploader
+    if _asset_uploader is None:
+        _asset_uploader = AssetUploader(get_storage_backend())
+    return _asset_uploader
+
+
+def register_asset(db: Session, blob: Optional[Dict[str, Any]]) -> None:
+    """变体写入后登记资源引用，并调度后台上传"""
+    if not blob:
+        return
+    add_blob_ref(db, blob)
+    get_asset_uploader().schedule(blob)
@@ -0,0 +1,46 @@
+"""
+变体池 - 无锁认领用户未看过的已有变体
+"""
+from typing import Iterable, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..data.async_dal import AsyncVariantDAL, AsyncUserSeenDAL
+from ..data.models import VariantBase
+
+
+# 各媒体类型对应的变体类型（meta_json.type）
+IMAGE_VARIANT_TYPES = ("wan_image", "wan_image_selfie")
+VIDEO_VARIANT_TYPES = ("wan_video",)
+
+
+async def claim_unseen_variant(
+    db: AsyncSession,
+    pk_id: str,
+    user_id: str,
+    variant_types: Iterable[str],
+    max_attempts: int = 3
+) -> Optional[VariantBase]:
+    """
+    认领一个用户未看过的变体（乐观并发，不加锁）
+
+    每次查询用户未看过的最新变体并用 UserSeenDAL.claim 认领；认领冲突说明
+    同一用户的并发请求已经拿走该变体，重新查询即可跳过它。
+
+    Args:
+        db: 异步数据库会话
+        pk_id: 提示词键ID
+        user_id: 用户ID
+        variant_types: 允许的变体类型
+        max_attempts: 最多尝试认领的次数
+
+    Returns:
+        认领到的变体，没有可用变体时返回None
+    """
+    variant_types = list(variant_types)
+    for _ in range(max_attempts):
+        variant = await AsyncVariantDAL.get_newest_unseen(db, pk_id, user_id, variant_types)
+        if variant is None:
+            return None
+        if await AsyncUserSeenDAL.claim(db, user_id, variant.variant_id):
+            return variant
+    return None
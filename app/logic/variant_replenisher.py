@@ -0,0 +1,220 @@
+"""
+变体池预生成 - 在生成后端空闲时为热门提示词键提前补充变体
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from ..config import config
+from ..core.ids import generate_ulid
+from ..core.lww import now_ms
+from ..core.scheduler import generation_scheduler, GenerationScheduler
+from ..data.dal import VariantDAL, WorkLockDAL, session_scope
+
+
+# 预生成只针对风格图像：自拍每次选择新地标，其提示词键不会被复用
+REPLENISH_VARIANT_TYPES = ("wan_image",)
+
+
+class VariantReplenisher:
+    """
+    变体池预生成器
+
+    定期根据 variant / user_seen 统计热门提示词键（近期被领取次数）与其新鲜变体数
+    （大多数活跃用户尚未看过的变体）。新鲜变体低于水位线时，在图像后端负载较低的
+    时段提前生成一批变体，使热门提示词的请求直接命中缓存。
+
+    预生成受每小时批次预算、两次生成的最小间隔与单键冷却时间限制；
+    多worker部署时通过 work_lock 保证同一提示词键只由一个worker补充。
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+        interval_seconds: Optional[float] = None,
+        max_batches_per_hour: Optional[int] = None,
+        min_interval_seconds: Optional[float] = None,
+        key_cooldown_seconds: Optional[float] = None,
+        max_load: Optional[float] = None
+    ):
+        """
+        Args:
+            generate: 为指定pk_id生成一批变体的协程函数
+        """
+        self.generate = generate
+        self.interval_seconds = (
+            config.REPLENISH_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+        )
+        self.max_batches_per_hour = (
+            config.REPLENISH_MAX_BATCHES_PER_HOUR if max_batches_per_hour is None else max_batches_per_hour
+        )
+        self.min_interval_seconds = (
+            config.REPLENISH_MIN_INTERVAL_SECONDS if min_interval_seconds is None else min_interval_seconds
+        )
+        self.key_cooldown_seconds = (
+            config.REPLENISH_KEY_COOLDOWN_SECONDS if key_cooldown_seconds is None else key_cooldown_seconds
+        )
+        self.max_load = config.REPLENISH_MAX_LOAD if max_load is None else max_load
+        self.owner_id = generate_ulid()
+
+        self._batch_times: Deque[float] = deque()
+        self._last_batch_at = 0.0
+        self._cooldowns: Dict[str, float] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+        self.scans = 0
+        self.batches = 0
+        self.failures = 0
+        self.skipped_busy = 0
+        self.skipped_budget = 0
+
+    def start(self) -> None:
+        """启动预生成循环（REPLENISH_ENABLED 为 False 时不启动）"""
+        if not config.REPLENISH_ENABLED:
+            return
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止预生成循环"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"变体池预生成扫描失败: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def _is_low_load(self) -> bool:
+        """图像后端无人排队且槽位占用低于阈值"""
+        backend = GenerationScheduler.BACKEND_WAN_IMAGE
+        return (
+            generation_scheduler.is_idle(backend)
+            and generation_scheduler.utilization(backend) < self.max_load
+        )
+
+    def _has_budget(self, now: float) -> bool:
+        """检查每小时预算与最小间隔"""
+        while self._batch_times and now - self._batch_times[0] >= 3600:
+            self._batch_times.popleft()
+        if len(self._batch_times) >= self.max_batches_per_hour:
+            return False
+        return now - self._last_batch_at >= self.min_interval_seconds
+
+    def _find_candidates(self) -> List[Dict[str, Any]]:
+        """查询新鲜变体低于水位线的热门提示词键"""
+        since_ts = now_ms() - int(config.REPLENISH_WINDOW_HOURS * 3600 * 1000)
+        with session_scope() as db:
+            pools = VariantDAL.list_hot_pools(
+                db,
+                since_ts,
+                list(REPLENISH_VARIANT_TYPES),
+                config.REPLENISH_MIN_REQUESTS,
+                config.REPLENISH_SEEN_RATIO,
+                config.REPLENISH_SCAN_LIMIT
+            )
+        return [pool for pool in pools if pool["fresh_variants"] < config.REPLENISH_LOW_WATERMARK]
+
+    def _try_lock(self, pk_id: str) -> bool:
+        """跨worker占用该提示词键的补充权（冷却时间内有效）"""
+        with session_scope() as db:
+            return WorkLockDAL.acquire_lock(
+                db, f"replenish|{pk_id}", self.owner_id, int(self.key_cooldown_seconds)
+            )
+
+    async def run_once(self) -> int:
+        """
+        执行一轮扫描与补充
+
+        Returns:
+            本轮生成的批次数
+        """
+        self.scans += 1
+        if not self._is_low_load():
+            self.skipped_busy += 1
+            return 0
+
+        candidates = await asyncio.to_thread(self._find_candidates)
+        generated = 0
+        for pool in candidates:
+            pk_id = pool["pk_id"]
+            now = time.monotonic()
+            if self._cooldowns.get(pk_id, 0) > now:
+                continue
+            if not self._has_budget(now):
+                self.skipped_budget += 1
+                break
+            # 每批之前重新检查负载，用户请求到来时立即让出
+            if not self._is_low_load():
+                self.skipped_busy += 1
+                break
+            if not await asyncio.to_thread(self._try_lock, pk_id):
+                self._cooldowns[pk_id] = now + self.key_cooldown_seconds
+                continue
+
+            self._cooldowns[pk_id] = now + self.key_cooldown_seconds
+            self._batch_times.append(now)
+            self._last_batch_at = now
+            print(
+                f"预生成变体: pk_id={pk_id}, 热度={pool['requests']}, "
+                f"新鲜变体={pool['fresh_variants']}"
+            )
+            try:
+                await self.generate(pk_id)
+                self.batches += 1
+                generated += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"预生成变体失败: pk_id={pk_id}, {e}")
+
+        # 清理过期冷却记录
+        now = time.monotonic()
+        for pk_id in [key for key, until in self._cooldowns.items() if until <= now]:
+            del self._cooldowns[pk_id]
+        return generated
+
+    def stats(self) -> Dict[str, Any]:
+        """运行统计（供 /stats 接口使用）"""
+        return {
+            "enabled": config.REPLENISH_ENABLED,
+            "running": self._loop_task is not None and not self._loop_task.done(),
+            "scans": self.scans,
+            "batches": self.batches,
+            "failures": self.failures,
+            "skipped_busy": self.skipped_busy,
+            "skipped_budget": self.skipped_budget,
+            "batches_last_hour": len(self._batch_times),
+            "cooling_keys": len(self._cooldowns)
+        }
+
+
+# 全局实例（应用启动时绑定图像生成服务）
+_variant_replenisher: Optional[VariantReplenisher] = None
+
+
+def init_variant_replenisher(
+    generate: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+) -> VariantReplenisher:
+    """创建全局预生成器实例"""
+    global _variant_replenisher
+    _variant_replenisher = VariantReplenisher(generate)
+    return _variant_replenisher
+
+
+def get_variant_replenisher() -> Optional[VariantReplenisher]:
+    """获取全局预生成器实例（未初始化时返回None）"""
+    return _variant_replenisher
@@ -0,0 +1,222 @@
+"""
+Wan (阿里云 DashScope) 异步HTTP客户端 - 任务提交、查询与结果下载
+"""
+import asyncio
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+import httpx
+
+from ..config import config
+from .asset_downloader import download_asset
+
+
+class WanAPIError(RuntimeError):
+    """DashScope API返回错误"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, code: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+    @property
+    def retryable(self) -> bool:
+        """是否可重试（限流或服务端错误）"""
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+class WanAsyncClient:
+    """DashScope任务API异步客户端（连接池复用keep-alive连接）"""
+
+    IMAGE_SYNTHESIS_PATH = "/services/aigc/text2image/image-synthesis"
+    VIDEO_SYNTHESIS_PATH = "/services/aigc/video-generation/video-synthesis"
+    TASKS_PATH = "/tasks"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        max_connections: Optional[int] = None
+    ):
+        self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+        if not self.api_key:
+            raise ValueError("DASHSCOPE_API_KEY 环境变量未设置")
+        self.base_url = (base_url or config.WAN_API_BASE_URL).rstrip("/")
+        self.timeout_seconds = timeout_seconds or config.WAN_HTTP_TIMEOUT_SECONDS
+        self.max_connections = max_connections or config.WAN_HTTP_MAX_CONNECTIONS
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环上的共享连接池"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout_seconds),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                follow_redirects=True
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _auth_headers(self, async_task: bool = False) -> Dict[str, str]:
+        """DashScope鉴权头（仅用于API请求，不用于下载结果文件）"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        if async_task:
+            headers["X-DashScope-Async"] = "enable"
+        return headers
+
+    @staticmethod
+    def _raise_for_error(response: httpx.Response, action: str) -> Dict[str, Any]:
+        """解析响应，非200时抛出WanAPIError"""
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code != 200:
+            raise WanAPIError(
+                f"{action}失败: status_code={response.status_code}, "
+                f"code={body.get('code')}, message={body.get('message')}",
+                status_code=response.status_code,
+                code=body.get("code")
+            )
+        return body
+
+    async def _submit(self, path: str, payload: Dict[str, Any]) -> str:
+        """提交异步任务，返回task_id"""
+        response = await self._get_client().post(
+            f"{self.base_url}{path}",
+            json=payload,
+            headers=self._auth_headers(async_task=True)
+        )
+        body = self._raise_for_error(response, "Wan API调用")
+        task_id = (body.get("output") or {}).get("task_id")
+        if not task_id:
+            raise WanAPIError(f"Wan API未返回task_id: {body}", status_code=response.status_code)
+        return task_id
+
+    async def submit_image_task(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        model: Optional[str] = None,
+        size: Optional[str] = None,
+        n: int = 1,
+        seed: Optional[int] = None,
+        prompt_extend: Optional[bool] = None,
+        watermark: Optional[bool] = None
+    ) -> str:
+        """
+        提交文本到图像任务
+
+        Returns:
+            DashScope任务ID
+        """
+        parameters = {
+            "size": size or config.WAN_IMAGE_SIZE,
+            "n": n,
+            "prompt_extend": config.WAN_PROMPT_EXTEND if prompt_extend is None else prompt_extend,
+            "watermark": config.WAN_WATERMARK if watermark is None else watermark
+        }
+        if seed is not None:
+            parameters["seed"] = seed
+        payload = {
+            "model": model or config.WAN_IMAGE_MODEL,
+            "input": {"prompt": prompt, "negative_prompt": negative_prompt or ""},
+            "parameters": parameters
+        }
+        return await self._submit(self.IMAGE_SYNTHESIS_PATH, payload)
+
+    async def submit_video_task(
+        self,
+        prompt: str,
+        negative_prompt: str = "",
+        model: Optional[str] = None,
+        size: Optional[str] = None,
+        duration: Optional[int] = None,
+        seed: Optional[int] = None,
+        prompt_extend: Optional[bool] = None,
+        watermark: Optional[bool] = None
+    ) -> str:
+        """
+        提交文本到视频任务
+
+        Returns:
+            DashScope任务ID
+        """
+        parameters = {
+            "size": size or config.WAN_SIZE,
+            "duration": duration or config.WAN_DURATION,
+            "prompt_extend": config.WAN_PROMPT_EXTEND if prompt_extend is None else prompt_extend,
+            "watermark": config.WAN_WATERMARK if watermark is None else watermark
+        }
+        if seed is not None:
+            parameters["seed"] = seed
+        payload = {
+            "model": model or config.WAN_MODEL,
+            "input": {"prompt": prompt, "negative_prompt": negative_prompt or ""},
+            "parameters": parameters
+        }
+        return await self._submit(self.VIDEO_SYNTHESIS_PATH, payload)
+
+    async def fetch_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        查询任务状态
+
+        Args:
+            task_id: DashScope任务ID
+
+        Returns:
+            响应中的output字段（包含task_status、results/video_url等）
+        """
+        response = await self._get_client().get(
+            f"{self.base_url}{self.TASKS_PATH}/{task_id}",
+            headers=self._auth_headers()
+        )
+        body = self._raise_for_error(response, "查询任务状态")
+        return body.get("output") or {}
+
+    async def download(self, url: str, dest_path: Path) -> Dict[str, Any]:
+        """
+        下载结果文件（临时文件 + 断点续传 + SHA-256，完成后原子替换）
+
+        Args:
+            url: 结果文件URL（OSS签名地址，不携带鉴权头）
+            dest_path: 本地保存路径
+
+        Returns:
+            {"path", "bytes", "sha256", "attempts"}
+        """
+        return await download_asset(self._get_client(), url, dest_path)
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+
+# 全局客户端实例
+_wan_client: Optional[WanAsyncClient] = None
+
+
+def get_wan_client() -> WanAsyncClient:
+    """获取Wan异步客户端实例（单例）"""
+    global _wan_client
+    if _wan_client is None:
+        _wan_client = WanAsyncClient()
+    return _wan_client
+
+
+async def close_wan_client() -> None:
+    """关闭全局客户端的连接池（应用关闭时调用）"""
+    if _wan_client is not None:
+        await _wan_client.aclose()
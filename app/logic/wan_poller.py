@@ -0,0 +1,255 @@
+"""
+Wan任务集中轮询器 - 统一跟踪所有进行中的DashScope任务并通过future返回结果
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from ..config import config
+from .wan_client import get_wan_client, WanAPIError, WanAsyncClient
+
+
+class _TrackedTask:
+    """单个被跟踪的DashScope任务"""
+
+    def __init__(self, task_id: str, kind: str, future: asyncio.Future, timeout: float):
+        self.task_id = task_id
+        self.kind = kind
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + timeout
+        self.next_poll_at = self.submitted_at
+        self.retry_count = 0
+        self.polls = 0
+        self.waiters = 0
+
+
+class WanTaskPoller:
+    """
+    集中式任务轮询器
+
+    所有生成请求共享一个后台轮询循环。轮询间隔根据每类任务（图像/视频）
+    观测到的平均完成时间自适应调整：离预期完成时间越近，轮询越密集。
+    """
+
+    KIND_IMAGE = "image"
+    KIND_VIDEO = "video"
+
+    def __init__(
+        self,
+        client_factory: Callable[[], WanAsyncClient] = get_wan_client,
+        max_concurrent_fetches: Optional[int] = None,
+        max_retries: int = 5,
+        retry_backoff_seconds: float = 10
+    ):
+        self.client_factory = client_factory
+        self.max_concurrent_fetches = max_concurrent_fetches or config.WAN_POLL_MAX_CONCURRENCY
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        # 各类任务的轮询参数（预期耗时会根据观测结果更新）
+        self.profiles: Dict[str, Dict[str, float]] = {
+            self.KIND_IMAGE: {
+                "expected_seconds": config.WAN_IMAGE_EXPECTED_SECONDS,
+                "min_interval": config.WAN_IMAGE_POLL_MIN_INTERVAL,
+                "max_interval": config.WAN_IMAGE_POLL_MAX_INTERVAL
+            },
+            self.KIND_VIDEO: {
+                "expected_seconds": config.WAN_VIDEO_EXPECTED_SECONDS,
+                "min_interval": config.WAN_VIDEO_POLL_MIN_INTERVAL,
+                "max_interval": config.WAN_VIDEO_POLL_MAX_INTERVAL
+            }
+        }
+        self._tracked: Dict[str, _TrackedTask] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.total_polls = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_running(self) -> None:
+        """确保后台轮询循环在当前事件循环中运行"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环变化时重建循环相关的同步原语
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_fetches)
+            self._runner = None
+        if self._runner is None or self._runner.done():
+            self._runner = loop.create_task(self._run())
+        self._wakeup.set()
+
+    def _next_interval(self, tracked: _TrackedTask) -> float:
+        """
+        计算下一次轮询间隔
+
+        预期完成前按剩余时间的一半逼近；超过预期后按已等待时间的10%退避，
+        均限制在该类任务的 [min_interval, max_interval] 之间。
+        """
+        profile = self.profiles[tracked.kind]
+        elapsed = time.monotonic() - tracked.submitted_at
+        remaining = profile["expected_seconds"] - elapsed
+        interval = remaining * 0.5 if remaining > 0 else elapsed * 0.1
+        return min(max(interval, profile["min_interval"]), profile["max_interval"])
+
+    def _observe_completion(self, tracked: _TrackedTask) -> None:
+        """用指数移动平均更新该类任务的预期完成时间"""
+        profile = self.profiles[tracked.kind]
+        observed = time.monotonic() - tracked.submitted_at
+        profile["expected_seconds"] = 0.8 * profile["expected_seconds"] + 0.2 * observed
+
+    async def wait(self, task_id: str, kind: str, timeout: float) -> Dict[str, Any]:
+        """
+        等待任务完成
+
+        Args:
+            task_id: DashScope任务ID
+            kind: 任务类型（KIND_IMAGE / KIND_VIDEO）
+            timeout: 最大等待时间（秒）
+
+        Returns:
+            任务成功时的output字段
+
+        Raises:
+            RuntimeError: 任务失败、超时或多次查询失败
+        """
+        if kind not in self.profiles:
+            raise ValueError(f"未知的任务类型: {kind}")
+
+        loop = asyncio.get_running_loop()
+        tracked = self._tracked.get(task_id)
+        if tracked is None or tracked.future.get_loop() is not loop:
+            tracked = _TrackedTask(task_id, kind, loop.create_future(), timeout)
+            tracked.next_poll_at = tracked.submitted_at + self._next_interval(tracked)
+            self._tracked[task_id] = tracked
+        self._ensure_running()
+
+        tracked.waiters += 1
+        try:
+            # shield：同一任务可能有多个等待者，单个等待者取消不影响其他人
+            return await asyncio.shield(tracked.future)
+        finally:
+            tracked.waiters -= 1
+            if tracked.waiters == 0 and not tracked.future.done():
+                # 所有等待者都已取消，停止跟踪该任务
+                self._tracked.pop(task_id, None)
+                tracked.future.cancel()
+
+    async def _run(self) -> None:
+        """后台轮询循环：每轮并发查询所有到期任务，然后休眠到下一个到期时间"""
+        while self._tracked:
+            now = time.monotonic()
+            due = [t for t in list(self._tracked.values()) if t.next_poll_at <= now]
+            if due:
+                await asyncio.gather(*(self._poll_one(t) for t in due))
+
+            if not self._tracked:
+                break
+
+            next_at = min(t.next_poll_at for t in self._tracked.values())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, next_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _finish(self, tracked: _TrackedTask, result: Optional[Dict[str, Any]] = None,
+                error: Optional[Exception] = None) -> None:
+        """结束跟踪并回填future"""
+        self._tracked.pop(tracked.task_id, None)
+        if tracked.future.done():
+            return
+        if error is not None:
+            self.failed += 1
+            tracked.future.set_exception(error)
+        else:
+            self.completed += 1
+            tracked.future.set_result(result)
+
+    async def _poll_one(self, tracked: _TrackedTask) -> None:
+        """查询单个任务并根据状态安排下一次查询"""
+        if tracked.future.done():
+            self._tracked.pop(tracked.task_id, None)
+            return
+
+        elapsed = time.monotonic() - tracked.submitted_at
+        if time.monotonic() > tracked.deadline:
+            self._finish(tracked, error=RuntimeError(
+                f"任务超时（已等待 {elapsed:.0f} 秒），任务ID: {tracked.task_id}"
+            ))
+            return
+
+        try:
+            async with self._semaphore:
+                self.total_polls += 1
+                tracked.polls += 1
+                output = await self.client_factory().fetch_task(tracked.task_id)
+        except (httpx.TransportError, WanAPIError) as e:
+            if isinstance(e, WanAPIError) and not e.retryable:
+                self._finish(tracked, error=e)
+                return
+            if tracked.retry_count >= self.max_retries:
+                self._finish(tracked, error=RuntimeError(
+                    f"查询任务状态失败，已重试 {self.max_retries} 次: {type(e).__name__}: {str(e)}"
+                ))
+                return
+            tracked.retry_count += 1
+            # 递增等待时间，最多3倍退避基数
+            wait_time = min(self.retry_backoff_seconds * tracked.retry_count, self.retry_backoff_seconds * 3)
+            print(f"查询任务 {tracked.task_id} 状态出错: {type(e).__name__}: {str(e)}，{wait_time}秒后重试 "
+                  f"{tracked.retry_count}/{self.max_retries}")
+            tracked.next_poll_at = time.monotonic() + wait_time
+            return
+        except Exception as e:
+            self._finish(tracked, error=e)
+            return
+
+        task_status = output.get("task_status")
+        if task_status == "SUCCEEDED":
+            print(f"任务 {tracked.task_id} 完成 (已等待 {elapsed:.1f} 秒，查询 {tracked.polls} 次)")
+            self._observe_completion(tracked)
+            self._finish(tracked, result=output)
+        elif task_status == "FAILED":
+            error_msg = output.get("message") or "未知错误"
+            self._finish(tracked, error=RuntimeError(f"生成失败: {error_msg}"))
+        elif task_status in ["PENDING", "RUNNING"]:
+            tracked.retry_count = 0
+            tracked.next_poll_at = time.monotonic() + self._next_interval(tracked)
+        else:
+            print(f"警告: 任务 {tracked.task_id} 未知状态 '{task_status}'")
+            tracked.retry_count += 1
+            if tracked.retry_count >= self.max_retries:
+                self._finish(tracked, error=RuntimeError(
+                    f"任务状态异常: {task_status}，已重试 {self.max_retries} 次"
+                ))
+                return
+            tracked.next_poll_at = time.monotonic() + 5
+
+    def stats(self) -> Dict[str, Any]:
+        """轮询统计"""
+        return {
+            "tracked": len(self._tracked),
+            "total_polls": self.total_polls,
+            "completed": self.completed,
+            "failed": self.failed,
+            "expected_seconds": {
+                kind: round(profile["expected_seconds"], 1)
+                for kind, profile in self.profiles.items()
+            }
+        }
+
+
+# 全局轮询器实例
+_wan_poller: Optional[WanTaskPoller] = None
+
+
+def get_wan_poller() -> WanTaskPoller:
+    """获取Wan任务轮询器实例（单例）"""
+    global _wan_poller
+    if _wan_poller is None:
+        _wan_poller = WanTaskPoller()
+    return _wan_poller
@@ -9,6 +9,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.insert(0, project_root)
 
 from app.logic.service_image import ImageGenerationService
+from app.data.async_dal import AsyncSessionLocal
 from app.logic.ai_model_service import get_ai_service
 from app.data.dal import get_db, SoulDAL, SoulStyleProfileDAL
 from app.data.models import SoulBase, SoulStyleProfileBase
@@ -88,14 +89,15 @@ async def test_integrated_image_generation():
     # 确保有测试数据
     await setup_test_data(db)
     
-    # 创建服务实例
+    # 创建服务实例（服务使用异步数据库会话）
     service = ImageGenerationService()
+    async_db = AsyncSessionLocal()
     
     try:
         # 测试1: 灵魂风格图像生成
         print("\n1. 测试灵魂风格图像生成")
         result1 = await service.get_or_create_variant(
-            db, "nova", "a cute penguin in garden", "user1"
+            async_db, "nova", "a cute penguin in garden", "user1"
         )
         print(f"结果1: {result1}")
         print(f"URL: {result1['url']}")
@@ -103,7 +105,7 @@ async def test_integrated_image_generation():
         # 测试2: 自拍功能
         print("\n2. 测试自拍功能")
         selfie_result = await service.create_selfie(
-            db, "nova", "paris", "happy", "user1"
+            async_db, "nova", "paris", "happy", "user1"
         )
         print(f"自拍结果: {selfie_result}")
         print(f"自拍URL: {selfie_result['url']}")
@@ -114,6 +116,8 @@ async def test_integrated_image_generation():
         print(f"ERROR 集成图像生成功能测试失败: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await async_db.close()
 
 
 async def test_model_config():
@@ -0,0 +1,106 @@
+"""
+结果文件下载测试（断点续传、哈希、原子替换）
+"""
+import asyncio
+import hashlib
+import sys
+import os
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic.asset_downloader import download_asset
+
+
+PAYLOAD = bytes(range(256)) * 400
+
+
+class FlakyFileHandler(BaseHTTPRequestHandler):
+    """第一次请求只发送一半内容后断开连接，之后支持Range续传"""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.requests.append(range_header)
+        if self.path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            body = PAYLOAD[start:]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            body = PAYLOAD
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if len(self.requests) == 1:
+            # 模拟连接中断
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def test_resume_after_dropped_connection():
+    """测试连接中断后续传，哈希与内容一致"""
+    print("测试断点续传...")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyFileHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    async def run(dest, url):
+        async with httpx.AsyncClient() as client:
+            return await download_asset(
+                client, url, dest, chunk_size=4096, max_retries=2, retry_backoff_seconds=0
+            )
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp) / "video.mp4"
+            result = asyncio.run(run(dest, f"{base}/video.mp4"))
+            assert dest.read_bytes() == PAYLOAD
+            assert result["bytes"] == len(PAYLOAD)
+            assert result["sha256"] == hashlib.sha256(PAYLOAD).hexdigest()
+            assert result["attempts"] == 2
+            assert FlakyFileHandler.requests[0] is None
+            resumed_from = int(FlakyFileHandler.requests[1].split("=")[1].rstrip("-"))
+            assert 0 < resumed_from <= len(PAYLOAD) // 2
+            assert not (Path(tmp) / "video.mp4.part").exists()
+
+            # 4xx 不重试，也不留下临时文件或目标文件
+            missing = Path(tmp) / "missing.mp4"
+            try:
+                asyncio.run(run(missing, f"{base}/missing"))
+                assert False, "404应直接失败"
+            except httpx.HTTPStatusError:
+                pass
+            assert not missing.exists()
+            assert not (Path(tmp) / "missing.mp4.part").exists()
+        print("OK 断点续传成功")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_resume_after_dropped_connection()
+    print("所有下载测试完成！")
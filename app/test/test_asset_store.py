@@ -0,0 +1,67 @@
+"""
+内容寻址资源存储测试（分片路径、去重、键校验）
+"""
+import hashlib
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic.asset_store import AssetStore
+
+
+def test_ingest_and_dedupe():
+    """测试相同内容只保存一份，源文件被移走"""
+    print("测试内容寻址存储...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AssetStore(str(Path(tmp) / "store"))
+        payload = b"\x89PNG" + bytes(range(256)) * 10
+        sha256 = hashlib.sha256(payload).hexdigest()
+
+        first = Path(tmp) / "a.png"
+        first.write_bytes(payload)
+        blob = store.ingest(first)
+        assert blob["storage_key"] == f"{sha256[:2]}/{sha256[2:4]}/{sha256}.png"
+        assert blob["content_type"] == "image/png"
+        assert blob["size_bytes"] == len(payload)
+        assert not blob["deduplicated"]
+        assert not first.exists()
+        assert store.path_for(blob["storage_key"]).read_bytes() == payload
+
+        # 重复下载的相同内容（已知哈希）不再占用空间
+        second = Path(tmp) / "b.png"
+        second.write_bytes(payload)
+        duplicate = store.ingest(second, sha256)
+        assert duplicate["storage_key"] == blob["storage_key"]
+        assert duplicate["deduplicated"]
+        assert not second.exists()
+
+        files = [path for path in (Path(tmp) / "store").rglob("*") if path.is_file()]
+        assert len(files) == 1
+        assert store.relative_url(blob["storage_key"]) == f"/static/assets/{blob['storage_key']}"
+    print("OK 去重成功")
+
+
+def test_key_validation():
+    """测试非法storage_key被拒绝（防止路径穿越）"""
+    print("测试storage_key校验...")
+
+    store = AssetStore(tempfile.gettempdir())
+    for key in ("../etc/passwd", "ab/cd/../../x.png", "soul/1/key/2/variant/3.png", "ab/cd/xyz.png"):
+        assert not store.exists(key)
+        try:
+            store.path_for(key)
+            assert False, f"应拒绝: {key}"
+        except ValueError:
+            pass
+    print("OK 校验成功")
+
+
+if __name__ == "__main__":
+    test_ingest_and_dedupe()
+    test_key_validation()
+    print("所有资源存储测试完成！")
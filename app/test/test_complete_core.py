@@ -9,6 +9,7 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.insert(0, project_root)
 
 from app.logic.service_image import ImageGenerationService
+from app.data.async_dal import AsyncSessionLocal
 from app.logic.prompt_cache import PromptCache, PromptBuilder
 from app.logic.place_chooser import PlaceChooser
 from app.data.dal import get_db, SoulDAL, SoulStyleProfileDAL
@@ -187,21 +188,22 @@ async def test_image_generation():
     # 确保有测试数据
     await setup_test_data(db)
     
-    # 创建服务实例
+    # 创建服务实例（服务使用异步数据库会话）
     service = ImageGenerationService()
+    async_db = AsyncSessionLocal()
     
     try:
         # 测试1: 灵魂风格图像生成
         print("\n1. 测试灵魂风格图像生成")
         result1 = await service.get_or_create_variant(
-            db, "nova", "penguin in garden", "user1"
+            async_db, "nova", "penguin in garden", "user1"
         )
         print(f"结果1: {result1}")
         
         # 测试2: 相同用户再次请求（应该获得不同变体）
         print("\n2. 测试相同用户再次请求")
         result2 = await service.get_or_create_variant(
-            db, "nova", "penguin in garden", "user1"
+            async_db, "nova", "penguin in garden", "user1"
         )
         print(f"结果2: {result2}")
         print(f"变体是否不同: {result1['variant_id'] != result2['variant_id']}")
@@ -209,28 +211,28 @@ async def test_image_generation():
         # 测试3: 不同用户请求相同内容（可能获得缓存）
         print("\n3. 测试不同用户请求相同内容")
         result3 = await service.get_or_create_variant(
-            db, "nova", "penguin in garden", "user2"
+            async_db, "nova", "penguin in garden", "user2"
         )
         print(f"结果3: {result3}")
         
         # 测试4: Valentina风格生成
         print("\n4. 测试Valentina风格生成")
         valentina_result = await service.get_or_create_variant(
-            db, "valentina", "penguin in garden", "user1"
+            async_db, "valentina", "penguin in garden", "user1"
         )
         print(f"Valentina结果: {valentina_result}")
         
         # 测试5: 自拍功能
         print("\n5. 测试自拍功能")
         selfie_result = await service.create_selfie(
-            db, "nova", "paris", "happy", "user1"
+            async_db, "nova", "paris", "happy", "user1"
         )
         print(f"自拍结果: {selfie_result}")
         
         # 测试6: 相同用户再次自拍（应该选择不同地标）
         print("\n6. 测试相同用户再次自拍")
         selfie_result2 = await service.create_selfie(
-            db, "nova", "paris", "happy", "user1"
+            async_db, "nova", "paris", "happy", "user1"
         )
         print(f"自拍结果2: {selfie_result2}")
         print(f"地标是否不同: {selfie_result['landmark_key'] != selfie_result2['landmark_key']}")
@@ -238,7 +240,7 @@ async def test_image_generation():
         # 测试7: 不同城市自拍
         print("\n7. 测试不同城市自拍")
         tokyo_selfie = await service.create_selfie(
-            db, "nova", "tokyo", "excited", "user1"
+            async_db, "nova", "tokyo", "excited", "user1"
         )
         print(f"东京自拍结果: {tokyo_selfie}")
         
@@ -248,6 +250,8 @@ async def test_image_generation():
         print(f"ERROR 图像生成功能测试失败: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await async_db.close()
 
 
 async def test_database_operations():
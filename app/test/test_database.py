@@ -145,6 +145,40 @@ def test_variant_operations():
     print("OK 变体获取成功")
 
 
+def test_variant_catalog_pagination():
+    """测试变体目录按ULID游标分页与过滤"""
+    print("测试变体目录分页...")
+    
+    db = next(get_db())
+    
+    soul_id = f"test_catalog_{generate_ulid()}"
+    pk_id = generate_pk_id(soul_id, "catalog")
+    variant_ids = []
+    for index in range(5):
+        variant_id = generate_ulid()
+        variant_ids.append(variant_id)
+        VariantDAL.create(db, VariantBase(
+            variant_id=variant_id,
+            pk_id=pk_id,
+            soul_id=soul_id,
+            asset_url=f"https://example.com/{variant_id}.png",
+            storage_key=f"catalog/{variant_id}.png",
+            seed=index,
+            phash=None,
+            meta_json={"type": "wan_video" if index == 0 else "wan_image"},
+            updated_at_ts=now_ms()
+        ))
+    expected = sorted(variant_ids[1:], reverse=True)
+    
+    first_page = VariantDAL.list_catalog(db, 2, soul_id=soul_id, variant_types=["wan_image"])
+    assert [v.variant_id for v in first_page] == expected[:2]
+    second_page = VariantDAL.list_catalog(
+        db, 2, before_variant_id=first_page[-1].variant_id, soul_id=soul_id, variant_types=["wan_image"]
+    )
+    assert [v.variant_id for v in second_page] == expected[2:]
+    print("OK 变体目录分页成功")
+
+
 def test_user_seen_operations():
     """测试用户已看操作"""
     print("测试用户已看操作...")
@@ -250,6 +284,9 @@ def run_all_tests():
         test_variant_operations()
         print()
         
+        test_variant_catalog_pagination()
+        print()
+        
         test_user_seen_operations()
         print()
         
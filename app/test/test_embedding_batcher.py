@@ -0,0 +1,132 @@
+"""
+批量嵌入编码测试（并发合并、重复文本去重、异常传播、达到批大小立即提交）
+"""
+import asyncio
+import sys
+import os
+import threading
+
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic import embedding_batcher as batcher_module
+from app.logic.embedding_batcher import EmbeddingBatcher
+
+
+class StubEmbedder:
+    """记录每次批量编码的输入，向量第一维为文本长度"""
+
+    def __init__(self, error: Exception = None):
+        self.calls = []
+        self.error = error
+        self.lock = threading.Lock()
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        with self.lock:
+            self.calls.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return np.array([[len(text), 1.0, 0.0, 0.0] for text in texts], dtype=np.float32)
+
+
+def _with_stub(stub: StubEmbedder, coro_factory):
+    """替换模块内的 get_embedder 后运行协程"""
+    original = batcher_module.get_embedder
+    batcher_module.get_embedder = lambda: stub
+    try:
+        return asyncio.run(coro_factory())
+    finally:
+        batcher_module.get_embedder = original
+
+
+def test_concurrent_callers_share_one_encode():
+    """测试同一窗口内的并发请求合并为一次 encode()，且各自拿到对应向量"""
+    print("测试并发合并...")
+
+    stub = StubEmbedder()
+    batcher = EmbeddingBatcher(window_ms=20, max_batch_size=64)
+    texts = ["a", "bb", "ccc", "dddd"]
+
+    async def run():
+        results = await asyncio.gather(*(batcher.encode(text) for text in texts))
+        await asyncio.sleep(0)
+        # 批次结束后不再保留任务引用
+        assert not batcher._tasks
+        return results
+
+    results = _with_stub(stub, run)
+    assert len(stub.calls) == 1
+    assert stub.calls[0] == texts
+    for text, embedding in zip(texts, results):
+        assert embedding.dtype == np.float32
+        assert embedding[0] == len(text)
+    print("OK 并发合并成功")
+
+
+def test_duplicate_texts_encoded_once():
+    """测试同一批次中的重复文本只编码一次，所有调用方都拿到结果"""
+    print("测试重复文本去重...")
+
+    stub = StubEmbedder()
+    batcher = EmbeddingBatcher(window_ms=20, max_batch_size=64)
+    texts = ["cat", "dog", "cat", "cat", "dog"]
+
+    async def run():
+        return await asyncio.gather(*(batcher.encode(text) for text in texts))
+
+    results = _with_stub(stub, run)
+    assert stub.calls == [["cat", "dog"]]
+    assert [int(embedding[0]) for embedding in results] == [3, 3, 3, 3, 3]
+    print("OK 重复文本去重成功")
+
+
+def test_exception_reaches_every_waiter():
+    """测试批量编码失败时每个等待方都收到异常"""
+    print("测试异常传播...")
+
+    stub = StubEmbedder(error=RuntimeError("model unavailable"))
+    batcher = EmbeddingBatcher(window_ms=20, max_batch_size=64)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.encode(text) for text in ["x", "y", "x"]),
+            return_exceptions=True
+        )
+
+    results = _with_stub(stub, run)
+    assert len(stub.calls) == 1
+    assert len(results) == 3
+    for result in results:
+        assert isinstance(result, RuntimeError)
+        assert str(result) == "model unavailable"
+    print("OK 异常传播成功")
+
+
+def test_flush_at_max_batch_size():
+    """测试达到 max_batch_size 时立即提交，不等待窗口结束"""
+    print("测试批大小触发提交...")
+
+    stub = StubEmbedder()
+    # 窗口设为60秒，只有按批大小提交才能在超时前完成
+    batcher = EmbeddingBatcher(window_ms=60000, max_batch_size=3)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.encode(text) for text in ["p", "q", "r"])),
+            timeout=2
+        )
+
+    results = _with_stub(stub, run)
+    assert stub.calls == [["p", "q", "r"]]
+    assert len(results) == 3
+    print("OK 批大小触发提交成功")
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_encode()
+    test_duplicate_texts_encoded_once()
+    test_exception_reaches_every_waiter()
+    test_flush_at_max_batch_size()
+    print("所有批量嵌入编码测试完成！")
@@ -0,0 +1,97 @@
+"""
+嵌入向量缓存测试（进程内LRU，不启用数据库持久化）
+"""
+import asyncio
+import sys
+import os
+
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic import embedding_cache as cache_module
+from app.logic.embedding_cache import EmbeddingCache
+
+
+class StubBatcher:
+    """记录编码请求的批量编码器替身"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def encode(self, text):
+        self.calls.append(text)
+        return np.array([len(text), 1.0], dtype=np.float32)
+
+
+def _run_lookups(cache: EmbeddingCache, lookups):
+    """依次执行 (key_norm, key_hash) 查询，返回编码器替身与结果"""
+    stub = StubBatcher()
+    original = cache_module.embedding_batcher
+    cache_module.embedding_batcher = stub
+    try:
+        async def run():
+            return [await cache.get_or_encode(None, key_norm, key_hash) for key_norm, key_hash in lookups]
+        return stub, asyncio.run(run())
+    finally:
+        cache_module.embedding_batcher = original
+
+
+def test_repeat_lookup_skips_encoder():
+    """测试同一 key_hash 第二次查询命中内存，不再调用编码器"""
+    print("测试重复查询命中...")
+
+    cache = EmbeddingCache(max_entries=8, model_name="stub-model", persist=False)
+    stub, results = _run_lookups(cache, [("a red fox", "h1"), ("a red fox", "h1")])
+
+    assert stub.calls == ["a red fox"]
+    assert results[0] is results[1]
+    assert results[0].dtype == np.float32
+    print("OK 重复查询命中成功")
+
+
+def test_lru_eviction():
+    """测试超过 max_entries 时淘汰最久未使用的条目"""
+    print("测试LRU淘汰...")
+
+    cache = EmbeddingCache(max_entries=2, model_name="stub-model", persist=False)
+    stub, _ = _run_lookups(cache, [
+        ("one", "h1"),
+        ("two", "h2"),
+        ("one", "h1"),    # 访问h1，h2变为最久未使用
+        ("three", "h3"),  # 淘汰h2
+        ("one", "h1"),    # 仍在缓存中
+        ("two", "h2"),    # 已被淘汰，重新编码
+    ])
+
+    assert stub.calls == ["one", "two", "three", "two"]
+    assert list(cache._entries.keys()) == ["h1", "h2"]
+    print("OK LRU淘汰成功")
+
+
+def test_stats_counters():
+    """测试命中/未命中计数与命中率"""
+    print("测试缓存统计...")
+
+    cache = EmbeddingCache(max_entries=8, model_name="stub-model", persist=False)
+    assert cache.stats()["hit_rate"] == 0.0
+
+    _run_lookups(cache, [("x", "h1"), ("x", "h1"), ("y", "h2"), ("x", "h1")])
+
+    stats = cache.stats()
+    assert stats["model_name"] == "stub-model"
+    assert stats["entries"] == 2
+    assert stats["max_entries"] == 8
+    assert stats["memory_hits"] == 2
+    assert stats["db_hits"] == 0
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+    print("OK 缓存统计成功")
+
+
+if __name__ == "__main__":
+    test_repeat_lookup_skips_encoder()
+    test_lru_eviction()
+    test_stats_counters()
+    print("所有嵌入缓存测试完成！")
@@ -0,0 +1,158 @@
+"""
+嵌入向量索引测试
+"""
+import asyncio
+import sys
+import os
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic import embedding_index as index_module
+from app.logic.embedding_index import PromptEmbeddingIndex, SoulEmbeddingIndex
+
+
+class StubPromptKeyDAL:
+    """按 since_ts 返回预设行的 AsyncPromptKeyDAL 替身"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def list_embeddings_by_soul(self, db, soul_id, since_ts=0):
+        self.calls.append((soul_id, since_ts))
+        return [row for row in self.rows if row["updated_at_ts"] > since_ts]
+
+
+def _row(pk_id, vector, updated_at_ts):
+    return {
+        "pk_id": pk_id,
+        "key_embed": np.array(vector, dtype=np.float32).tobytes(),
+        "updated_at_ts": updated_at_ts
+    }
+
+
+def test_search_returns_best_match():
+    """测试最相似向量查找"""
+    print("测试最相似向量查找...")
+
+    index = SoulEmbeddingIndex()
+    index.upsert("nova:a", np.array([1.0, 0.0, 0.0], dtype=np.float32), 1)
+    index.upsert("nova:b", np.array([0.0, 1.0, 0.0], dtype=np.float32), 2)
+    index.upsert("nova:c", np.array([1.0, 1.0, 0.0], dtype=np.float32), 3)
+
+    match = index.search(np.array([2.0, 0.1, 0.0], dtype=np.float32), threshold=0.85)
+    assert match is not None
+    assert match[0] == "nova:a"
+    print("OK 最相似向量查找成功")
+
+    # 阈值过滤
+    assert index.search(np.array([0.0, 0.0, 1.0], dtype=np.float32), threshold=0.85) is None
+    print("OK 阈值过滤成功")
+
+
+def test_upsert_updates_existing_row():
+    """测试重复写入同一pk_id时覆盖原行"""
+    print("测试重复写入...")
+
+    index = SoulEmbeddingIndex(initial_capacity=1)
+    index.upsert("nova:a", np.array([1.0, 0.0], dtype=np.float32), 1)
+    index.upsert("nova:a", np.array([0.0, 1.0], dtype=np.float32), 5)
+
+    assert index.size == 1
+    assert index.max_updated_at_ts == 5
+    assert index.search(np.array([0.0, 1.0], dtype=np.float32), threshold=0.99)[0] == "nova:a"
+    print("OK 重复写入覆盖成功")
+
+
+def test_growth_and_dimension_mismatch():
+    """测试扩容与维度校验"""
+    print("测试扩容与维度校验...")
+
+    index = SoulEmbeddingIndex(initial_capacity=2)
+    for i in range(10):
+        vector = np.zeros(4, dtype=np.float32)
+        vector[i % 4] = 1.0
+        vector[(i + 1) % 4] = i / 10.0
+        assert index.upsert(f"nova:{i}", vector, i)
+
+    assert index.size == 10
+    assert index.matrix.shape[0] >= 10
+    assert not index.upsert("nova:bad", np.ones(3, dtype=np.float32))
+    assert not index.upsert("nova:zero", np.zeros(4, dtype=np.float32))
+    print("OK 扩容与维度校验成功")
+
+
+def test_lazy_load_and_incremental_refresh():
+    """测试首次访问全量加载、刷新间隔内不查库、过期后只拉取新增的键"""
+    print("测试懒加载与增量刷新...")
+
+    stub = StubPromptKeyDAL([_row("nova:a", [1.0, 0.0], 10)])
+    original = index_module.AsyncPromptKeyDAL
+    index_module.AsyncPromptKeyDAL = stub
+    try:
+        prompt_index = PromptEmbeddingIndex(refresh_seconds=60)
+
+        async def run():
+            first = await prompt_index.search(None, "nova", np.array([1.0, 0.0]), 0.9)
+            second = await prompt_index.search(None, "nova", np.array([1.0, 0.0]), 0.9)
+
+            # 其他worker写入新键，刷新间隔过后增量拉取
+            stub.rows.append(_row("nova:b", [0.0, 1.0], 20))
+            prompt_index._indexes["nova"].loaded_at -= 61
+            third = await prompt_index.search(None, "nova", np.array([0.0, 1.0]), 0.9)
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+    finally:
+        index_module.AsyncPromptKeyDAL = original
+
+    assert first[0] == "nova:a" and second[0] == "nova:a"
+    assert third[0] == "nova:b"
+    assert stub.calls == [("nova", 0), ("nova", 10)]
+    print("OK 懒加载与增量刷新成功")
+
+
+def test_invalidate_during_refresh_keeps_old_index():
+    """测试增量拉取期间索引被清除时，不把增量行当作完整索引写入"""
+    print("测试刷新期间清除索引...")
+
+    prompt_index = PromptEmbeddingIndex(refresh_seconds=60)
+
+    class InvalidatingDAL(StubPromptKeyDAL):
+        async def list_embeddings_by_soul(self, db, soul_id, since_ts=0):
+            rows = await super().list_embeddings_by_soul(db, soul_id, since_ts)
+            if since_ts:
+                prompt_index.invalidate(soul_id)
+            return rows
+
+    stub = InvalidatingDAL([_row("nova:a", [1.0, 0.0], 10)])
+    original = index_module.AsyncPromptKeyDAL
+    index_module.AsyncPromptKeyDAL = stub
+    try:
+        async def run():
+            await prompt_index.get_index(None, "nova")
+            stub.rows.append(_row("nova:b", [0.0, 1.0], 20))
+            prompt_index._indexes["nova"].loaded_at -= 61
+            stale = await prompt_index.get_index(None, "nova")
+            reloaded = await prompt_index.get_index(None, "nova")
+            return stale, reloaded
+
+        stale, reloaded = asyncio.run(run())
+    finally:
+        index_module.AsyncPromptKeyDAL = original
+
+    assert stale.size == 1
+    assert reloaded.size == 2
+    assert stub.calls == [("nova", 0), ("nova", 10), ("nova", 0)]
+    print("OK 刷新期间清除索引成功")
+
+
+if __name__ == "__main__":
+    test_search_returns_best_match()
+    test_upsert_updates_existing_row()
+    test_growth_and_dimension_mismatch()
+    test_lazy_load_and_incremental_refresh()
+    test_invalidate_during_refresh_keeps_old_index()
+    print("所有嵌入索引测试完成！")
@@ -0,0 +1,102 @@
+"""
+流式GIF编码测试
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic.gif_encoder import (
+    encode_gif, convert_mp4_to_gif, shutdown_gif_executor, gif_profile_stats, GIF_PROFILES
+)
+
+
+def _write_source(path: str, frame_count: int = 20, size=(64, 48)) -> None:
+    """生成一段测试用的动画（颜色逐帧变化）"""
+    frames = []
+    for i in range(frame_count):
+        array = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        array[:, :, 0] = i * 12
+        array[:, : size[0] // 2, 1] = 200
+        frames.append(Image.fromarray(array))
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=125, loop=0)
+
+
+def test_encode_downsamples_frames_and_size():
+    """测试跳帧与缩放"""
+    print("测试跳帧与缩放...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.gif")
+        output = os.path.join(tmp, "output.gif")
+        _write_source(source)
+
+        stats = encode_gif(source, output, {"width": 32, "max_fps": 4})
+        assert stats["frames"] == 10
+        assert (stats["width"], stats["height"]) == (32, 24)
+        assert stats["bytes"] == os.path.getsize(output)
+        assert not os.path.exists(output + ".part")
+
+        with Image.open(output) as gif:
+            assert gif.size == (32, 24)
+            assert gif.n_frames == 10
+            assert gif.info.get("loop") == 0
+    print("OK 跳帧与缩放成功")
+
+
+def test_shared_palette_profile_options():
+    """测试共享调色板、固定跳帧与单次播放"""
+    print("测试共享调色板配置...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.gif")
+        output = os.path.join(tmp, "output.gif")
+        _write_source(source)
+
+        options = {"width": 0, "frame_stride": 5, "palette": "shared", "colors": 16,
+                   "dither": False, "loop": None}
+        stats = encode_gif(source, output, options)
+        assert stats["frames"] == 4
+
+        with Image.open(output) as gif:
+            assert gif.n_frames == 4
+            assert "loop" not in gif.info
+    print("OK 共享调色板配置成功")
+
+
+def test_convert_in_process_pool():
+    """测试在进程池中按配置转换并记录统计"""
+    print("测试进程池转换...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.gif")
+        output = os.path.join(tmp, "output.gif")
+        _write_source(source, frame_count=6)
+        try:
+            stats = asyncio.run(convert_mp4_to_gif(source, output, "full"))
+        finally:
+            shutdown_gif_executor()
+        assert stats["profile"] == "full"
+        assert stats["frames"] == 6
+        assert (stats["width"], stats["height"]) == (64, 48)
+        assert gif_profile_stats()["full"]["count"] == 1
+
+    try:
+        asyncio.run(convert_mp4_to_gif("missing.mp4", "missing.gif", "unknown"))
+        assert False, "未知配置应抛出ValueError"
+    except ValueError:
+        pass
+    assert set(GIF_PROFILES) >= {"full", "default", "compact", "preview"}
+    print("OK 进程池转换成功")
+
+
+if __name__ == "__main__":
+    test_encode_downsamples_frames_and_size()
+    test_shared_palette_profile_options()
+    test_convert_in_process_pool()
+    print("所有GIF编码测试完成！")
@@ -0,0 +1,98 @@
+"""
+静态文件缓存测试（强ETag、304、Range请求）
+"""
+import hashlib
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes_static
+from app.logic.asset_store import asset_store
+
+
+PAYLOAD = b"\x00\x00\x00\x18ftypmp42" + bytes(range(256)) * 64
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(routes_static.router)
+    return TestClient(app)
+
+
+def test_asset_etag_and_conditional_get():
+    """测试内容寻址资源的强ETag、缓存头与304"""
+    print("测试ETag与304...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_root = asset_store.root
+        asset_store.root = Path(tmp)
+        try:
+            src = Path(tmp) / "clip.mp4"
+            src.write_bytes(PAYLOAD)
+            blob = asset_store.ingest(src)
+            client = _client()
+            url = f"/static/assets/{blob['storage_key']}"
+
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.content == PAYLOAD
+            etag = response.headers["etag"]
+            assert etag == f'"{hashlib.sha256(PAYLOAD).hexdigest()}"'
+            assert "immutable" in response.headers["cache-control"]
+
+            response = client.get(url, headers={"If-None-Match": f'"other", {etag}'})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+
+            response = client.get(url, headers={"Range": "bytes=100-199"})
+            assert response.status_code == 206
+            assert response.content == PAYLOAD[100:200]
+            assert response.headers["content-range"] == f"bytes 100-199/{len(PAYLOAD)}"
+
+            # If-Range 与当前ETag不一致时返回完整内容
+            response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+            assert response.status_code == 200
+            assert response.content == PAYLOAD
+        finally:
+            asset_store.root = original_root
+    print("OK ETag与304成功")
+
+
+def test_legacy_video_etag_from_content():
+    """测试按文件名访问的视频使用内容哈希作为ETag"""
+    print("测试视频ETag...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_dir = routes_static.GENERATED_VIDEOS_DIR
+        routes_static.GENERATED_VIDEOS_DIR = tmp
+        try:
+            (Path(tmp) / "wan_01TEST.mp4").write_bytes(PAYLOAD)
+            client = _client()
+
+            response = client.get("/static/videos/wan_01TEST.mp4", headers={"Range": "bytes=-16"})
+            assert response.status_code == 206
+            assert response.content == PAYLOAD[-16:]
+            assert response.headers["etag"] == f'"{hashlib.sha256(PAYLOAD).hexdigest()}"'
+
+            response = client.get(
+                "/static/videos/wan_01TEST.mp4",
+                headers={"If-None-Match": f'W/{response.headers["etag"]}'}
+            )
+            assert response.status_code == 304
+        finally:
+            routes_static.GENERATED_VIDEOS_DIR = original_dir
+    print("OK 视频ETag成功")
+
+
+if __name__ == "__main__":
+    test_asset_etag_and_conditional_get()
+    test_legacy_video_etag_from_content()
+    print("所有静态文件测试完成！")
@@ -0,0 +1,82 @@
+"""
+生成调度器测试
+"""
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.core.scheduler import GenerationScheduler
+
+
+def test_fair_round_robin_per_backend():
+    """测试同一后端内按fair_key轮转放行，且后端之间互不阻塞"""
+    print("测试公平调度...")
+
+    scheduler = GenerationScheduler({"wan_image": 1, "wan_video": 1})
+    order = []
+
+    async def job(backend, fair_key, name, hold):
+        async with scheduler.slot(backend, fair_key):
+            order.append(name)
+            await hold.wait()
+
+    async def run():
+        video_hold = asyncio.Event()
+        image_hold = asyncio.Event()
+        # 长时间运行的视频任务不应阻塞图像任务
+        video = asyncio.create_task(job("wan_video", "alice", "video", video_hold))
+        first = asyncio.create_task(job("wan_image", "alice", "a1", image_hold))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert order == ["video", "a1"]
+
+        # alice 排了三个，bob 排了一个：bob 应在 alice 的第二个之后立即获得槽位
+        release = asyncio.Event()
+        release.set()
+        waiters = [
+            asyncio.create_task(job("wan_image", "alice", "a2", release)),
+            asyncio.create_task(job("wan_image", "alice", "a3", release)),
+            asyncio.create_task(job("wan_image", "alice", "a4", release)),
+        ]
+        await asyncio.sleep(0)
+        waiters.append(asyncio.create_task(job("wan_image", "bob", "b1", release)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["wan_image"]["waiting"] == 4
+
+        image_hold.set()
+        await asyncio.gather(first, *waiters)
+        video_hold.set()
+        await video
+
+    asyncio.run(run())
+    assert order == ["video", "a1", "a2", "b1", "a3", "a4"]
+    assert scheduler.stats()["wan_image"]["active"] == 0
+    print("OK 公平调度成功")
+
+
+def test_cancelled_waiter_is_skipped():
+    """测试排队中的取消不会占用槽位"""
+    print("测试取消排队...")
+
+    scheduler = GenerationScheduler({"wan_image": 1})
+
+    async def run():
+        await scheduler.acquire("wan_image", "alice")
+        waiter = asyncio.create_task(scheduler.acquire("wan_image", "bob"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release("wan_image")
+        assert scheduler.is_idle("wan_image")
+
+    asyncio.run(run())
+    print("OK 取消排队成功")
+
+
+if __name__ == "__main__":
+    test_fair_round_robin_per_backend()
+    test_cancelled_waiter_is_skipped()
+    print("所有调度器测试完成！")
@@ -0,0 +1,74 @@
+"""
+请求合并（single-flight）测试
+"""
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    """测试同键并发调用只执行一次"""
+    print("测试同键合并...")
+
+    flights = SingleFlight()
+    calls = {"n": 0}
+
+    async def generate():
+        calls["n"] += 1
+        await asyncio.sleep(0.05)
+        return {"pk_id": "nova:a"}
+
+    async def run():
+        return await asyncio.gather(*[flights.do("image|nova:a", generate) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert calls["n"] == 1
+    assert [leader for _, leader in results].count(True) == 1
+    assert all(result == {"pk_id": "nova:a"} for result, _ in results)
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+    print("OK 同键合并成功")
+
+
+def test_leader_error_and_cancel():
+    """测试leader失败时异常传给follower，leader被取消时follower接替执行"""
+    print("测试leader失败与取消...")
+
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("upstream down")
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        leader = asyncio.create_task(flights.do("k", fail))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("k", ok))
+        errors = await asyncio.gather(leader, follower, return_exceptions=True)
+        assert all(isinstance(e, RuntimeError) for e in errors)
+
+        leader = asyncio.create_task(flights.do("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("k", ok))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("ok", True)
+    print("OK leader失败与取消成功")
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_call()
+    test_leader_error_and_cancel()
+    print("所有请求合并测试完成！")
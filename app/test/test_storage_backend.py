@@ -0,0 +1,159 @@
+"""
+存储后端测试（后台上传、本地副本删除后重定向）
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic import storage_backend
+from app.logic.asset_store import asset_store
+from app.logic.storage_backend import AssetUploader, StorageBackend, build_asset_url
+from app.config import config
+
+
+class DirectoryObjectStore(StorageBackend):
+    """用本地目录模拟对象存储"""
+
+    name = "directory"
+    remote = True
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def upload(self, storage_key, local_path, content_type):
+        target = self.root / storage_key
+        with self.lock:
+            if target.exists():
+                return False
+            self.uploads.append(storage_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(Path(local_path).read_bytes())
+        return True
+
+    def object_url(self, storage_key):
+        return f"http://objects.local/bucket/{storage_key}"
+
+
+def test_background_upload():
+    """测试同一资源只上传一次，上传后删除本地副本"""
+    print("测试后台上传...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_root = asset_store.root
+        asset_store.root = Path(tmp) / "store"
+        try:
+            src = Path(tmp) / "clip.mp4"
+            src.write_bytes(b"\x00\x00\x00\x18ftypmp42" * 100)
+            blob = asset_store.ingest(src)
+
+            backend = DirectoryObjectStore(Path(tmp) / "bucket")
+            uploader = AssetUploader(backend, delete_local=True)
+
+            async def run():
+                first = uploader.schedule(blob)
+                second = uploader.schedule(blob)
+                assert first is second
+                await uploader.drain()
+
+            asyncio.run(run())
+            assert backend.uploads == [blob["storage_key"]]
+            assert (Path(tmp) / "bucket" / blob["storage_key"]).is_file()
+            assert not asset_store.exists(blob["storage_key"])
+            assert uploader.stats()["uploaded"] == 1
+        finally:
+            asset_store.root = original_root
+    print("OK 后台上传成功")
+
+
+def test_redirect_when_local_copy_removed():
+    """测试本地副本不存在时重定向到对象存储"""
+    print("测试对象存储重定向...")
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.routes_static import router
+
+    app = FastAPI()
+    app.include_router(router)
+    storage_key = "ab/cd/" + "ab" * 32 + ".png"
+
+    original_backend = storage_backend._storage_backend
+    storage_backend._storage_backend = DirectoryObjectStore(Path(tempfile.gettempdir()))
+    try:
+        client = TestClient(app)
+        response = client.get(f"/static/assets/{storage_key}", follow_redirects=False)
+        assert response.status_code == 307
+        assert response.headers["location"] == f"http://objects.local/bucket/{storage_key}"
+        assert client.get("/static/assets/../../etc/passwd").status_code == 404
+    finally:
+        storage_backend._storage_backend = original_backend
+
+    assert build_asset_url(storage_key) == f"{config.PUBLIC_API_URL.rstrip('/')}/static/assets/{storage_key}"
+    print("OK 重定向成功")
+
+
+def test_object_url_after_upload():
+    """测试上传完成后资源地址指向对象存储，保留本地副本时也重定向"""
+    print("测试上传后的资源地址...")
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.routes_static import router
+
+    app = FastAPI()
+    app.include_router(router)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_root = asset_store.root
+        original_backend = storage_backend._storage_backend
+        original_uploader = storage_backend._asset_uploader
+        asset_store.root = Path(tmp) / "store"
+        try:
+            src = Path(tmp) / "frame.png"
+            src.write_bytes(b"\x89PNG\r\n\x1a\n" * 64)
+            blob = asset_store.ingest(src)
+            storage_key = blob["storage_key"]
+
+            backend = DirectoryObjectStore(Path(tmp) / "bucket")
+            uploader = AssetUploader(backend, delete_local=False)
+            storage_backend._storage_backend = backend
+            storage_backend._asset_uploader = uploader
+
+            api_url = f"{config.PUBLIC_API_URL.rstrip('/')}/static/assets/{storage_key}"
+            object_url = f"http://objects.local/bucket/{storage_key}"
+
+            async def run():
+                uploader.schedule(blob)
+                # 上传进行中仍返回API地址
+                assert build_asset_url(storage_key) == api_url
+                await uploader.drain()
+                assert uploader.schedule(blob) is None
+
+            asyncio.run(run())
+            assert build_asset_url(storage_key) == object_url
+            assert asset_store.exists(storage_key)
+
+            client = TestClient(app)
+            response = client.get(f"/static/assets/{storage_key}", follow_redirects=False)
+            assert response.status_code == 307
+            assert response.headers["location"] == object_url
+        finally:
+            asset_store.root = original_root
+            storage_backend._storage_backend = original_backend
+            storage_backend._asset_uploader = original_uploader
+    print("OK 上传后的资源地址成功")
+
+
+if __name__ == "__main__":
+    test_background_upload()
+    test_redirect_when_local_copy_removed()
+    test_object_url_after_upload()
+    print("所有存储后端测试完成！")
@@ -0,0 +1,87 @@
+"""
+风格配置缓存测试（LWW写回保护、删除墓碑、TTL过期）
+"""
+import sys
+import os
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.core.lww import now_ms
+from app.data.models import SoulStyleProfileBase
+from app.data.style_cache import StyleProfileCache
+
+
+def _profile(updated_at_ts: int, base_model_ref: str) -> SoulStyleProfileBase:
+    return SoulStyleProfileBase(
+        soul_id="nova",
+        base_model_ref=base_model_ref,
+        lora_ids_json=[],
+        palette_json={},
+        negatives_json=[],
+        motion_module=None,
+        extra_json={},
+        updated_at_ts=updated_at_ts
+    )
+
+
+def test_stale_reader_cannot_overwrite_upsert():
+    """测试更新前读到旧配置的读者写回缓存时被拒绝"""
+    print("测试并发读写...")
+
+    cache = StyleProfileCache(ttl_seconds=60)
+    old = _profile(1000, "old")
+    new = _profile(2000, "new")
+
+    # 读者：缓存未命中，从数据库读到旧配置……
+    assert cache.get("nova") == (False, None)
+    # ……此时另一请求完成upsert并写入新配置……
+    cache.put("nova", new)
+    # ……读者随后写回旧配置
+    cache.put("nova", old)
+
+    hit, profile = cache.get("nova")
+    assert hit and profile.base_model_ref == "new"
+    print("OK 并发读写成功")
+
+
+def test_delete_tombstone_rejects_stale_put():
+    """测试删除后写回删除前读到的配置被拒绝，删除之后的新配置可以写入"""
+    print("测试删除墓碑...")
+
+    cache = StyleProfileCache(ttl_seconds=60)
+    stale = _profile(now_ms() - 10, "stale")
+    cache.put("nova", stale)
+
+    cache.invalidate("nova")
+    cache.put("nova", stale)
+    assert cache.get("nova") == (True, None)
+
+    cache.put("nova", _profile(now_ms() + 10, "recreated"))
+    hit, profile = cache.get("nova")
+    assert hit and profile.base_model_ref == "recreated"
+    print("OK 删除墓碑成功")
+
+
+def test_ttl_expiry():
+    """测试TTL过期后重新读取"""
+    print("测试TTL过期...")
+
+    cache = StyleProfileCache(ttl_seconds=0.05)
+    cache.put("nova", _profile(1000, "v1"))
+    assert cache.get("nova")[0]
+    time.sleep(0.06)
+    assert cache.get("nova") == (False, None)
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    print("OK TTL过期成功")
+
+
+if __name__ == "__main__":
+    test_stale_reader_cannot_overwrite_upsert()
+    test_delete_tombstone_rejects_stale_put()
+    test_ttl_expiry()
+    print("所有风格配置缓存测试完成！")
@@ -0,0 +1,144 @@
+"""
+后台任务管理器测试
+"""
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.core.lww import now_ms
+from app.core.task_manager import TaskManager, TaskType, TaskStatus
+
+
+def test_runs_tasks_in_parallel_up_to_limit():
+    """测试任务在并发上限内并行执行"""
+    print("测试并行执行...")
+
+    manager = TaskManager(max_concurrent=2)
+    state = {"running": 0, "peak": 0}
+
+    async def job(task, session_factory):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.05)
+        state["running"] -= 1
+        return {"ok": task.params["n"]}
+
+    async def run():
+        task_ids = []
+        for n in range(4):
+            task_id = await manager.create_task(TaskType.STYLE_GENERATION, {"n": n})
+            await manager.start_task(task_id, job)
+            task_ids.append(task_id)
+        await asyncio.wait_for(manager.task_queue.join(), timeout=2)
+        return task_ids
+
+    task_ids = asyncio.run(run())
+    assert state["peak"] == 2
+    for n, task_id in enumerate(task_ids):
+        status = asyncio.run(manager.get_task_status(task_id))
+        assert status["status"] == TaskStatus.COMPLETED.value
+        assert status["result"] == {"ok": n}
+    print("OK 并行执行成功")
+
+
+def test_cancel_running_task():
+    """测试取消正在运行的任务"""
+    print("测试取消运行中任务...")
+
+    manager = TaskManager(max_concurrent=1)
+    started = None
+
+    async def job(task, session_factory):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def run():
+        nonlocal started
+        started = asyncio.Event()
+        task_id = await manager.create_task(TaskType.STYLE_GENERATION, {})
+        await manager.start_task(task_id, job)
+        await asyncio.wait_for(started.wait(), timeout=1)
+        assert manager.get_running_tasks_count() == 1
+        assert await manager.cancel_task(task_id)
+        await asyncio.sleep(0)
+        return task_id
+
+    task_id = asyncio.run(run())
+    assert asyncio.run(manager.get_task_status(task_id))["status"] == TaskStatus.CANCELLED.value
+    assert manager.get_running_tasks_count() == 0
+    print("OK 取消运行中任务成功")
+
+
+def test_priority_and_deadline_order():
+    """测试高优先级与临近截止时间的任务先执行，过期任务被丢弃"""
+    print("测试优先级与截止时间...")
+
+    manager = TaskManager(max_concurrent=1)
+    order = []
+
+    async def job(task, session_factory):
+        order.append(task.params["name"])
+        await asyncio.sleep(0.01)
+
+    async def run():
+        blocker = await manager.create_task(TaskType.STYLE_GENERATION, {"name": "blocker"})
+        await manager.start_task(blocker, job)
+        await asyncio.sleep(0)
+
+        selfie = await manager.create_task(TaskType.SELFIE_GENERATION, {"name": "selfie"})
+        await manager.start_task(selfie, job)
+        style = await manager.create_task(TaskType.STYLE_GENERATION, {"name": "style"})
+        await manager.start_task(style, job)
+        urgent = await manager.create_task(
+            TaskType.SELFIE_GENERATION, {"name": "urgent"}, deadline_ts=now_ms() + 5000
+        )
+        await manager.start_task(urgent, job)
+        expired = await manager.create_task(
+            TaskType.SELFIE_GENERATION, {"name": "expired"}, deadline_ts=now_ms() + 5
+        )
+        await manager.start_task(expired, job)
+        await asyncio.sleep(0.02)
+        await asyncio.wait_for(manager.task_queue.join(), timeout=2)
+        return expired
+
+    expired = asyncio.run(run())
+    assert order == ["blocker", "urgent", "style", "selfie"]
+    assert asyncio.run(manager.get_task_status(expired))["status"] == TaskStatus.EXPIRED.value
+    print("OK 优先级与截止时间成功")
+
+
+def test_cancel_expired_task_keeps_expiry():
+    """测试取消已过期丢弃的任务返回False，且保留过期状态与原因"""
+    print("测试取消过期任务...")
+
+    manager = TaskManager(max_concurrent=1)
+
+    async def job(task, session_factory):
+        return {}
+
+    async def run():
+        task_id = await manager.create_task(
+            TaskType.STYLE_GENERATION, {}, deadline_ts=now_ms() + 5
+        )
+        await asyncio.sleep(0.02)
+        await manager.start_task(task_id, job)
+        await asyncio.wait_for(manager.task_queue.join(), timeout=2)
+        assert not await manager.cancel_task(task_id)
+        return task_id
+
+    task_id = asyncio.run(run())
+    status = asyncio.run(manager.get_task_status(task_id))
+    assert status["status"] == TaskStatus.EXPIRED.value
+    assert status["error"] == "任务已超过截止时间，未执行"
+    print("OK 取消过期任务成功")
+
+
+if __name__ == "__main__":
+    test_runs_tasks_in_parallel_up_to_limit()
+    test_cancel_running_task()
+    test_priority_and_deadline_order()
+    test_cancel_expired_task_keeps_expiry()
+    print("所有任务管理器测试完成！")
@@ -0,0 +1,195 @@
+"""
+持久化任务队列测试（需要PostgreSQL，先运行 init_db.py）
+"""
+import asyncio
+import sys
+import os
+import time
+import uuid
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import text
+
+from app.core.durable_task_manager import DurableTaskManager
+from app.core.lww import now_ms
+from app.core.task_manager import TaskType, TaskStatus
+from app.data.dal import TaskQueueDAL, get_db, session_scope
+
+
+def _new_task(db, deadline_ts=None):
+    """创建并入队一个测试任务（每个任务使用独立的task_type，互不干扰）"""
+    task_id = str(uuid.uuid4())
+    task_type = f"test_{task_id[:8]}"
+    TaskQueueDAL.create(db, task_id, task_type, {"n": 1}, deadline_ts)
+    assert TaskQueueDAL.enqueue(db, task_id, now_ms())
+    return task_id, task_type
+
+
+def test_claim_skips_locked_rows():
+    """测试 FOR UPDATE SKIP LOCKED：被其他事务锁住的任务不会被重复认领"""
+    print("测试SKIP LOCKED认领...")
+
+    db = next(get_db())
+    locker = next(get_db())
+    task_id, task_type = _new_task(db)
+
+    locker.execute(
+        text("SELECT task_id FROM task_queue WHERE task_id = :task_id FOR UPDATE"),
+        {"task_id": task_id}
+    )
+    try:
+        assert TaskQueueDAL.claim(db, "worker-b", 60000, 3, [task_type]) is None
+    finally:
+        locker.rollback()
+
+    row = TaskQueueDAL.claim(db, "worker-b", 60000, 3, [task_type])
+    assert row["task_id"] == task_id
+    assert row["status"] == "running"
+    assert row["lease_owner"] == "worker-b"
+    assert row["attempts"] == 1
+    assert TaskQueueDAL.finish(db, task_id, "worker-b", "completed", result={"ok": True})
+    assert TaskQueueDAL.get(db, task_id)["result_json"] == {"ok": True}
+    print("OK SKIP LOCKED认领成功")
+
+
+def test_lease_expiry_reclaim():
+    """测试worker失联后租约过期，任务被其他worker接管，原worker心跳与结果写入失效"""
+    print("测试租约过期接管...")
+
+    db = next(get_db())
+    task_id, task_type = _new_task(db)
+
+    assert TaskQueueDAL.claim(db, "worker-a", 1, 3, [task_type])["task_id"] == task_id
+    time.sleep(0.01)
+
+    row = TaskQueueDAL.claim(db, "worker-b", 60000, 3, [task_type])
+    assert row["task_id"] == task_id
+    assert row["attempts"] == 2
+
+    # 原worker恢复后心跳返回None（租约已丢失），结果写入被拒绝
+    assert TaskQueueDAL.heartbeat(db, task_id, "worker-a", 60000, 50) is None
+    assert not TaskQueueDAL.finish(db, task_id, "worker-a", "completed")
+    assert TaskQueueDAL.heartbeat(db, task_id, "worker-b", 60000, 50) is False
+    assert TaskQueueDAL.finish(db, task_id, "worker-b", "completed")
+    print("OK 租约过期接管成功")
+
+
+def test_lease_expiry_after_max_attempts_fails():
+    """测试重试次数用尽后租约过期的任务被标记失败"""
+    print("测试最大尝试次数...")
+
+    db = next(get_db())
+    task_id, task_type = _new_task(db)
+
+    assert TaskQueueDAL.claim(db, "worker-a", 1, 1, [task_type])["task_id"] == task_id
+    time.sleep(0.01)
+
+    assert TaskQueueDAL.claim(db, "worker-b", 60000, 1, [task_type]) is None
+    assert TaskQueueDAL.get(db, task_id)["status"] == "failed"
+    print("OK 最大尝试次数成功")
+
+
+def test_cancel_pending_and_running():
+    """测试取消未开始与运行中的任务"""
+    print("测试取消任务...")
+
+    db = next(get_db())
+    pending_id, _ = _new_task(db)
+    assert TaskQueueDAL.request_cancel(db, pending_id) == "cancelled"
+    assert TaskQueueDAL.get(db, pending_id)["completed_at_ts"] is not None
+    assert TaskQueueDAL.request_cancel(db, pending_id) is None
+
+    running_id, task_type = _new_task(db)
+    TaskQueueDAL.claim(db, "worker-a", 60000, 3, [task_type])
+    assert TaskQueueDAL.request_cancel(db, running_id) == "running"
+    # 持有租约的worker在下一次心跳时收到取消请求
+    assert TaskQueueDAL.heartbeat(db, running_id, "worker-a", 60000, 10) is True
+    assert TaskQueueDAL.finish(db, running_id, "worker-a", "cancelled", error="任务被取消")
+    assert TaskQueueDAL.get(db, running_id)["status"] == "cancelled"
+    print("OK 取消任务成功")
+
+
+def test_cancel_requested_with_dead_worker():
+    """测试已请求取消、worker又失联的任务在租约过期后被标记为取消，不会卡在running"""
+    print("测试取消后worker失联...")
+
+    db = next(get_db())
+    task_id, task_type = _new_task(db)
+
+    TaskQueueDAL.claim(db, "worker-a", 1, 3, [task_type])
+    assert TaskQueueDAL.request_cancel(db, task_id) == "running"
+    time.sleep(0.01)
+
+    assert TaskQueueDAL.claim(db, "worker-b", 60000, 3, [task_type]) is None
+    row = TaskQueueDAL.get(db, task_id)
+    assert row["status"] == "cancelled"
+    assert row["completed_at_ts"] is not None
+    assert row["lease_owner"] is None
+    print("OK 取消后worker失联成功")
+
+
+def test_deadline_expires_pending_task():
+    """测试超过截止时间仍未开始的任务被标记过期"""
+    print("测试截止时间过期...")
+
+    db = next(get_db())
+    task_id, task_type = _new_task(db, deadline_ts=now_ms() + 5)
+    time.sleep(0.01)
+
+    assert TaskQueueDAL.claim(db, "worker-a", 60000, 3, [task_type]) is None
+    assert TaskQueueDAL.get(db, task_id)["status"] == "expired"
+    print("OK 截止时间过期成功")
+
+
+def test_durable_manager_end_to_end():
+    """测试 DurableTaskManager（TASK_QUEUE_BACKEND=db 时 /tasks 使用的实现）创建、执行与查询"""
+    print("测试持久化任务管理器...")
+
+    manager = DurableTaskManager(
+        max_concurrent=1,
+        session_factory=session_scope,
+        heartbeat_seconds=0.05,
+        poll_interval_seconds=0.05
+    )
+
+    async def job(task, session_factory):
+        task.progress = 50
+        return {"echo": task.params["n"]}
+
+    manager.register_handler(TaskType.STYLE_GENERATION, job)
+
+    async def run():
+        try:
+            task_id = await manager.create_task(TaskType.STYLE_GENERATION, {"n": 7})
+            status = await manager.get_task_status(task_id)
+            assert status["status"] == TaskStatus.PENDING.value
+            await manager.start_task(task_id)
+            for _ in range(100):
+                status = await manager.get_task_status(task_id)
+                if status["status"] == TaskStatus.COMPLETED.value:
+                    break
+                await asyncio.sleep(0.05)
+            listed = await manager.list_tasks(TaskStatus.COMPLETED)
+            return status, listed, task_id
+        finally:
+            await manager.stop()
+
+    status, listed, task_id = asyncio.run(run())
+    assert status["status"] == TaskStatus.COMPLETED.value
+    assert status["result"] == {"echo": 7}
+    assert status["progress"] == 100
+    assert any(task["task_id"] == task_id for task in listed)
+    print("OK 持久化任务管理器成功")
+
+
+if __name__ == "__main__":
+    test_claim_skips_locked_rows()
+    test_lease_expiry_reclaim()
+    test_lease_expiry_after_max_attempts_fails()
+    test_cancel_pending_and_running()
+    test_cancel_requested_with_dead_worker()
+    test_deadline_expires_pending_task()
+    test_durable_manager_end_to_end()
+    print("所有任务队列测试完成！")
@@ -0,0 +1,79 @@
+"""
+变体池认领测试（认领冲突重试、无可用变体）
+"""
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic import variant_pool
+from app.logic.variant_pool import claim_unseen_variant, IMAGE_VARIANT_TYPES
+
+
+class InMemoryPool:
+    """模拟 variant 与 user_seen 表：other_claims 中的变体会被并发请求抢先认领"""
+
+    def __init__(self, variant_ids, other_claims=()):
+        self.variant_ids = list(variant_ids)
+        self.seen = set()
+        self.other_claims = set(other_claims)
+
+    async def get_newest_unseen(self, db, pk_id, user_id, variant_types):
+        for variant_id in reversed(self.variant_ids):
+            if (user_id, variant_id) not in self.seen:
+                return SimpleNamespace(variant_id=variant_id, pk_id=pk_id)
+        return None
+
+    async def claim(self, db, user_id, variant_id):
+        if variant_id in self.other_claims:
+            self.other_claims.discard(variant_id)
+            self.seen.add((user_id, variant_id))
+            return False
+        if (user_id, variant_id) in self.seen:
+            return False
+        self.seen.add((user_id, variant_id))
+        return True
+
+
+def _claim(pool, max_attempts=3):
+    originals = (variant_pool.AsyncVariantDAL, variant_pool.AsyncUserSeenDAL)
+    variant_pool.AsyncVariantDAL = pool
+    variant_pool.AsyncUserSeenDAL = pool
+    try:
+        return asyncio.run(claim_unseen_variant(
+            None, "nova:k", "u1", IMAGE_VARIANT_TYPES, max_attempts=max_attempts
+        ))
+    finally:
+        variant_pool.AsyncVariantDAL, variant_pool.AsyncUserSeenDAL = originals
+
+
+def test_claim_retries_after_conflict():
+    """测试最新变体被并发请求抢先认领时，继续认领下一个"""
+    print("测试认领冲突重试...")
+
+    pool = InMemoryPool(["v1", "v2", "v3"], other_claims={"v3"})
+    variant = _claim(pool)
+    assert variant.variant_id == "v2"
+    print("OK 认领冲突重试成功")
+
+
+def test_claim_returns_none_when_exhausted():
+    """测试用户已看过全部变体或重试次数用尽时返回None"""
+    print("测试无可用变体...")
+
+    pool = InMemoryPool(["v1"])
+    assert _claim(pool).variant_id == "v1"
+    assert _claim(pool) is None
+
+    pool = InMemoryPool(["v1", "v2"], other_claims={"v1", "v2"})
+    assert _claim(pool, max_attempts=2) is None
+    print("OK 无可用变体成功")
+
+
+if __name__ == "__main__":
+    test_claim_retries_after_conflict()
+    test_claim_returns_none_when_exhausted()
+    print("所有变体池测试完成！")
@@ -0,0 +1,85 @@
+"""
+变体池预生成测试
+"""
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.core.scheduler import generation_scheduler, GenerationScheduler
+from app.logic.variant_replenisher import VariantReplenisher
+
+
+class InMemoryReplenisher(VariantReplenisher):
+    """使用固定候选列表、不访问数据库的预生成器"""
+
+    def __init__(self, pools, **kwargs):
+        self.generated = []
+
+        async def generate(pk_id):
+            self.generated.append(pk_id)
+            return {"pk_id": pk_id}
+
+        super().__init__(generate, **kwargs)
+        self.pools = pools
+
+    def _find_candidates(self):
+        return self.pools
+
+    def _try_lock(self, pk_id):
+        return True
+
+
+def test_budget_and_cooldown():
+    """测试每小时预算与单键冷却"""
+    print("测试预算与冷却...")
+
+    pools = [
+        {"pk_id": f"nova:{i}", "requests": 10 - i, "fresh_variants": 0}
+        for i in range(3)
+    ]
+    replenisher = InMemoryReplenisher(
+        pools, max_batches_per_hour=2, min_interval_seconds=0, key_cooldown_seconds=600, max_load=1.0
+    )
+
+    assert asyncio.run(replenisher.run_once()) == 2
+    assert replenisher.generated == ["nova:0", "nova:1"]
+    assert replenisher.stats()["skipped_budget"] == 1
+
+    # 预算用尽，且已补充的键仍在冷却
+    assert asyncio.run(replenisher.run_once()) == 0
+    print("OK 预算与冷却成功")
+
+
+def test_skips_when_backend_busy():
+    """测试后端繁忙时不预生成"""
+    print("测试繁忙时让出...")
+
+    replenisher = InMemoryReplenisher(
+        [{"pk_id": "nova:a", "requests": 10, "fresh_variants": 0}],
+        min_interval_seconds=0, max_load=0.5
+    )
+    backend = GenerationScheduler.BACKEND_WAN_IMAGE
+    limit = generation_scheduler.stats()[backend]["limit"]
+
+    async def run():
+        for _ in range(limit):
+            await generation_scheduler.acquire(backend, "user")
+        try:
+            return await replenisher.run_once()
+        finally:
+            for _ in range(limit):
+                generation_scheduler.release(backend)
+
+    assert asyncio.run(run()) == 0
+    assert replenisher.generated == []
+    assert replenisher.stats()["skipped_busy"] == 1
+    print("OK 繁忙时让出成功")
+
+
+if __name__ == "__main__":
+    test_budget_and_cooldown()
+    test_skips_when_backend_busy()
+    print("所有变体池预生成测试完成！")
@@ -0,0 +1,144 @@
+"""
+Wan异步客户端测试（使用本地DashScope桩服务）
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic.wan_client import WanAsyncClient, WanAPIError
+
+
+IMAGE_BYTES = b"\x89PNG\r\n\x1a\n" + b"0" * 4096
+
+
+class StubDashScopeHandler(BaseHTTPRequestHandler):
+    """模拟DashScope任务API：提交 -> 第一次查询RUNNING -> 之后SUCCEEDED"""
+
+    polls = {}
+    submitted = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        if self.headers.get("Authorization") != "Bearer test-key":
+            self._send_json(401, {"code": "InvalidApiKey", "message": "bad key"})
+            return
+        if self.headers.get("X-DashScope-Async") != "enable":
+            self._send_json(400, {"code": "InvalidParameter", "message": "async required"})
+            return
+        task_id = f"task-{len(self.submitted) + 1}"
+        self.submitted.append((self.path, body))
+        self._send_json(200, {"output": {"task_id": task_id, "task_status": "PENDING"}})
+
+    def do_GET(self):
+        if self.path.startswith("/api/v1/tasks/"):
+            task_id = self.path.rsplit("/", 1)[-1]
+            count = self.polls.get(task_id, 0)
+            self.polls[task_id] = count + 1
+            if count == 0:
+                self._send_json(200, {"output": {"task_id": task_id, "task_status": "RUNNING"}})
+            else:
+                base = f"http://127.0.0.1:{self.server.server_port}"
+                self._send_json(200, {"output": {
+                    "task_id": task_id,
+                    "task_status": "SUCCEEDED",
+                    "results": [{"url": f"{base}/files/{task_id}.png"}]
+                }})
+        elif self.path.startswith("/files/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(IMAGE_BYTES)))
+            self.end_headers()
+            self.wfile.write(IMAGE_BYTES)
+        else:
+            self._send_json(404, {"code": "NotFound", "message": self.path})
+
+
+def start_stub_server():
+    """启动桩服务，返回 (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubDashScopeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1"
+
+
+def test_submit_poll_download():
+    """测试提交、轮询、下载完整流程"""
+    print("测试Wan客户端完整流程...")
+    server, base_url = start_stub_server()
+
+    async def run():
+        client = WanAsyncClient(api_key="test-key", base_url=base_url)
+        try:
+            task_id = await client.submit_image_task("penguin in garden", n=2, seed=42)
+            first = await client.fetch_task(task_id)
+            second = await client.fetch_task(task_id)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                dest = Path(tmp_dir) / "out.png"
+                await client.download(second["results"][0]["url"], dest)
+                return task_id, first, second, dest.read_bytes()
+        finally:
+            await client.aclose()
+
+    try:
+        task_id, first, second, content = asyncio.run(run())
+        path, body = StubDashScopeHandler.submitted[-1]
+        assert path.endswith("/services/aigc/text2image/image-synthesis")
+        assert body["parameters"]["n"] == 2
+        assert body["parameters"]["seed"] == 42
+        assert first["task_status"] == "RUNNING"
+        assert second["task_status"] == "SUCCEEDED"
+        assert content == IMAGE_BYTES
+        print("OK Wan客户端完整流程成功")
+    finally:
+        server.shutdown()
+
+
+def test_error_response_raises():
+    """测试错误响应转换为WanAPIError"""
+    print("测试错误响应...")
+    server, base_url = start_stub_server()
+
+    async def run():
+        client = WanAsyncClient(api_key="wrong-key", base_url=base_url)
+        try:
+            await client.submit_video_task("bird flying")
+        finally:
+            await client.aclose()
+
+    try:
+        try:
+            asyncio.run(run())
+            assert False, "应当抛出WanAPIError"
+        except WanAPIError as e:
+            assert e.status_code == 401
+            assert e.code == "InvalidApiKey"
+            assert not e.retryable
+        print("OK 错误响应处理成功")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_submit_poll_download()
+    test_error_response_raises()
+    print("所有Wan客户端测试完成！")
@@ -0,0 +1,97 @@
+"""
+Wan任务集中轮询器测试（使用内存假客户端）
+"""
+import asyncio
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from app.logic.wan_client import WanAPIError
+from app.logic.wan_poller import WanTaskPoller
+
+
+class FakeWanClient:
+    """按脚本返回任务状态的假客户端"""
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.calls = {}
+
+    async def fetch_task(self, task_id):
+        count = self.calls.get(task_id, 0)
+        self.calls[task_id] = count + 1
+        script = self.scripts[task_id]
+        step = script[min(count, len(script) - 1)]
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def make_poller(client):
+    poller = WanTaskPoller(client_factory=lambda: client, max_retries=2, retry_backoff_seconds=0.01)
+    for profile in poller.profiles.values():
+        profile["expected_seconds"] = 0.05
+        profile["min_interval"] = 0.01
+        profile["max_interval"] = 0.02
+    return poller
+
+
+def test_multiplexes_tasks():
+    """测试多个任务共享一个轮询循环"""
+    print("测试多任务轮询...")
+
+    client = FakeWanClient({
+        "img-1": [{"task_status": "RUNNING"}, {"task_status": "SUCCEEDED", "results": [{"url": "a"}]}],
+        "vid-1": [{"task_status": "PENDING"}, {"task_status": "RUNNING"},
+                  {"task_status": "SUCCEEDED", "video_url": "v"}],
+        "img-2": [WanAPIError("busy", status_code=503), {"task_status": "SUCCEEDED", "results": []}],
+    })
+    poller = make_poller(client)
+
+    async def run():
+        return await asyncio.gather(
+            poller.wait("img-1", WanTaskPoller.KIND_IMAGE, 5),
+            poller.wait("vid-1", WanTaskPoller.KIND_VIDEO, 5),
+            poller.wait("img-2", WanTaskPoller.KIND_IMAGE, 5),
+        )
+
+    results = asyncio.run(run())
+    assert results[0]["results"][0]["url"] == "a"
+    assert results[1]["video_url"] == "v"
+    # img-2 首次查询返回503，重试后成功
+    assert client.calls["img-2"] == 2
+    assert poller.stats()["tracked"] == 0
+    assert poller.stats()["completed"] == 3
+    print("OK 多任务轮询成功")
+
+
+def test_failed_and_non_retryable():
+    """测试任务失败和不可重试错误"""
+    print("测试失败任务...")
+
+    client = FakeWanClient({
+        "bad": [{"task_status": "FAILED", "message": "content blocked"}],
+        "auth": [WanAPIError("bad key", status_code=401)],
+    })
+    poller = make_poller(client)
+
+    async def run():
+        return await asyncio.gather(
+            poller.wait("bad", WanTaskPoller.KIND_IMAGE, 5),
+            poller.wait("auth", WanTaskPoller.KIND_IMAGE, 5),
+            return_exceptions=True
+        )
+
+    bad, auth = asyncio.run(run())
+    assert isinstance(bad, RuntimeError) and "content blocked" in str(bad)
+    assert isinstance(auth, WanAPIError) and auth.status_code == 401
+    assert client.calls["auth"] == 1
+    print("OK 失败任务处理成功")
+
+
+if __name__ == "__main__":
+    test_multiplexes_tasks()
+    test_failed_and_non_retryable()
+    print("所有轮询器测试完成！")
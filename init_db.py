@@ -111,6 +111,55 @@ def create_tables():
     );
     """
     
+    # 嵌入向量缓存表
+    embedding_cache_sql = """
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+      key_hash      TEXT NOT NULL,
+      model_name    TEXT NOT NULL,
+      embed         BYTEA NOT NULL,
+      updated_at_ts BIGINT NOT NULL,
+      PRIMARY KEY (key_hash, model_name)
+    );
+    """
+    
+    # 持久化任务队列表
+    task_queue_sql = """
+    CREATE TABLE IF NOT EXISTS task_queue (
+      task_id             TEXT PRIMARY KEY,
+      task_type           TEXT NOT NULL,
+      params_json         JSONB NOT NULL DEFAULT '{}',
+      status              TEXT NOT NULL,
+      progress            INTEGER NOT NULL DEFAULT 0,
+      result_json         JSONB,
+      error               TEXT,
+      attempts            INTEGER NOT NULL DEFAULT 0,
+      cancel_requested    BOOLEAN NOT NULL DEFAULT FALSE,
+      visible_at_ts       BIGINT,
+      sched_ts            BIGINT,
+      deadline_ts         BIGINT,
+      lease_owner         TEXT,
+      lease_expires_at_ts BIGINT,
+      heartbeat_at_ts     BIGINT,
+      created_at_ts       BIGINT NOT NULL,
+      started_at_ts       BIGINT,
+      completed_at_ts     BIGINT,
+      updated_at_ts       BIGINT NOT NULL
+    );
+    """
+    
+    # 内容寻址资源表（按内容哈希存储，ref_count为写入时引用该文件的变体数，仅作审计）
+    asset_blob_sql = """
+    CREATE TABLE IF NOT EXISTS asset_blob (
+      storage_key    TEXT PRIMARY KEY,
+      content_sha256 TEXT NOT NULL,
+      content_type   TEXT NOT NULL,
+      size_bytes     BIGINT NOT NULL,
+      ref_count      INTEGER NOT NULL DEFAULT 0,
+      created_at_ts  BIGINT NOT NULL,
+      updated_at_ts  BIGINT NOT NULL
+    );
+    """
+    
     # 执行所有SQL
     with engine.connect() as conn:
         conn.execute(text(soul_table_sql))
@@ -121,6 +170,9 @@ def create_tables():
         conn.execute(text(landmark_log_sql))
         conn.execute(text(work_lock_sql))
         conn.execute(text(idempotency_sql))
+        conn.execute(text(embedding_cache_sql))
+        conn.execute(text(task_queue_sql))
+        conn.execute(text(asset_blob_sql))
         conn.commit()
         
         print("所有数据库表创建成功！")
@@ -133,9 +185,17 @@ def create_indexes():
         "CREATE INDEX IF NOT EXISTS idx_prompt_key_soul_id ON prompt_key(soul_id);",
         "CREATE INDEX IF NOT EXISTS idx_variant_pk_id ON variant(pk_id);",
         "CREATE INDEX IF NOT EXISTS idx_variant_soul_id ON variant(soul_id);",
+        "CREATE INDEX IF NOT EXISTS idx_variant_pk_type_updated ON variant(pk_id, (meta_json->>'type'), updated_at_ts DESC);",
+        # 资源目录分页（按ULID倒序，按Soul或类型过滤）
+        "CREATE INDEX IF NOT EXISTS idx_variant_soul_variant ON variant(soul_id, variant_id DESC);",
+        "CREATE INDEX IF NOT EXISTS idx_variant_type_variant ON variant((meta_json->>'type'), variant_id DESC);",
         "CREATE INDEX IF NOT EXISTS idx_user_seen_user_id ON user_seen(user_id);",
+        "CREATE INDEX IF NOT EXISTS idx_user_seen_variant ON user_seen(variant_id);",
+        "CREATE INDEX IF NOT EXISTS idx_user_seen_seen_at ON user_seen(seen_at_ts);",
         "CREATE INDEX IF NOT EXISTS idx_landmark_log_soul_city ON landmark_log(soul_id, city_key);",
         "CREATE INDEX IF NOT EXISTS idx_work_lock_expires ON work_lock(expires_at_ts);",
+        "CREATE INDEX IF NOT EXISTS idx_task_queue_claim ON task_queue(status, sched_ts);",
+        "CREATE INDEX IF NOT EXISTS idx_task_queue_created ON task_queue(created_at_ts DESC);",
     ]
     
     with engine.connect() as conn:
@@ -4,16 +4,23 @@ Soul MVP主应用
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.api.routes_style import router as style_router
 from app.api.routes_health import router as health_router
 from app.api.routes_image import router as image_router
 from app.api.routes_static import router as static_router, setup_static_files
-from app.api.routes_tasks import router as tasks_router
+from app.api.routes_tasks import router as tasks_router, image_service as tasks_image_service
 from app.api.routes_wan_video import router as wan_video_router
 from app.config import config
 from app.data.dal import get_db
+from app.data.async_dal import dispose_async_engine
+from app.logic.embedder import warmup_embedder
+from app.logic.variant_replenisher import init_variant_replenisher
+from app.logic.gif_encoder import shutdown_gif_executor
+from app.logic.wan_client import close_wan_client
+from app.logic.storage_backend import get_asset_uploader
 
 # 配置日志
 logging.basicConfig(
@@ -42,10 +49,29 @@ async def lifespan(app: FastAPI):
         logger.error(f"数据库连接失败: {e}")
         raise
     
+    # 预加载共享嵌入模型（可选，默认在首次使用时加载）
+    if config.EMBEDDER_EAGER_LOAD:
+        await asyncio.to_thread(warmup_embedder)
+        logger.info("嵌入模型预加载完成")
+    
+    # 启动后台任务消费循环（db队列模式下每个worker都参与消费）
+    tasks_image_service.task_manager.start()
+    
+    # 启动变体池预生成（REPLENISH_ENABLED=true 时）
+    replenisher = init_variant_replenisher(tasks_image_service.replenish_variant_pool)
+    replenisher.start()
+    
     yield
     
     # 关闭时执行
     logger.info("Soul MVP应用关闭中...")
+    await replenisher.stop()
+    await tasks_image_service.task_manager.stop()
+    # 等待后台上传完成，避免对象存储缺少已返回给用户的资源
+    await get_asset_uploader().drain(timeout=config.STORAGE_DRAIN_TIMEOUT_SECONDS)
+    await dispose_async_engine()
+    await close_wan_client()
+    shutdown_gif_executor()
 
 
 # 创建FastAPI应用
@@ -123,6 +149,7 @@ async def app_info():
         "environment": config.ENVIRONMENT,
         "debug": config.DEBUG,
         "database_url": config.DATABASE_URL.split("@")[-1] if "@" in config.DATABASE_URL else "hidden",
+        "storage_backend": config.STORAGE_BACKEND,
         "gcs_bucket": config.GCS_BUCKET_NAME,
         "features": [
             "Soul风格图像生成",